@@ -0,0 +1,316 @@
+import codecs
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from . import models, schemas, tag_service
+from .daily_rollups import apply_changes, rollup_changes
+from .database import AsyncSessionLocal
+
+# Activity columns written by exports, in CSV column order; tags follow
+EXPORT_FIELDS = [
+    "id",
+    "title",
+    "description",
+    "start_time",
+    "end_time",
+    "duration",
+    "recorded_time",
+    "timer_status",
+    "scheduled_time",
+]
+
+# Activities fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = 500
+
+# Separates tag names in the CSV tags column
+CSV_TAG_SEPARATOR = ";"
+
+
+async def export_batches(user_id: int) -> AsyncIterator[List[Dict]]:
+    """
+    Stream a user's activities, oldest first, as batches of dicts with a
+    list of tag names each. Rows come from a server-side cursor and each
+    batch loads its tags with one IN query, so memory use doesn't grow with
+    the number of activities.
+
+    Opens its own session: a streaming response outlives the request's
+    dependency-injected one.
+    """
+    activity = models.Activity
+    columns = [getattr(activity, field) for field in EXPORT_FIELDS]
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(*columns)
+            .where(activity.user_id == user_id)
+            .order_by(activity.id)
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for partition in result.partitions():
+            tags = defaultdict(list)
+            tag_rows = await db.execute(
+                select(models.activity_tags.c.activity_id, models.Tag.name)
+                .join(models.Tag, models.Tag.id == models.activity_tags.c.tag_id)
+                .where(
+                    models.activity_tags.c.activity_id.in_(
+                        [row.id for row in partition]
+                    )
+                )
+            )
+            for activity_id, name in tag_rows:
+                tags[activity_id].append(name)
+            yield [dict(row._mapping, tags=tags[row.id]) for row in partition]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def format_ndjson(batch: List[Dict]) -> str:
+    return "".join(json.dumps(row, default=_json_default) + "\n" for row in batch)
+
+
+def csv_header() -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([*EXPORT_FIELDS, "tags"])
+    return buffer.getvalue()
+
+
+def format_csv(batch: List[Dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in (row[field] for field in EXPORT_FIELDS)
+            ]
+            + [CSV_TAG_SEPARATOR.join(row["tags"])]
+        )
+    return buffer.getvalue()
+
+
+# format -> (media type, text before the rows, batch formatter)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", lambda: "", format_ndjson),
+    "csv": ("text/csv", csv_header, format_csv),
+}
+
+
+async def export_activities(user_id: int, export_format: str) -> AsyncIterator[str]:
+    """
+    Stream a user's activities as NDJSON or CSV text, one chunk per batch
+    """
+    _, header, format_batch = EXPORT_FORMATS[export_format]
+    prefix = header()
+    if prefix:
+        yield prefix
+    async for batch in export_batches(user_id):
+        yield format_batch(batch)
+
+
+# Rows validated, tag-resolved and inserted per transaction by imports
+IMPORT_BATCH_SIZE = 1000
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a streamed UTF-8 body into lines without their line endings
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def parse_ndjson(line: str) -> Dict:
+    row = json.loads(line)
+    if not isinstance(row, dict):
+        raise ValueError("Expected a JSON object")
+    return row
+
+
+async def ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Number the non-blank lines of an NDJSON body from 1
+    """
+    number = 0
+    async for line in lines:
+        if line.strip():
+            number += 1
+            yield number, line
+
+
+async def csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Number the records of a CSV body from 1, after its header. A record
+    continues over the next line while it has an unclosed quote.
+    """
+    number = -1
+    record = None
+    async for line in lines:
+        record = line if record is None else f"{record}\n{line}"
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            number += 1
+            yield number, record
+        record = None
+    if record is not None:
+        yield number + 1, record
+
+
+def csv_parser(header: str):
+    """
+    Return a parser turning a CSV record into a dict keyed by the header.
+    Empty fields are left out and tags are split on CSV_TAG_SEPARATOR.
+    """
+    columns = next(csv.reader([header]))
+
+    def parse(record: str) -> Dict:
+        values = next(csv.reader([record]))
+        if len(values) != len(columns):
+            raise ValueError(f"Expected {len(columns)} fields, got {len(values)}")
+        row = {column: value for column, value in zip(columns, values) if value}
+        if "tags" in row:
+            row["tags"] = [
+                name for name in row["tags"].split(CSV_TAG_SEPARATOR) if name
+            ]
+        return row
+
+    return parse
+
+
+def validation_messages(error: ValidationError) -> List[str]:
+    return [
+        ".".join(str(part) for part in detail["loc"]) + f": {detail['msg']}"
+        if detail["loc"]
+        else detail["msg"]
+        for detail in error.errors()
+    ]
+
+
+async def import_batches(
+    chunks: AsyncIterator[bytes], import_format: str
+) -> AsyncIterator[Tuple[List[schemas.ActivityImport], List[schemas.ImportRowError]]]:
+    """
+    Parse and validate a streamed NDJSON or CSV body against
+    schemas.ActivityImport, yielding up to IMPORT_BATCH_SIZE valid rows at a
+    time with the errors of the rows rejected since the previous batch
+    """
+    lines = iter_lines(chunks)
+    if import_format == "csv":
+        records = csv_rows(lines)
+        header = await anext(records, None)
+        if header is None:
+            return
+        parse = csv_parser(header[1])
+    else:
+        records = ndjson_rows(lines)
+        parse = parse_ndjson
+
+    valid, errors = [], []
+    async for number, record in records:
+        try:
+            valid.append(schemas.ActivityImport.model_validate(parse(record)))
+        except ValidationError as e:
+            errors.append(
+                schemas.ImportRowError(row=number, errors=validation_messages(e))
+            )
+        except (ValueError, csv.Error) as e:
+            errors.append(schemas.ImportRowError(row=number, errors=[str(e)]))
+        if len(valid) >= IMPORT_BATCH_SIZE:
+            yield valid, errors
+            valid, errors = [], []
+    if valid or errors:
+        yield valid, errors
+
+
+def insert_batch(
+    db: Session, user_id: int, activities: List[schemas.ActivityCreate]
+) -> List[Tuple[int, datetime]]:
+    """
+    Insert validated activities with their tags: the batch's tags are
+    resolved together, then activities and tag links go in with one
+    executemany each and the tags' use counts with one upsert. Nothing is
+    committed here.
+
+    Imported activities keep their start_time, end_time and recorded_time.
+    Like maintenance backfill, their recorded time gets one closed interval
+    from start_time, which is also added to the daily rollups.
+
+    Returns (activity id, scheduled_time) for each inserted activity.
+    """
+    if not activities:
+        return []
+    tags = tag_service.resolve_tag_ids(
+        db, (name for activity in activities for name in activity.tags)
+    )
+    rows = [
+        dict(activity.model_dump(exclude={"tags"}), user_id=user_id)
+        for activity in activities
+    ]
+    # An imported row without a start_time gets what the server default
+    # would store: the current UTC time
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        if "start_time" in row and row["start_time"] is None:
+            row["start_time"] = now
+    table = models.Activity.__table__
+    # Ids are assigned in insertion order, so sorting them restores the
+    # parameter order; sort_by_parameter_order would make SQLite insert
+    # one row per statement
+    ids = sorted(db.scalars(insert(table).returning(table.c.id), rows))
+    links = [
+        {"activity_id": activity_id, "tag_id": tags[name]}
+        for activity_id, activity in zip(ids, activities)
+        for name in tag_service.unique_tag_names(activity.tags)
+    ]
+    if links:
+        db.execute(insert(models.activity_tags), links)
+        usage = Counter()
+        for link in links:
+            usage[(user_id, link["tag_id"])] += 1
+        tag_service.apply_usage_changes(db, usage)
+
+    intervals, changes = [], Counter()
+    for activity_id, activity, row in zip(ids, activities, rows):
+        if row.get("recorded_time"):
+            started_at = row["start_time"]
+            ended_at = started_at + timedelta(seconds=row["recorded_time"])
+            intervals.append(
+                {
+                    "activity_id": activity_id,
+                    "user_id": user_id,
+                    "started_at": started_at,
+                    "ended_at": ended_at,
+                }
+            )
+            rollup_changes(
+                user_id,
+                [tags[name] for name in tag_service.unique_tag_names(activity.tags)],
+                [(started_at, ended_at)],
+                changes=changes,
+            )
+    if intervals:
+        db.execute(insert(models.ActivityInterval), intervals)
+        statement = apply_changes(db, changes)
+        if statement is not None:
+            db.execute(statement)
+    return [
+        (activity_id, activity.scheduled_time)
+        for activity_id, activity in zip(ids, activities)
+    ]
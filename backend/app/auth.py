@@ -1,14 +1,15 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import models, schemas, config
-from .database import get_db
+from .database import get_async_db
+from .hashing import password_hasher, pwd_context
+from .principal_cache import UserSnapshot, principal_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -20,15 +21,24 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def authenticate_user(db: Session, email: str, password: str):
+async def hash_password(password: str) -> str:
+    """
+    Hash a password in the hashing pool, off the event loop
+    Raises HashingBusy when the pool is saturated
+    """
+    return await password_hasher.hash(password)
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """
     Authenticate a user by email and password
     Returns the user if authentication is successful, None otherwise
+    Raises HashingBusy when the hashing pool is saturated
     """
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == email))
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
     return user
 
@@ -49,11 +59,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> UserSnapshot:
     """
     Get current user from JWT token
+    Verified tokens are served from the principal cache until they expire
     """
+    cached_user = principal_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -68,15 +83,27 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
+    row = (
+        await db.execute(
+            select(
+                models.User.id,
+                models.User.email,
+                models.User.is_active,
+                models.User.telegram_chat_id,
+            ).where(models.User.email == token_data.email)
+        )
+    ).first()
+    if row is None:
         raise credentials_exception
+
+    user = UserSnapshot(**row._mapping)
+    principal_cache.put(token, user, payload.get("exp", float("inf")))
     return user
 
 
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
-):
+    current_user: UserSnapshot = Depends(get_current_user),
+) -> UserSnapshot:
     """
     Check if the current user is active
     """
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from . import metrics
+
+
+class ChatUserMap:
+    """
+    Bounded LRU map of linked Telegram chat_id -> user_id, so bot commands
+    resolve the user without querying the users table.
+
+    Only linked chats are stored. The link and unlink flows keep it current;
+    a miss falls back to the database and the caller adds the result.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._users: "OrderedDict[str, int]" = OrderedDict()
+        self._chats: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: str) -> Optional[int]:
+        with self._lock:
+            user_id = self._users.get(chat_id)
+            if user_id is None:
+                metrics.increment("chat_user_map.miss")
+                return None
+            self._users.move_to_end(chat_id)
+        metrics.increment("chat_user_map.hit")
+        return user_id
+
+    def link(self, chat_id: str, user_id: int):
+        """
+        Record that chat_id belongs to user_id, replacing any earlier link of
+        either the chat or the user
+        """
+        with self._lock:
+            self._remove_chat(self._chats.get(user_id))
+            self._remove_chat(chat_id)
+            self._users[chat_id] = user_id
+            self._chats[user_id] = chat_id
+            while len(self._users) > self.max_size:
+                self._remove_chat(next(iter(self._users)))
+
+    def unlink_user(self, user_id: int):
+        with self._lock:
+            self._remove_chat(self._chats.get(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._chats.clear()
+
+    def __len__(self):
+        return len(self._users)
+
+    def _remove_chat(self, chat_id: Optional[str]):
+        user_id = self._users.pop(chat_id, None)
+        if user_id is not None:
+            self._chats.pop(user_id, None)
+
+
+chat_user_map = ChatUserMap()
+metrics.register_gauge("chat_user_map.size", lambda: len(chat_user_map))
@@ -10,3 +10,83 @@ load_dotenv(env_path)
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Database settings
+# A PostgreSQL URL (postgresql://...) switches the async layer to asyncpg
+DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///./plan_tracker.db"
+
+# Connection pool settings (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Sessions the Telegram bot and background loops may hold at once
+BACKGROUND_DB_SESSIONS = int(os.getenv("BACKGROUND_DB_SESSIONS", "4"))
+
+# PRAGMAs applied to every new SQLite connection; set one to an empty
+# value to keep SQLite's default
+SQLITE_PRAGMAS = {
+    # WAL lets readers run alongside the writer
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # NORMAL is durable across app crashes in WAL mode and skips most fsyncs
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Wait for the write lock instead of failing with "database is locked"
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    # Negative values are KiB, so 64 MiB of page cache per connection
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Response compression settings
+# Smaller responses are sent uncompressed
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli quality 4 compresses about as fast as gzip level 6, and smaller
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Tag catalogue cache settings
+TAG_CATALOGUE_MAX_NAMES = int(os.getenv("TAG_CATALOGUE_MAX_NAMES", "100000"))
+TAG_CATALOGUE_MAX_PAGES = int(os.getenv("TAG_CATALOGUE_MAX_PAGES", "256"))
+# Bounds how long tags created by other processes can be missing from pages
+TAG_CATALOGUE_PAGE_TTL_SECONDS = float(
+    os.getenv("TAG_CATALOGUE_PAGE_TTL_SECONDS", "60")
+)
+
+# Password hashing pool settings
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", "2"))
+# Hash requests allowed to wait for a worker before new ones get a 503
+HASHING_QUEUE_DEPTH = int(os.getenv("HASHING_QUEUE_DEPTH", "32"))
+
+# Authenticated user cache settings
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Email deliverability check settings
+EMAIL_DNS_TIMEOUT_SECONDS = float(os.getenv("EMAIL_DNS_TIMEOUT_SECONDS", "3"))
+EMAIL_DOMAIN_CACHE_TTL_SECONDS = int(
+    os.getenv("EMAIL_DOMAIN_CACHE_TTL_SECONDS", "86400")
+)
+EMAIL_DOMAIN_NEGATIVE_TTL_SECONDS = int(
+    os.getenv("EMAIL_DOMAIN_NEGATIVE_TTL_SECONDS", "300")
+)
+
+# Reminder scheduler settings
+# Safety-net sweep that reloads upcoming reminders from the database
+REMINDER_RECONCILE_SECONDS = int(os.getenv("REMINDER_RECONCILE_SECONDS", "300"))
+
+# Telegram notification dispatcher settings
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "8"))
+# Telegram allows about 30 messages per second overall and 1 per second per chat
+NOTIFY_GLOBAL_RATE = float(os.getenv("NOTIFY_GLOBAL_RATE", "30"))
+NOTIFY_PER_CHAT_INTERVAL = float(os.getenv("NOTIFY_PER_CHAT_INTERVAL", "1"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "3"))
+
+# Notification outbox relay settings
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Failed deliveries are dead-lettered after this many attempts
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# How long a claimed batch is hidden from other relays; renewed every half
+# lease while the batch is being sent, so it only runs out if the relay dies
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
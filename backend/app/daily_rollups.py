@@ -0,0 +1,71 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+from . import models
+from .database import dialect_insert
+
+# tag_id of the row holding a day's total, each interval counted once
+ALL_TAGS = 0
+# tag_id of the row holding time of activities without tags
+UNTAGGED = -1
+
+
+def split_by_day(started_at: datetime, ended_at: datetime) -> List[Tuple[date, int]]:
+    """
+    Split an interval at midnight into (day, seconds) parts. The parts add
+    up to the interval's whole seconds, rounded the way seconds_between
+    rounds them.
+    """
+    total = int(round((ended_at - started_at).total_seconds(), 3))
+    parts = []
+    day = started_at.date()
+    cursor = started_at
+    while day < ended_at.date():
+        midnight = datetime.combine(day + timedelta(days=1), time.min, cursor.tzinfo)
+        parts.append((day, int((midnight - cursor).total_seconds())))
+        cursor = midnight
+        day += timedelta(days=1)
+    parts.append((day, total - sum(seconds for _, seconds in parts)))
+    return parts
+
+
+def rollup_changes(
+    user_id: int,
+    tag_ids: Optional[Iterable[int]],
+    intervals: Iterable[Tuple[datetime, datetime]],
+    sign: int = 1,
+    changes: Optional[Counter] = None,
+) -> Counter:
+    """
+    Add the seconds of closed (started_at, ended_at) intervals of one
+    activity with the given tags to a (user_id, tag_id, day) -> seconds
+    Counter. sign=-1 takes them away instead.
+    """
+    changes = Counter() if changes is None else changes
+    tags = (ALL_TAGS, *(tag_ids or (UNTAGGED,)))
+    for started_at, ended_at in intervals:
+        for day, seconds in split_by_day(started_at, ended_at):
+            for tag_id in tags:
+                # update() keeps negative and zero counts, unlike +=
+                changes.update({(user_id, tag_id, day): sign * seconds})
+    return changes
+
+
+def apply_changes(db, changes: Counter):
+    """
+    Upsert statement adding the Counter's seconds to daily_rollups, or None
+    if there is nothing to change
+    """
+    rows = [
+        {"user_id": user_id, "tag_id": tag_id, "day": day, "seconds": seconds}
+        for (user_id, tag_id, day), seconds in changes.items()
+        if seconds
+    ]
+    if not rows:
+        return None
+    table = models.DailyRollup.__table__
+    statement = dialect_insert(db, table).values(rows)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "tag_id", "day"],
+        set_={"seconds": table.c.seconds + statement.excluded.seconds},
+    )
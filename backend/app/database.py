@@ -1,14 +1,96 @@
-from sqlalchemy import create_engine
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+# Async drivers used for each database backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+SQLALCHEMY_DATABASE_URL = config.DATABASE_URL
+
+# Indexes earlier versions created that nothing queries any more; dropped at
+# startup so writes stop maintaining them
+RETIRED_INDEXES = ("ix_activities_user_id_updated_at",)
+
+
+def get_async_database_url(database_url: str):
+    """
+    Return the same database URL with the async driver for its backend
+    """
+    url = make_url(database_url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def get_connect_args(database_url: str) -> dict:
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {"check_same_thread": False}
+    return {}
+
+
+def get_engine_options(database_url: str) -> dict:
+    """
+    Engine keyword arguments for the configured backend and pool settings
+    """
+    options = {"connect_args": get_connect_args(database_url)}
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases use a single-connection pool
+        return options
+    options.update(
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=url.get_backend_name() != "sqlite",
+    )
+    return options
+
+
+def set_sqlite_pragmas(sync_engine, pragmas: dict):
+    """
+    Apply PRAGMAs to every new connection of a SQLite engine
+    """
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./plan_tracker.db"
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, **get_engine_options(SQLALCHEMY_DATABASE_URL)
 )
+set_sqlite_pragmas(engine, config.SQLITE_PRAGMAS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for async def endpoints, so queries don't block the event loop
+async_engine = create_async_engine(
+    get_async_database_url(SQLALCHEMY_DATABASE_URL),
+    **get_engine_options(SQLALCHEMY_DATABASE_URL),
+)
+set_sqlite_pragmas(async_engine.sync_engine, config.SQLITE_PRAGMAS)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -18,3 +100,139 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def make_session_scope(max_sessions: int):
+    """
+    Return an async context manager that opens a short-lived session, with at
+    most max_sessions of them holding a pooled connection at once
+    """
+    slots = asyncio.Semaphore(max_sessions)
+
+    @asynccontextmanager
+    async def session_scope():
+        started = time.monotonic()
+        async with slots:
+            async with AsyncSessionLocal() as session:
+                # Check out the connection up front so the wait is measured
+                await session.connection()
+                metrics.observe("db.session_wait", time.monotonic() - started)
+                yield session
+
+    return session_scope
+
+
+# Sessions for the Telegram bot and background loops, capped so they can't
+# take every pooled connection away from API requests
+background_session = make_session_scope(config.BACKGROUND_DB_SESSIONS)
+
+
+def register_pool_gauges(name: str, pool):
+    """
+    Report checked-out connections and overflow for a pool that tracks them
+    """
+    if hasattr(pool, "checkedout"):
+        metrics.register_gauge(f"{name}.checked_out", pool.checkedout)
+        metrics.register_gauge(f"{name}.overflow", pool.overflow)
+
+
+register_pool_gauges("db.pool", engine.pool)
+register_pool_gauges("db.async_pool", async_engine.pool)
+
+
+def add_missing_columns(bind):
+    """
+    Add columns missing from tables that already exist. Only suits nullable
+    columns without server defaults or constraints.
+    """
+    inspector = inspect(bind)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as connection:
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                )
+
+
+def drop_retired_indexes(bind):
+    """
+    Drop the indexes in RETIRED_INDEXES where they still exist
+    """
+    with bind.begin() as connection:
+        for name in RETIRED_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+
+def clear_duplicate_chat_links(bind):
+    """
+    Leave each Telegram chat linked to one account, the oldest, as the bot
+    used to pick it. Linking once kept the chat on previous accounts, and
+    the unique index on users.telegram_chat_id can't be built over those.
+    """
+    from . import models
+
+    users = models.User.__table__
+    linked = users.c.telegram_chat_id.isnot(None)
+    kept = select(func.min(users.c.id)).where(linked).group_by(users.c.telegram_chat_id)
+    with bind.begin() as connection:
+        result = connection.execute(
+            update(users)
+            .where(linked, users.c.id.not_in(kept))
+            .values(telegram_chat_id=None)
+        )
+    if result.rowcount:
+        logger.warning(
+            f"Unlinked {result.rowcount} accounts sharing a Telegram chat "
+            "with an older account"
+        )
+
+
+def init_db():
+    """
+    Create missing tables, and missing columns and indexes on tables that
+    already exist, drop retired indexes, then backfill the interval log
+    """
+    from . import models  # noqa: F401 - registers the tables on Base
+
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    clear_duplicate_chat_links(engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    drop_retired_indexes(engine)
+    backfill_interval_log()
+
+
+def backfill_interval_log():
+    """
+    Log the time of activities tracked before the interval log existed, so
+    no timer action is served while their recorded_time is unlogged
+    """
+    from .maintenance import backfill_intervals
+
+    with SessionLocal() as db:
+        backfilled = backfill_intervals(db)
+    if backfilled:
+        logger.info(f"Backfilled the interval log of {backfilled} activities")
+
+
+def dialect_insert(db, table):
+    """
+    Return an INSERT construct for the session's dialect, so callers can use
+    ON CONFLICT clauses on both SQLite and PostgreSQL
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict
+from email_validator import EmailNotValidError, deliverability
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_domain(domain: str, timeout: float):
+    """
+    Blocking DNS deliverability check (MX, falling back to A/AAAA)
+    Raises EmailNotValidError if the domain cannot receive mail
+    """
+    deliverability.validate_email_deliverability(domain, domain, timeout=timeout)
+
+
+class DeliverabilityCache:
+    """
+    Domain-level cache of DNS deliverability results.
+
+    Lookups run in a worker thread with a timeout, so a request never waits
+    on DNS for longer than that. Deliverable domains are remembered for
+    positive_ttl seconds and undeliverable ones for negative_ttl seconds.
+    A lookup that times out or fails for another reason is not cached and
+    the domain is treated as deliverable.
+    """
+
+    def __init__(
+        self,
+        positive_ttl: float,
+        negative_ttl: float,
+        timeout: float,
+        max_size: int = 10000,
+        resolve: Callable[[str, float], None] = resolve_domain,
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_size = max_size
+        self._resolve = resolve
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    async def is_deliverable(self, domain: str) -> bool:
+        domain = domain.lower()
+        entry = self._entries.get(domain)
+        if entry is not None and entry[1] > time.monotonic():
+            metrics.increment("email_domain_cache.hit")
+            return entry[0]
+        metrics.increment("email_domain_cache.miss")
+
+        # Share one lookup between concurrent checks of the same domain
+        pending = self._pending.get(domain)
+        if pending is None:
+            pending = asyncio.ensure_future(self._lookup(domain))
+            self._pending[domain] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(domain, None))
+        return await asyncio.shield(pending)
+
+    async def _lookup(self, domain: str) -> bool:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                asyncio.to_thread(self._resolve, domain, self.timeout),
+                timeout=self.timeout,
+            )
+            deliverable, ttl = True, self.positive_ttl
+        except EmailNotValidError as e:
+            logger.info(f"Email domain {domain} is not deliverable: {e}")
+            deliverable, ttl = False, self.negative_ttl
+        except Exception as e:
+            logger.warning(f"Deliverability check for {domain} failed: {e!r}")
+            metrics.increment("email_domain_cache.lookup_failed")
+            return True
+        finally:
+            elapsed = time.monotonic() - started
+            metrics.observe("email_domain_cache.lookup_time", elapsed)
+
+        self._entries[domain] = (deliverable, time.monotonic() + ttl)
+        self._entries.move_to_end(domain)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return deliverable
+
+    def clear(self):
+        self._entries.clear()
+
+
+deliverability_cache = DeliverabilityCache(
+    positive_ttl=config.EMAIL_DOMAIN_CACHE_TTL_SECONDS,
+    negative_ttl=config.EMAIL_DOMAIN_NEGATIVE_TTL_SECONDS,
+    timeout=config.EMAIL_DNS_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, update
+from . import models
+
+# ETags are weak: they are derived from updated_at and the user's
+# activities_version rather than the bytes sent. Representations with a
+# running timer get none at all, as their current_recorded_time keeps
+# counting while the stored row is unchanged
+
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the values a representation depends on
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def activity_etag(activity_id: int, updated_at: Optional[datetime]) -> str:
+    return make_etag("activity", activity_id, updated_at)
+
+
+def activity_list_etag(user_id: int, version: Optional[int], query: str) -> str:
+    """
+    ETag of a page of a user's activities: the user's activities_version
+    changes with every write to any of them, and the query string tells
+    pages apart
+    """
+    return make_etag("activities", user_id, version, query)
+
+
+def bump_activities_version(user_id: int):
+    """
+    UPDATE statement marking a write to the user's activities; executed in
+    the transaction of the write, on a sync or async session
+    """
+    version = models.User.activities_version
+    return (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(activities_version=func.coalesce(version, 0) + 1)
+    )
+
+
+def etag_matches(
+    if_none_match: Optional[str], etag: str, wildcard: bool = True
+) -> bool:
+    """
+    Whether an If-None-Match header matches an ETag, by weak comparison.
+    wildcard=False ignores "*", for callers that can only vouch for ETags
+    they have handed out.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return (wildcard and "*" in candidates) or any(
+        candidate.removeprefix("W/") == etag.removeprefix("W/")
+        for candidate in candidates
+    )
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class HashingBusy(Exception):
+    """
+    Raised when the hashing pool can't take an operation: it already has as
+    much work as it accepts, or a worker died while running it
+    """
+
+
+def _run_timed(operation, *args):
+    # Runs in a worker process; monotonic clocks are shared between processes
+    started = time.monotonic()
+    if operation == "hash":
+        result = pwd_context.hash(*args)
+    else:
+        result = pwd_context.verify(*args)
+    return result, started, time.monotonic()
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a process pool, so hashing neither blocks the event loop
+    nor competes for the GIL. At most max_workers + max_queue operations are
+    accepted at once; anything beyond that fails fast with HashingBusy.
+    A pool broken by a dead worker is replaced on the next call.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            # A concurrent call may already have replaced it
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, operation, *args):
+        if self.in_flight >= self.capacity:
+            metrics.increment("hashing.rejected")
+            logger.warning(f"Hashing pool saturated, rejecting {operation}")
+            raise HashingBusy()
+
+        self.in_flight += 1
+        submitted = time.monotonic()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(
+                executor, _run_timed, operation, *args
+            )
+        except BrokenProcessPool:
+            # Every later call would fail the same way, so start a new pool
+            metrics.increment("hashing.pool_broken")
+            logger.error(f"Hashing worker died during {operation}, restarting pool")
+            self._discard_executor(executor)
+            raise HashingBusy()
+        finally:
+            self.in_flight -= 1
+
+        metrics.observe("hashing.queue_wait", started - submitted)
+        metrics.observe(f"hashing.{operation}_time", finished - started)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", plain_password, hashed_password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(
+    max_workers=config.HASHING_WORKERS, max_queue=config.HASHING_QUEUE_DEPTH
+)
+metrics.register_gauge("hashing.in_flight", lambda: password_hasher.in_flight)
@@ -1,16 +1,21 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from . import models, telegram_bot
-from .database import engine
+from . import config, telegram_bot
+from .compression import CompressionMiddleware
+from .database import async_engine, init_db
+from .hashing import password_hasher
+from .responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import asyncio
 from .routers.activity_router import activity_router
+from .routers.metrics_router import metrics_router
+from .routers.report_router import report_router
 from .routers.tag_router import tag_router
 from .routers.user_router import user_router
 
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Create database tables and indexes
+init_db()
 
 
 @asynccontextmanager
@@ -25,14 +30,22 @@ async def lifespan(app: FastAPI):
             await bot_task
         except asyncio.CancelledError:
             pass
+        password_hasher.shutdown()
+        await async_engine.dispose()
 
 
 # Initialize FastAPI app
-app = FastAPI(title="PlanTracker API", lifespan=lifespan)
+app = FastAPI(
+    title="PlanTracker API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 app.include_router(user_router)
 app.include_router(activity_router)
 app.include_router(tag_router)
+app.include_router(report_router)
+app.include_router(metrics_router)
 
 # Configure CORS
 app.add_middleware(
@@ -41,4 +54,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Compress large responses; added last so it wraps the CORS middleware
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MINIMUM_SIZE,
+    gzip_level=config.GZIP_LEVEL,
+    brotli_quality=config.BROTLI_QUALITY,
 )
@@ -0,0 +1,295 @@
+"""
+Maintenance commands for derived timer and tag data
+
+Usage: python -m app.maintenance
+    {verify,rebuild,backfill,rebuild-rollups,rebuild-tag-search}
+"""
+
+import argparse
+import sys
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import List
+from sqlalchemy import bindparam, delete, distinct, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+from . import models
+from .daily_rollups import apply_changes, rollup_changes
+from .database import SessionLocal
+from .timer_intervals import closed_seconds
+
+# Rows per INSERT when rebuilding the rollups
+ROLLUP_INSERT_CHUNK = 1000
+
+# Rows per UPDATE when folding tag names
+FOLD_UPDATE_CHUNK = 1000
+
+
+def interval_seconds():
+    """
+    Correlated subquery: seconds in the closed intervals of each activity
+    """
+    interval = models.ActivityInterval
+    return (
+        select(closed_seconds())
+        .where(
+            interval.activity_id == models.Activity.id,
+            interval.ended_at.isnot(None),
+        )
+        .scalar_subquery()
+    )
+
+
+def has_intervals():
+    """
+    Whether an activity has an interval log. Activities tracked before the
+    log existed have none until backfill gives them one, so their
+    recorded_time is the only record of their time.
+    """
+    interval = models.ActivityInterval
+    return exists().where(interval.activity_id == models.Activity.id)
+
+
+def verify_recorded_time(db: Session) -> List[tuple]:
+    """
+    Return (activity_id, recorded_time, interval_seconds) for every logged
+    activity whose cached recorded_time disagrees with its interval log
+    """
+    seconds = interval_seconds()
+    return db.execute(
+        select(models.Activity.id, models.Activity.recorded_time, seconds)
+        .where(has_intervals(), models.Activity.recorded_time != seconds)
+        .order_by(models.Activity.id)
+    ).all()
+
+
+def rebuild_recorded_time(db: Session) -> int:
+    """
+    Reset recorded_time to the sum of the interval log where they disagree,
+    leaving activities without a log alone.
+    Returns the number of activities changed.
+    """
+    seconds = interval_seconds()
+    result = db.execute(
+        update(models.Activity)
+        .where(has_intervals(), models.Activity.recorded_time != seconds)
+        .values(recorded_time=seconds)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        # Changed activities may belong to anyone, so expire every list ETag
+        version = models.User.activities_version
+        db.execute(
+            update(models.User).values(activities_version=func.coalesce(version, 0) + 1)
+        )
+    db.commit()
+    return result.rowcount
+
+
+def backfill_intervals(db: Session) -> int:
+    """
+    Give activities tracked before the interval log existed a synthetic log:
+    one closed interval of recorded_time seconds from the activity's
+    start_time, plus an open interval if the timer is running. The closed
+    intervals are added to the daily rollups.
+    Runs from init_db on every start, before a timer action can give an
+    unlogged activity a partial log. Returns the number of activities
+    backfilled.
+    """
+    unlogged = [
+        ~has_intervals(),
+        (models.Activity.recorded_time > 0) | models.timer_running(),
+    ]
+    activities = db.execute(
+        select(
+            models.Activity.id,
+            models.Activity.user_id,
+            models.Activity.start_time,
+            models.Activity.recorded_time,
+            models.Activity.timer_status,
+            models.Activity.last_timer_start,
+        ).where(*unlogged)
+    ).all()
+    if not activities:
+        return 0
+
+    links = models.activity_tags
+    tag_ids = defaultdict(list)
+    for activity_id, tag_id in db.execute(
+        select(links.c.activity_id, links.c.tag_id).where(
+            links.c.activity_id.in_(select(models.Activity.id).where(*unlogged))
+        )
+    ):
+        tag_ids[activity_id].append(tag_id)
+
+    rows = []
+    changes = Counter()
+    for activity in activities:
+        if activity.recorded_time:
+            ended_at = activity.start_time + timedelta(seconds=activity.recorded_time)
+            rows.append(
+                {
+                    "activity_id": activity.id,
+                    "user_id": activity.user_id,
+                    "started_at": activity.start_time,
+                    "ended_at": ended_at,
+                }
+            )
+            rollup_changes(
+                activity.user_id,
+                tag_ids.get(activity.id),
+                [(activity.start_time, ended_at)],
+                changes=changes,
+            )
+        if activity.timer_status == "running" and activity.last_timer_start:
+            rows.append(
+                {
+                    "activity_id": activity.id,
+                    "user_id": activity.user_id,
+                    "started_at": activity.last_timer_start,
+                    "ended_at": None,
+                }
+            )
+    if rows:
+        db.execute(insert(models.ActivityInterval), rows)
+    statement = apply_changes(db, changes)
+    if statement is not None:
+        db.execute(statement)
+    db.commit()
+    return len(activities)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """
+    Recompute daily_rollups from the closed timer intervals.
+    Returns the number of rollup rows written.
+    """
+    tag_ids = defaultdict(list)
+    for activity_id, tag_id in db.execute(
+        select(models.activity_tags.c.activity_id, models.activity_tags.c.tag_id)
+    ):
+        tag_ids[activity_id].append(tag_id)
+
+    interval = models.ActivityInterval
+    changes = Counter()
+    intervals = db.execute(
+        select(
+            interval.activity_id,
+            interval.user_id,
+            interval.started_at,
+            interval.ended_at,
+        )
+        .where(interval.ended_at.isnot(None))
+        .execution_options(yield_per=1000)
+    )
+    for row in intervals:
+        rollup_changes(
+            row.user_id,
+            tag_ids.get(row.activity_id),
+            [(row.started_at, row.ended_at)],
+            changes=changes,
+        )
+
+    rows = [
+        {"user_id": user_id, "tag_id": tag_id, "day": day, "seconds": seconds}
+        for (user_id, tag_id, day), seconds in changes.items()
+    ]
+    db.execute(delete(models.DailyRollup))
+    for start in range(0, len(rows), ROLLUP_INSERT_CHUNK):
+        db.execute(
+            insert(models.DailyRollup), rows[start:start + ROLLUP_INSERT_CHUNK]
+        )
+    db.commit()
+    return len(rows)
+
+
+def fold_tag_names(db: Session) -> int:
+    """
+    Fill name_folded for tags created before tag search existed.
+    Folding happens in Python, matching the insert default, since SQL lower()
+    differs from str.casefold() outside ASCII. Returns the number of tags.
+    """
+    rows = [
+        {"tag_id": tag_id, "name_folded": models.fold_tag_name(name)}
+        for tag_id, name in db.execute(
+            select(models.Tag.id, models.Tag.name).where(
+                models.Tag.name_folded.is_(None)
+            )
+        )
+    ]
+    statement = (
+        update(models.Tag.__table__)
+        .where(models.Tag.id == bindparam("tag_id"))
+        .values(name_folded=bindparam("name_folded"))
+    )
+    for start in range(0, len(rows), FOLD_UPDATE_CHUNK):
+        db.execute(statement, rows[start:start + FOLD_UPDATE_CHUNK])
+    db.commit()
+    return len(rows)
+
+
+def rebuild_tag_usage(db: Session) -> int:
+    """
+    Recompute tag_usage from the activities' tags.
+    Returns the number of usage rows written.
+    """
+    links = models.activity_tags
+    counts = (
+        select(
+            models.Activity.user_id,
+            links.c.tag_id,
+            func.count(distinct(links.c.activity_id)),
+        )
+        .join(links, links.c.activity_id == models.Activity.id)
+        .group_by(models.Activity.user_id, links.c.tag_id)
+    )
+    db.execute(delete(models.TagUsage))
+    result = db.execute(
+        insert(models.TagUsage).from_select(["user_id", "tag_id", "uses"], counts)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "command",
+        choices=[
+            "verify",
+            "rebuild",
+            "backfill",
+            "rebuild-rollups",
+            "rebuild-tag-search",
+        ],
+        help="verify: report activities whose recorded_time disagrees with the "
+        "interval log; rebuild: reset recorded_time from the log; backfill: "
+        "create a log for activities tracked before it existed; "
+        "rebuild-rollups: recompute the daily report rollups from the log; "
+        "rebuild-tag-search: fold tag names and recount tag usage for tag search",
+    )
+    args = parser.parse_args(argv)
+
+    with SessionLocal() as db:
+        if args.command == "verify":
+            mismatches = verify_recorded_time(db)
+            for activity_id, recorded_time, seconds in mismatches:
+                print(
+                    f"activity {activity_id}: recorded_time={recorded_time}, "
+                    f"intervals={seconds}"
+                )
+            print(f"{len(mismatches)} activities disagree with the interval log")
+            return 1 if mismatches else 0
+        if args.command == "rebuild":
+            print(f"Rebuilt recorded_time for {rebuild_recorded_time(db)} activities")
+        elif args.command == "rebuild-rollups":
+            print(f"Rebuilt {rebuild_rollups(db)} daily rollups")
+        elif args.command == "rebuild-tag-search":
+            print(f"Folded names of {fold_tag_names(db)} tags")
+            print(f"Rebuilt {rebuild_tag_usage(db)} tag usage counts")
+        else:
+            print(f"Backfilled intervals for {backfill_intervals(db)} activities")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import threading
+from typing import Callable, Dict
+
+# In-process metrics, served as JSON by the /metrics endpoint
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_timings: Dict[str, dict] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def increment(name: str, value: int = 1):
+    """
+    Increase a counter
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float):
+    """
+    Record one duration sample for a timing
+    """
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+
+def register_gauge(name: str, read: Callable[[], float]):
+    """
+    Register a function that reports the current value of a gauge
+    """
+    with _lock:
+        _gauges[name] = read
+
+
+def snapshot() -> dict:
+    """
+    Return the current value of every metric
+    """
+    with _lock:
+        counters = dict(_counters)
+        timings = {
+            name: {
+                "count": timing["count"],
+                "total_seconds": round(timing["total"], 6),
+                "avg_seconds": round(timing["total"] / timing["count"], 6),
+                "max_seconds": round(timing["max"], 6),
+            }
+            for name, timing in _timings.items()
+        }
+        gauges = dict(_gauges)
+    return {
+        "counters": counters,
+        "timings": timings,
+        "gauges": {name: read() for name, read in gauges.items()},
+    }
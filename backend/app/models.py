@@ -1,5 +1,7 @@
-from sqlalchemy import Boolean, Column, ForeignKey
-from sqlalchemy import Integer, String, DateTime, Table
+from datetime import datetime
+from sqlalchemy import Boolean, Column, ForeignKey, Index
+from sqlalchemy import Integer, String, Date, DateTime, Table, literal
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -12,6 +14,13 @@ activity_tags = Table(
     Column("tag_id", Integer, ForeignKey("tags.id")),
 )
 
+# Joins from an activity to its tags (tag loading and reports)
+Index(
+    "ix_activity_tags_activity_id_tag_id",
+    activity_tags.c.activity_id,
+    activity_tags.c.tag_id,
+)
+
 # User database model
 
 
@@ -22,7 +31,10 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
-    telegram_chat_id = Column(String, nullable=True)
+    telegram_chat_id = Column(String, unique=True, index=True, nullable=True)
+    # Bumped by every write to the user's activities, deletes included; list
+    # ETags are built from it (NULL until the first write)
+    activities_version = Column(Integer, default=0, nullable=True)
     activities = relationship("Activity", back_populates="user")
 
 
@@ -35,7 +47,18 @@ class Activity(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String, nullable=True)
-    start_time = Column(DateTime(timezone=True), server_default=func.now())
+    # Stored at second precision on SQLite, the same format the server
+    # default uses, so keyset pagination can compare values exactly
+    start_time = Column(
+        DateTime(timezone=True).with_variant(
+            sqlite.DATETIME(
+                storage_format="%(year)04d-%(month)02d-%(day)02d "
+                "%(hour)02d:%(minute)02d:%(second)02d"
+            ),
+            "sqlite",
+        ),
+        server_default=func.now(),
+    )
     end_time = Column(DateTime(timezone=True), nullable=True)
     duration = Column(Integer, nullable=True)  # Duration in seconds
 
@@ -52,20 +75,161 @@ class Activity(Base):
     )  # When the task is scheduled for
 
     notified = Column(Boolean, default=False)  # Whether notification was sent
+    # Naive UTC time of the last change, bumped by every UPDATE of the row;
+    # ETags are derived from it. NULL for rows written before it existed
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True
+    )
 
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="activities")
     tags = relationship("Tag", secondary=activity_tags, back_populates="activities")
 
 
+def timer_running():
+    """
+    Condition matching running timers. 'running' is rendered into the SQL
+    rather than bound, as SQLite only uses a partial index when the query
+    repeats its WHERE clause literally.
+    """
+    return Activity.timer_status == literal("running", literal_execute=True)
+
+
+# Serves the per-user activity list ordered by newest first
+Index(
+    "ix_activities_user_id_start_time_id",
+    Activity.user_id,
+    Activity.start_time.desc(),
+    Activity.id,
+)
+
+# Finds a user's running timer; only running rows are indexed
+Index(
+    "ix_activities_user_id_running",
+    Activity.user_id,
+    sqlite_where=timer_running(),
+    postgresql_where=timer_running(),
+)
+
+
+# Timer interval log: one row per stretch of running time, open (ended_at
+# NULL) while the timer runs. recorded_time is the cached sum of the closed
+# intervals and can be rebuilt from them
+
+
+class ActivityInterval(Base):
+    __tablename__ = "activity_intervals"
+
+    id = Column(Integer, primary_key=True, index=True)
+    activity_id = Column(
+        Integer,
+        ForeignKey("activities.id", ondelete="CASCADE"),
+        index=True,
+        nullable=False,
+    )
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# Serves a user's time-range queries as index range scans; also covers the
+# columns reports read, so they never visit the table
+Index(
+    "ix_activity_intervals_user_id_started_at",
+    ActivityInterval.user_id,
+    ActivityInterval.started_at,
+    ActivityInterval.ended_at,
+    ActivityInterval.activity_id,
+)
+
+
+# Partial index over running intervals, read for the live part of reports
+Index(
+    "ix_activity_intervals_user_id_open",
+    ActivityInterval.user_id,
+    sqlite_where=ActivityInterval.ended_at.is_(None),
+    postgresql_where=ActivityInterval.ended_at.is_(None),
+)
+
+
+# Seconds of closed timer intervals per user, tag and day, kept current by
+# the timer, update and delete endpoints. tag_id is a Tag id or one of the
+# daily_rollups.ALL_TAGS / UNTAGGED sentinels
+
+
+class DailyRollup(Base):
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tag_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    seconds = Column(Integer, default=0, nullable=False)
+
+
+# Number of a user's activities carrying each tag, kept current by every
+# endpoint that changes activity tags; ranks tag search results
+
+
+class TagUsage(Base):
+    __tablename__ = "tag_usage"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), primary_key=True)
+    uses = Column(Integer, default=0, nullable=False)
+
+
 # Tag database model
 
 
+def fold_tag_name(name: str) -> str:
+    """
+    Case-folded form of a tag name, compared by tag search
+    """
+    return name.casefold()
+
+
 class Tag(Base):
     __tablename__ = "tags"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
+    # Filled from name on every insert. Compared by code point (SQLite's
+    # default, "C" on PostgreSQL) so a prefix is one index range. NULL for
+    # tags created before it existed until maintenance rebuild-tag-search runs
+    name_folded = Column(
+        String().with_variant(postgresql.VARCHAR(collation="C"), "postgresql"),
+        default=lambda context: fold_tag_name(
+            context.get_current_parameters()["name"]
+        ),
+        index=True,
+        nullable=True,
+    )
     activities = relationship(
         "Activity", secondary=activity_tags, back_populates="tags"
     )
+
+
+# Notification outbox, written in the same transaction as the change that
+# triggers the notification and drained by the outbox relay
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    # pending, dead (gave up after too many attempts)
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # Naive UTC; also pushed forward while a relay holds the row
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+Index(
+    "ix_notification_outbox_status_next_attempt_at",
+    NotificationOutbox.status,
+    NotificationOutbox.next_attempt_at,
+)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; anything else (blocked bot, bad chat id) is final
+RETRYABLE_ERRORS = (TelegramNetworkError, TelegramServerError)
+
+
+class NotificationDispatcher:
+    """
+    Delivers Telegram messages from a bounded pool of async workers.
+
+    Sends are paced to stay under Telegram's global limit and its per-chat
+    limit. A RetryAfter from Telegram pauses every worker for the requested
+    time before the message is retried; network and server errors are
+    retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable[object]],
+        workers: int,
+        global_rate: float,
+        per_chat_interval: float,
+        max_retries: int,
+        backoff_base: float = 1.0,
+    ):
+        self._send = send
+        self.workers = workers
+        self.global_interval = 1.0 / global_rate
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._next_global_slot = 0.0
+        self._next_chat_slot: Dict[str, float] = {}
+        self._paused_until = 0.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """
+        Start the workers on the running event loop
+        """
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        """
+        Stop the workers; messages still queued are reported as undelivered
+        """
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, _, result = self._queue.get_nowait()
+                if not result.done():
+                    result.set_result(False)
+            self._queue = None
+
+    async def send(self, chat_id: str, text: str) -> bool:
+        """
+        Deliver one message, returns whether it was delivered
+        """
+        if not self._worker_tasks:
+            # Workers not running (e.g. bot disabled); deliver inline
+            return await self._deliver(chat_id, text)
+        result = asyncio.get_running_loop().create_future()
+        await self._queue.put((chat_id, text, result))
+        return await result
+
+    async def send_many(self, messages: Iterable[Tuple[str, str]]) -> List[bool]:
+        """
+        Deliver messages concurrently, returns the delivery result of each
+        """
+        sends = [self.send(chat_id, text) for chat_id, text in messages]
+        return list(await asyncio.gather(*sends))
+
+    async def _worker(self):
+        while True:
+            chat_id, text, result = await self._queue.get()
+            try:
+                delivered = await self._deliver(chat_id, text)
+            except asyncio.CancelledError:
+                if not result.done():
+                    result.set_result(False)
+                raise
+            if not result.done():
+                result.set_result(delivered)
+
+    async def _wait_for_slot(self, chat_id: str):
+        # Reserve the next free global and per-chat slot, then sleep until it
+        now = time.monotonic()
+        slot = max(
+            now,
+            self._paused_until,
+            self._next_global_slot,
+            self._next_chat_slot.get(chat_id, 0.0),
+        )
+        self._next_global_slot = slot + self.global_interval
+        self._next_chat_slot[chat_id] = slot + self.per_chat_interval
+        if len(self._next_chat_slot) > 10000:
+            self._next_chat_slot = {
+                chat: next_slot
+                for chat, next_slot in self._next_chat_slot.items()
+                if next_slot > now
+            }
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _deliver(self, chat_id: str, text: str) -> bool:
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_slot(chat_id)
+            started = time.monotonic()
+            try:
+                await self._send(chat_id, text)
+                metrics.observe("notifications.send_time", time.monotonic() - started)
+                metrics.increment("notifications.sent")
+                return True
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram asked to retry after {e.retry_after}s")
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + e.retry_after
+                )
+                error = e
+            except RETRYABLE_ERRORS as e:
+                logger.warning(f"Retrying notification to chat {chat_id}: {e}")
+                await asyncio.sleep(self.backoff_base * 2 ** attempt)
+                error = e
+            except Exception as e:
+                logger.error(f"Failed to send notification to chat {chat_id}: {e}")
+                metrics.increment("notifications.failed")
+                return False
+            metrics.increment("notifications.retried")
+
+        logger.error(f"Giving up on notification to chat {chat_id}: {error}")
+        metrics.increment("notifications.failed")
+        return False
+
+
+def create_dispatcher(send: Callable[[str, str], Awaitable[object]]):
+    dispatcher = NotificationDispatcher(
+        send,
+        workers=config.NOTIFY_WORKERS,
+        global_rate=config.NOTIFY_GLOBAL_RATE,
+        per_chat_interval=config.NOTIFY_PER_CHAT_INTERVAL,
+        max_retries=config.NOTIFY_MAX_RETRIES,
+    )
+    metrics.register_gauge("notifications.queued", lambda: dispatcher.queue_size)
+    return dispatcher
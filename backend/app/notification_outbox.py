@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+from sqlalchemy import delete, select, update
+from . import config, database, metrics, models
+
+logger = logging.getLogger(__name__)
+
+SendMany = Callable[[Iterable[Tuple[str, str]]], Awaitable[List[bool]]]
+
+
+def enqueue_notification(db, chat_id: str, message: str):
+    """
+    Queue a Telegram message in the outbox. It is only sent once the
+    caller's transaction commits, and survives restarts until delivered.
+    """
+    db.add(models.NotificationOutbox(chat_id=chat_id, message=message))
+
+
+class OutboxRelay:
+    """
+    Drains the notification outbox in batches.
+
+    Each batch is claimed by pushing next_attempt_at past a lease in one
+    UPDATE, so a crashed relay's rows become due again once the lease runs
+    out and a concurrent relay never picks up the same rows. The lease is
+    renewed while the batch is being sent, as per-chat pacing and retries
+    can stretch a batch well past it. Delivered rows
+    are deleted; failed ones are retried with exponential backoff and moved
+    to the dead status after max_attempts. No database session is held while
+    messages are sent.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_attempts: int,
+        poll_interval: float,
+        lease_seconds: float,
+        backoff_base: float = 5.0,
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def wake(self):
+        """
+        Ask the relay to drain now; safe to call from any thread
+        """
+        with self._lock:
+            loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def drain_once(self, send_many: SendMany) -> int:
+        """
+        Claim and deliver one batch, returns the number of rows claimed
+        """
+        now = datetime.utcnow()
+        outbox = models.NotificationOutbox
+        # Claim in one short session, send outside it and record the results
+        # in another, so slow sends don't keep a background session slot
+        async with database.background_session() as db:
+            claimable = (
+                select(outbox.id)
+                .where(outbox.status == "pending", outbox.next_attempt_at <= now)
+                .order_by(outbox.id)
+                .limit(self.batch_size)
+                .scalar_subquery()
+            )
+            rows = (
+                await db.execute(
+                    update(outbox)
+                    .where(
+                        outbox.id.in_(claimable),
+                        outbox.status == "pending",
+                        outbox.next_attempt_at <= now,
+                    )
+                    .values(
+                        next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+                    )
+                    .returning(
+                        outbox.id, outbox.chat_id, outbox.message, outbox.attempts
+                    )
+                )
+            ).all()
+            await db.commit()
+        if not rows:
+            return 0
+
+        renewal = asyncio.create_task(self._renew_lease([row.id for row in rows]))
+        try:
+            delivered = await send_many((row.chat_id, row.message) for row in rows)
+        finally:
+            renewal.cancel()
+            try:
+                await renewal
+            except asyncio.CancelledError:
+                pass
+
+        sent_ids = [row.id for row, sent in zip(rows, delivered) if sent]
+        retries = []
+        for row, sent in zip(rows, delivered):
+            if sent:
+                continue
+            attempts = row.attempts + 1
+            dead = attempts >= self.max_attempts
+            retries.append(
+                {
+                    "id": row.id,
+                    "attempts": attempts,
+                    "status": "dead" if dead else "pending",
+                    "last_error": "Delivery failed",
+                    "next_attempt_at": datetime.utcnow()
+                    + timedelta(seconds=self.backoff_base * 2 ** (attempts - 1)),
+                }
+            )
+            if dead:
+                logger.error(f"Notification {row.id} moved to dead letters")
+                metrics.increment("outbox.dead")
+
+        async with database.background_session() as db:
+            if sent_ids:
+                await db.execute(delete(outbox).where(outbox.id.in_(sent_ids)))
+            if retries:
+                await db.execute(update(outbox), retries)
+            await db.commit()
+
+        metrics.increment("outbox.delivered", len(sent_ids))
+        metrics.increment("outbox.failed", len(retries))
+        return len(rows)
+
+    async def _renew_lease(self, ids: List[int]):
+        """
+        Push the lease of the claimed rows forward every half lease until
+        cancelled
+        """
+        outbox = models.NotificationOutbox
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                async with database.background_session() as db:
+                    await db.execute(
+                        update(outbox)
+                        .where(outbox.id.in_(ids), outbox.status == "pending")
+                        .values(
+                            next_attempt_at=datetime.utcnow()
+                            + timedelta(seconds=self.lease_seconds)
+                        )
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Error renewing the notification outbox lease: {e}")
+
+    async def run(self, send_many: SendMany):
+        """
+        Drain the outbox until cancelled, waking on wake() or every
+        poll_interval seconds
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    # Keep going while full batches come back
+                    while await self.drain_once(send_many) >= self.batch_size:
+                        pass
+                except Exception as e:
+                    logger.error(f"Error in notification outbox relay: {e}")
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=self.poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._loop = None
+
+
+outbox_relay = OutboxRelay(
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    poll_interval=config.OUTBOX_POLL_SECONDS,
+    lease_seconds=config.OUTBOX_LEASE_SECONDS,
+)
@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(start_time: datetime, activity_id: int) -> str:
+    """
+    Encode the (start_time, id) position of an activity as an opaque cursor
+    """
+    raw = json.dumps([start_time.isoformat(), activity_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor
+    Raises InvalidCursor if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        start_time, activity_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(start_time), int(activity_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+from . import config, metrics
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    The fields of an authenticated user that request handlers need,
+    detached from any database session
+    """
+
+    id: int
+    email: str
+    is_active: bool
+    telegram_chat_id: Optional[str] = None
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of verified token -> UserSnapshot.
+
+    Entries expire after the configured TTL and never outlive the token's
+    own exp claim. invalidate_user drops every cached token of a user, so
+    changes to the user take effect on the next request.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                metrics.increment("principal_cache.miss")
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                metrics.increment("principal_cache.miss")
+                return None
+            self._entries.move_to_end(token)
+        metrics.increment("principal_cache.hit")
+        return user
+
+    def put(self, token: str, user: UserSnapshot, token_expires_at: float):
+        expires_at = min(time.time() + self.ttl_seconds, token_expires_at)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (user, expires_at)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+principal_cache = PrincipalCache(
+    max_size=config.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=config.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+metrics.register_gauge("principal_cache.size", lambda: len(principal_cache))
@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import select
+from . import config, database, models
+
+logger = logging.getLogger(__name__)
+
+# How long before scheduled_time the reminder is sent
+REMINDER_LEAD_TIME = timedelta(minutes=10)
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """
+    Convert a datetime to naive UTC, the form scheduled_time is compared in
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ReminderScheduler:
+    """
+    Keeps a min-heap of upcoming reminder times and sleeps until the next
+    one is due, instead of polling the activities table.
+
+    The heap only holds reminders due within the reconciliation horizon.
+    A periodic reconciliation sweep reloads that window from the database,
+    which picks up far-future reminders as they come close and anything
+    scheduled by another process. schedule and cancel may be called from
+    any thread.
+    """
+
+    def __init__(self, lead_time: timedelta, reconcile_interval: float):
+        self.lead_time = lead_time
+        self.reconcile_interval = reconcile_interval
+        self._heap = []
+        # activity_id -> due time of its live heap entry; other entries are stale
+        self._due_at: Dict[int, datetime] = {}
+        self._horizon: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def schedule(self, activity_id: int, scheduled_time: Optional[datetime]):
+        """
+        Add or move the reminder of an activity
+        """
+        if scheduled_time is None:
+            self.cancel(activity_id)
+            return
+        due_at = to_utc_naive(scheduled_time) - self.lead_time
+        with self._lock:
+            if self._loop is None:
+                return
+            if self._horizon is not None and due_at > self._horizon:
+                # Loaded by a later reconciliation sweep
+                self._due_at.pop(activity_id, None)
+                return
+            if self._due_at.get(activity_id) == due_at:
+                return
+            self._due_at[activity_id] = due_at
+            heapq.heappush(self._heap, (due_at, activity_id))
+            loop = self._loop
+        loop.call_soon_threadsafe(self._wakeup.set)
+
+    def cancel(self, activity_id: int):
+        """
+        Drop the reminder of an activity
+        """
+        with self._lock:
+            self._due_at.pop(activity_id, None)
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """
+        Remove and return the activities whose reminders are due
+        """
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, activity_id = heapq.heappop(self._heap)
+                if self._due_at.get(activity_id) == due_at:
+                    del self._due_at[activity_id]
+                    due.append(activity_id)
+        return due
+
+    def seconds_until_next(self, now: datetime) -> Optional[float]:
+        with self._lock:
+            while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max((self._heap[0][0] - now).total_seconds(), 0.0)
+
+    async def reconcile(self):
+        """
+        Reload the reminders due within the next horizon from the database
+        """
+        now = datetime.utcnow()
+        horizon = now + timedelta(seconds=2 * self.reconcile_interval)
+        async with database.background_session() as db:
+            rows = (
+                await db.execute(
+                    select(models.Activity.id, models.Activity.scheduled_time).where(
+                        models.Activity.scheduled_time >= now,
+                        models.Activity.scheduled_time <= horizon + self.lead_time,
+                        models.Activity.timer_status == "stopped",
+                        models.Activity.notified.is_(False),
+                    )
+                )
+            ).all()
+        with self._lock:
+            self._horizon = horizon
+        for activity_id, scheduled_time in rows:
+            self.schedule(activity_id, scheduled_time)
+        logger.info(f"[NOTIFY] Reconciled {len(rows)} upcoming reminders")
+
+    async def run(self, send_reminders: Callable[[List[int]], Awaitable[None]]):
+        """
+        Send reminders as they become due until cancelled
+        """
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+        next_reconcile = time.monotonic()
+        try:
+            while True:
+                self._wakeup.clear()
+                try:
+                    if time.monotonic() >= next_reconcile:
+                        await self.reconcile()
+                        next_reconcile = time.monotonic() + self.reconcile_interval
+
+                    due = self.pop_due(datetime.utcnow())
+                    if due:
+                        await send_reminders(due)
+                except Exception as e:
+                    logger.error(f"Error in reminder scheduler: {e}")
+
+                delay = next_reconcile - time.monotonic()
+                next_due = self.seconds_until_next(datetime.utcnow())
+                if next_due is not None:
+                    delay = min(delay, next_due)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._loop = None
+                self._heap.clear()
+                self._due_at.clear()
+                self._horizon = None
+
+
+reminder_scheduler = ReminderScheduler(
+    lead_time=REMINDER_LEAD_TIME,
+    reconcile_interval=config.REMINDER_RECONCILE_SECONDS,
+)
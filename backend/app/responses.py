@@ -0,0 +1,24 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson, the app's default response class
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def model_response(adapter: TypeAdapter, value: Any, **kwargs) -> Response:
+    """
+    Serialize ORM objects or dicts through a schema's TypeAdapter straight to
+    JSON bytes in pydantic-core, skipping the intermediate Python objects
+    FastAPI's response_model path builds. Keep response_model on the route
+    for the OpenAPI schema.
+    """
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(body, media_type="application/json", **kwargs)
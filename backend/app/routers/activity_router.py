@@ -1,15 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from collections import Counter, defaultdict
+from typing import List, Literal, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
-from .. import models, schemas, auth
-from ..database import get_db
+from sqlalchemy import bindparam, case, delete, insert, literal, or_, select
+from sqlalchemy import update
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from .. import activity_io, etags, models, schemas, auth, tag_service
+from ..database import get_async_db, get_db
+from ..pagination import InvalidCursor, decode_cursor, encode_cursor
+from ..principal_cache import UserSnapshot
+from ..responses import model_response
+from ..reminder_scheduler import reminder_scheduler
+from ..sql_functions import seconds_between
+from ..daily_rollups import apply_changes, rollup_changes
+from ..timer_intervals import close_intervals, closed_intervals, open_intervals
 import logging
-from ..telegram_bot import send_notification, format_time
+from ..notification_outbox import enqueue_notification, outbox_relay
+from ..telegram_bot import format_time
 
 
 ACTIVITY_NOT_FOUND = "Activity not found"
 
+# Serializes activity pages straight to JSON
+ACTIVITY_LIST = TypeAdapter(List[schemas.Activity])
+
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,14 +36,15 @@ logger = logging.getLogger(__name__)
 activity_router = APIRouter(prefix="/activities", tags=["activities"])
 
 
-# Calculate elapsed time between timer start and now
-def calculate_elapsed_time(activity):
-    if activity.timer_status == "running" and activity.last_timer_start:
-        # Calculate time since timer was started
-        elapsed = datetime.now() - activity.last_timer_start
-        # Convert to seconds
-        return int(elapsed.total_seconds())
-    return 0
+# Reload an activity after commit with its tags in a single query
+def reload_activity(db: Session, activity_id: int):
+    return (
+        db.query(models.Activity)
+        .options(joinedload(models.Activity.tags))
+        .populate_existing()
+        .filter(models.Activity.id == activity_id)
+        .one()
+    )
 
 
 # Activity endpoints
@@ -35,7 +54,7 @@ def calculate_elapsed_time(activity):
 def create_activity(
     activity: schemas.ActivityCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     # Get tags from activity data
     tag_names = activity.tags
@@ -46,23 +65,22 @@ def create_activity(
 
     # Create new activity
     db_activity = models.Activity(**activity_data)
+    db.add(db_activity)
 
     # Associate tags with the activity
-    for tag_name in tag_names:
-        # Check if tag exists
-        tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-        if not tag:
-            # Create new tag if it doesn't exist
-            tag = models.Tag(name=tag_name)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        db_activity.tags.append(tag)
-
-    # Save activity to database
-    db.add(db_activity)
+    db_activity.tags = tag_service.resolve_tags(db, tag_names)
+    tag_service.apply_usage_changes(
+        db,
+        tag_service.usage_changes(
+            current_user.id, [tag.id for tag in db_activity.tags]
+        ),
+    )
+
+    # Save activity and tags to database in one transaction
+    db.execute(etags.bump_activities_version(current_user.id))
     db.commit()
-    db.refresh(db_activity)
+    db_activity = reload_activity(db, db_activity.id)
+    reminder_scheduler.schedule(db_activity.id, db_activity.scheduled_time)
 
     logger.info(
         f"Activity created by user: {current_user.email}, activity ID: {db_activity.id}"
@@ -72,48 +90,330 @@ def create_activity(
 
 @activity_router.get("/", response_model=List[schemas.Activity])
 def read_activities(
+    request: Request,
     skip: int = 0,
     limit: int = 15,
     tag: Optional[str] = None,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
-    # Base query for user's activities
-    query = db.query(models.Activity).filter(models.Activity.user_id == current_user.id)
+    # The ETag comes from the user's activities_version, one primary key
+    # lookup. It is read before the page, so a write in between leaves the
+    # ETag older than the page rather than the other way round
+    version = db.scalar(
+        select(models.User.activities_version).where(
+            models.User.id == current_user.id
+        )
+    )
+    etag = etags.activity_list_etag(current_user.id, version, request.url.query)
+    # Pages only get an ETag while none of their timers run, and starting one
+    # bumps the version, so a matching ETag answers the request unloaded.
+    # "*" vouches for nothing and waits until the page is loaded
+    if etags.etag_matches(if_none_match, etag, wildcard=False):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {}
+
+    # Base query for user's activities, tags for the whole page in one query
+    query = (
+        db.query(models.Activity)
+        .options(selectinload(models.Activity.tags))
+        .filter(models.Activity.user_id == current_user.id)
+    )
 
     # Filter by tag if provided
     if tag:
         query = query.join(models.Activity.tags).filter(models.Tag.name == tag)
 
+    query = query.order_by(models.Activity.start_time.desc(), models.Activity.id)
+
+    # Continue after the cursor position instead of skipping rows
+    if cursor:
+        try:
+            cursor_start_time, cursor_id = decode_cursor(cursor)
+        except InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(
+            models.Activity.start_time <= cursor_start_time,
+            or_(
+                models.Activity.start_time < cursor_start_time,
+                models.Activity.id > cursor_id,
+            ),
+        )
+    else:
+        query = query.offset(skip)
+
     # Get activities with pagination
-    activities = (
-        query.order_by(models.Activity.start_time.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    activities = query.limit(limit).all()
+
+    # A running timer's time keeps growing, so its page must not be cached
+    if not any(activity.timer_status == "running" for activity in activities):
+        if etags.etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        headers["ETag"] = etag
 
-    # Update timer status for running timers
-    for activity in activities:
-        if activity.timer_status == "running":
-            elapsed = calculate_elapsed_time(activity)
-            activity.recorded_time += elapsed
+    # Point the client at the next page when this one is full
+    if activities and len(activities) == limit:
+        last = activities[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.start_time, last.id)
 
     logger.info(
         f"Activities retrieved for user: {current_user.email}, count: {len(activities)}"
     )
-    return activities
+    return model_response(ACTIVITY_LIST, activities, headers=headers)
+
+
+@activity_router.get("/export")
+async def export_activities(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    # Rows are read while the response streams, through a session of the
+    # export's own: the request's session is closed by then
+    media_type = activity_io.EXPORT_FORMATS[export_format][0]
+    logger.info(
+        f"Activities exported as {export_format} by user: {current_user.email}"
+    )
+    return StreamingResponse(
+        activity_io.export_activities(current_user.id, export_format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="activities.{export_format}"'
+            )
+        },
+    )
+
+
+@activity_router.post("/import", response_model=schemas.ImportReport)
+async def import_activities(
+    request: Request,
+    import_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    # Read the body as it arrives and commit one batch at a time, so a large
+    # import neither sits in memory nor holds one long transaction
+    report = schemas.ImportReport(imported=0)
+    async for activities, errors in activity_io.import_batches(
+        request.stream(), import_format
+    ):
+        report.errors.extend(errors)
+        if not activities:
+            continue
+        inserted = await db.run_sync(
+            activity_io.insert_batch, current_user.id, activities
+        )
+        await db.execute(etags.bump_activities_version(current_user.id))
+        await db.commit()
+        report.imported += len(inserted)
+        for activity_id, scheduled_time in inserted:
+            if scheduled_time is not None:
+                reminder_scheduler.schedule(activity_id, scheduled_time)
+
+    logger.info(
+        f"Activities imported by user: {current_user.email}, "
+        f"count: {report.imported}, rejected: {len(report.errors)}"
+    )
+    return report
+
+
+@activity_router.post("/batch", response_model=schemas.ActivityBatchResult)
+def batch_activities(
+    batch: schemas.ActivityBatch,
+    db: Session = Depends(get_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    # Every change is applied with set-based statements in one transaction;
+    # the number of statements doesn't grow with the size of the batch
+    activity = models.Activity
+    links = models.activity_tags
+    interval = models.ActivityInterval
+    update_ids = [item.id for item in batch.update]
+    delete_ids = batch.delete
+    target_ids = update_ids + delete_ids
+    if len(set(target_ids)) != len(target_ids):
+        raise HTTPException(
+            status_code=400, detail="An activity can only appear once per batch"
+        )
+
+    if target_ids:
+        owned = set(
+            db.scalars(
+                select(activity.id).where(
+                    activity.id.in_(target_ids),
+                    activity.user_id == current_user.id,
+                )
+            )
+        )
+        missing = [
+            activity_id for activity_id in target_ids if activity_id not in owned
+        ]
+        if missing:
+            logger.warning(
+                f"Activity batch failed: Activities {missing} not found for "
+                f"user {current_user.email}"
+            )
+            raise HTTPException(status_code=404, detail=ACTIVITY_NOT_FOUND)
+
+    # Current tags and logged time of the activities whose tags change
+    retagged = {item.id: item.tags for item in batch.update if item.tags is not None}
+    moved_ids = list(retagged) + delete_ids
+    old_tags = defaultdict(list)
+    intervals = defaultdict(list)
+    if moved_ids:
+        for activity_id, tag_id in db.execute(
+            select(links.c.activity_id, links.c.tag_id).where(
+                links.c.activity_id.in_(moved_ids)
+            )
+        ):
+            old_tags[activity_id].append(tag_id)
+        for row in db.execute(
+            select(interval.activity_id, interval.started_at, interval.ended_at).where(
+                interval.activity_id.in_(moved_ids), interval.ended_at.isnot(None)
+            )
+        ):
+            intervals[row.activity_id].append((row.started_at, row.ended_at))
+
+    changes = Counter()
+    usage = Counter()
+    if delete_ids:
+        # Take the activities' tracked time and use counts away from their tags
+        for activity_id in delete_ids:
+            rollup_changes(
+                current_user.id,
+                old_tags[activity_id],
+                intervals[activity_id],
+                -1,
+                changes,
+            )
+            tag_service.usage_changes(
+                current_user.id, old_tags[activity_id], -1, usage
+            )
+        db.execute(delete(interval).where(interval.activity_id.in_(delete_ids)))
+        db.execute(delete(links).where(links.c.activity_id.in_(delete_ids)))
+        db.execute(delete(activity).where(activity.id.in_(delete_ids)))
+
+    if retagged:
+        # Replace the tags of every retagged activity, moving their tracked
+        # time and use counts to the new tags
+        tags = tag_service.resolve_tag_ids(
+            db, (name for names in retagged.values() for name in names)
+        )
+        new_tags = {
+            activity_id: [tags[name] for name in tag_service.unique_tag_names(names)]
+            for activity_id, names in retagged.items()
+        }
+        for activity_id, tag_ids in new_tags.items():
+            if set(tag_ids) != set(old_tags[activity_id]):
+                rollup_changes(
+                    current_user.id,
+                    old_tags[activity_id],
+                    intervals[activity_id],
+                    -1,
+                    changes,
+                )
+                rollup_changes(
+                    current_user.id, tag_ids, intervals[activity_id], 1, changes
+                )
+                tag_service.usage_changes(
+                    current_user.id, old_tags[activity_id], -1, usage
+                )
+                tag_service.usage_changes(current_user.id, tag_ids, 1, usage)
+        db.execute(delete(links).where(links.c.activity_id.in_(list(retagged))))
+        new_links = [
+            {"activity_id": activity_id, "tag_id": tag_id}
+            for activity_id, tag_ids in new_tags.items()
+            for tag_id in tag_ids
+        ]
+        if new_links:
+            db.execute(insert(links), new_links)
+
+    # One executemany UPDATE per combination of changed fields. Every
+    # updated row gets a new updated_at, including ones whose tags alone
+    # changed
+    updates = defaultdict(list)
+    updated_at = datetime.utcnow()
+    for item in batch.update:
+        values = item.dict(exclude_unset=True, exclude={"id", "tags"})
+        values["updated_at"] = updated_at
+        # A new scheduled time needs a new reminder
+        if "scheduled_time" in values:
+            values["notified"] = False
+        updates[tuple(sorted(values))].append(dict(values, activity_id=item.id))
+    for rows in updates.values():
+        db.execute(
+            update(activity.__table__).where(
+                activity.__table__.c.id == bindparam("activity_id")
+            ),
+            rows,
+        )
+
+    created = activity_io.insert_batch(db, current_user.id, batch.create)
+
+    statement = apply_changes(db, changes)
+    if statement is not None:
+        db.execute(statement)
+    tag_service.apply_usage_changes(db, usage)
+    db.execute(etags.bump_activities_version(current_user.id))
+    db.commit()
+
+    for activity_id in delete_ids:
+        reminder_scheduler.cancel(activity_id)
+    for activity_id, scheduled_time in created:
+        reminder_scheduler.schedule(activity_id, scheduled_time)
+    for item in batch.update:
+        if "scheduled_time" in item.model_fields_set:
+            reminder_scheduler.schedule(item.id, item.scheduled_time)
+
+    # Reload the created and updated activities with their tags
+    created_ids = [activity_id for activity_id, _ in created]
+    loaded = {
+        row.id: row
+        for row in db.scalars(
+            select(activity)
+            .options(selectinload(activity.tags))
+            .where(activity.id.in_(created_ids + update_ids))
+        )
+    }
+    logger.info(
+        f"Activity batch by user: {current_user.email}, created: "
+        f"{len(created_ids)}, updated: {len(update_ids)}, deleted: {len(delete_ids)}"
+    )
+    return {
+        "created": [loaded[activity_id] for activity_id in created_ids],
+        "updated": [loaded[activity_id] for activity_id in update_ids],
+        "deleted": delete_ids,
+    }
 
 
 @activity_router.get("/{activity_id}", response_model=schemas.Activity)
 def read_activity(
     activity_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
+    # Check a conditional request against updated_at alone, so an unchanged
+    # activity is neither loaded with its tags nor serialized
+    if if_none_match:
+        current = db.execute(
+            select(models.Activity.updated_at, models.Activity.timer_status).where(
+                models.Activity.id == activity_id,
+                models.Activity.user_id == current_user.id,
+            )
+        ).first()
+        if current and current.timer_status != "running":
+            etag = etags.activity_etag(activity_id, current.updated_at)
+            if etags.etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={"ETag": etag})
+
     # Get activity
     db_activity = (
         db.query(models.Activity)
+        .options(joinedload(models.Activity.tags))
         .filter(
             models.Activity.id == activity_id,
             models.Activity.user_id == current_user.id,
@@ -127,13 +427,11 @@ def read_activity(
         )
         raise HTTPException(status_code=404, detail=ACTIVITY_NOT_FOUND)
 
-    # Update recorded time if timer is running
-    if db_activity.timer_status == "running" and db_activity.last_timer_start:
-        elapsed = calculate_elapsed_time(db_activity)
-        db_activity.recorded_time += elapsed
-        db_activity.last_timer_start = datetime.now()
-        db.commit()
-
+    # A running timer's time keeps growing, so it must not be cached
+    if db_activity.timer_status != "running":
+        response.headers["ETag"] = etags.activity_etag(
+            activity_id, db_activity.updated_at
+        )
     logger.info(f"Activity {activity_id} retrieved by user: {current_user.email}")
     return db_activity
 
@@ -143,10 +441,11 @@ def update_activity(
     activity_id: int,
     activity: schemas.ActivityUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     db_activity = (
         db.query(models.Activity)
+        .options(joinedload(models.Activity.tags))
         .filter(
             models.Activity.id == activity_id,
             models.Activity.user_id == current_user.id,
@@ -164,28 +463,40 @@ def update_activity(
     update_data = activity.dict(exclude_unset=True)
 
     # Handle tags separately if provided
-    if "tags" in update_data:
-        tag_names = update_data.pop("tags")
-        # Clear existing tags
-        db_activity.tags = []
-        # Add new tags
-        for tag_name in tag_names:
-            # Check if tag exists
-            tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-            if not tag:
-                # Create new tag if it doesn't exist
-                tag = models.Tag(name=tag_name)
-                db.add(tag)
-                db.commit()
-                db.refresh(tag)
-            db_activity.tags.append(tag)
+    tag_names = update_data.pop("tags", None)
+    if tag_names is not None:
+        # Replace existing tags with the resolved ones
+        old_tag_ids = [tag.id for tag in db_activity.tags]
+        db_activity.tags = tag_service.resolve_tags(db, tag_names)
+        new_tag_ids = [tag.id for tag in db_activity.tags]
+
+        # Move the activity's tracked time and use count to its new tags
+        if set(old_tag_ids) != set(new_tag_ids):
+            intervals = db.execute(closed_intervals(activity_id)).all()
+            changes = rollup_changes(current_user.id, old_tag_ids, intervals, -1)
+            rollup_changes(current_user.id, new_tag_ids, intervals, 1, changes)
+            statement = apply_changes(db, changes)
+            if statement is not None:
+                db.execute(statement)
+            usage = tag_service.usage_changes(current_user.id, old_tag_ids, -1)
+            tag_service.usage_changes(current_user.id, new_tag_ids, 1, usage)
+            tag_service.apply_usage_changes(db, usage)
+
+    # A new scheduled time needs a new reminder
+    if "scheduled_time" in update_data:
+        db_activity.notified = False
 
     # Update other fields
     for key, value in update_data.items():
         setattr(db_activity, key, value)
+    # Set explicitly, as a change to the tags alone doesn't UPDATE the row
+    db_activity.updated_at = datetime.utcnow()
+    db.execute(etags.bump_activities_version(current_user.id))
 
     db.commit()
-    db.refresh(db_activity)
+    db_activity = reload_activity(db, activity_id)
+    if "scheduled_time" in update_data:
+        reminder_scheduler.schedule(activity_id, db_activity.scheduled_time)
     logger.info(f"Activity {activity_id} updated by user: {current_user.email}")
     return db_activity
 
@@ -194,7 +505,7 @@ def update_activity(
 def delete_activity(
     activity_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     db_activity = (
         db.query(models.Activity)
@@ -211,131 +522,275 @@ def delete_activity(
         )
         raise HTTPException(status_code=404, detail=ACTIVITY_NOT_FOUND)
 
+    # Take the activity's tracked time and use count away from its tags
+    tag_ids = [tag.id for tag in db_activity.tags]
+    intervals = db.execute(closed_intervals(activity_id)).all()
+    statement = apply_changes(
+        db, rollup_changes(current_user.id, tag_ids, intervals, -1)
+    )
+    if statement is not None:
+        db.execute(statement)
+    tag_service.apply_usage_changes(
+        db, tag_service.usage_changes(current_user.id, tag_ids, -1)
+    )
+    db.execute(
+        delete(models.ActivityInterval).where(
+            models.ActivityInterval.activity_id == activity_id
+        )
+    )
     db.delete(db_activity)
+    db.execute(etags.bump_activities_version(current_user.id))
     db.commit()
+    reminder_scheduler.cancel(activity_id)
     logger.info(f"Activity {activity_id} deleted by user: {current_user.email}")
     return {"message": "Activity deleted successfully"}
 
 
 # Timer functionality endpoints
 
+# Timer state machine: action -> (statuses it may start from, status it
+# leaves the timer in). save keeps the status and folds running time into
+# recorded_time
+TIMER_TRANSITIONS = {
+    "start": (("stopped", "paused"), "running"),
+    "pause": (("running",), "paused"),
+    "stop": (("running", "paused"), "stopped"),
+    "save": (("stopped", "running", "paused"), None),
+}
+
+# Telegram notification sent after each action, if any
+TIMER_NOTIFICATIONS = {
+    "start": "▶️ Timer started for task: {title}",
+    "pause": "⏸️ Timer paused for task: {title}\nSaved time: {time}",
+    "stop": "⏹️ Timer stopped for task: {title}\nTotal time: {time}",
+}
+
+# Single notification sent for a timer batch acting on several activities,
+# followed by one TIMER_BATCH_LINE per activity
+TIMER_BATCH_NOTIFICATIONS = {
+    "start": "▶️ Timers started for {count} tasks:",
+    "pause": "⏸️ Timers paused for {count} tasks:",
+    "stop": "⏹️ Timers stopped for {count} tasks:",
+}
+TIMER_BATCH_LINE = "• {title}: {time}"
+
+
+def timer_transition_values(action, current_time):
+    """
+    SET clause for a timer action. Elapsed running time is computed in SQL
+    from the row's own last_timer_start, so the update needs no prior read.
+    """
+    activity = models.Activity
+    running = activity.timer_status == "running"
+    now = literal(current_time, activity.last_timer_start.type)
+    elapsed = case(
+        (
+            running & activity.last_timer_start.isnot(None),
+            seconds_between(activity.last_timer_start, now),
+        ),
+        else_=0,
+    )
 
-async def handle_timer_start(activity, current_time, user):
-    """Handle timer start action."""
-    if activity.timer_status == "running":
-        logger.info(f"Timer already running for activity {activity.id}")
-        return False
-
-    activity.timer_status = "running"
-    activity.last_timer_start = current_time
-
-    if user.telegram_chat_id:
-        await send_notification(user.id, f"▶️ Timer started for task: {activity.title}")
-    logger.info(f"Timer started for activity {activity.id} by user {user.email}")
-    return True
-
-
-async def handle_timer_pause(activity, current_time, user):
-    """Handle timer pause action."""
-    if activity.timer_status != "running":
-        logger.warning(f"Cannot pause: Timer not running for activity {activity.id}")
-        raise HTTPException(status_code=400, detail="Timer not running")
-
-    elapsed = calculate_elapsed_time(activity)
-    activity.recorded_time += elapsed
-    activity.timer_status = "paused"
-    activity.last_timer_start = None
-
-    if user.telegram_chat_id:
-        await send_notification(
-            user.id,
-            f"⏸️ Timer paused for task: {activity.title}\n"
-            f"Saved time: {format_time(activity.recorded_time)}",
-        )
-    logger.info(f"Timer paused for activity {activity.id} by user {user.email}")
-    return True
-
-
-async def handle_timer_stop(activity, current_time, user):
-    """Handle timer stop action."""
-    if activity.timer_status == "stopped":
-        logger.warning(f"Timer already stopped for activity {activity.id}")
-        return False
-
-    if activity.timer_status == "running":
-        elapsed = calculate_elapsed_time(activity)
-        activity.recorded_time += elapsed
-
-    activity.timer_status = "stopped"
-    activity.last_timer_start = None
-
-    if user.telegram_chat_id:
-        await send_notification(
-            user.id,
-            f"⏹️ Timer stopped for task: {activity.title}\n"
-            f"Total time: {format_time(activity.recorded_time)}",
+    if action == "start":
+        return {"timer_status": "running", "last_timer_start": now}
+    values = {"recorded_time": activity.recorded_time + elapsed}
+    if action == "save":
+        values["last_timer_start"] = case(
+            (running, now), else_=activity.last_timer_start
         )
-    logger.info(f"Timer stopped for activity {activity.id} by user {user.email}")
-    return True
-
-
-def handle_timer_save(activity, current_time):
-    """Handle timer save action."""
-    if activity.timer_status == "running":
-        elapsed = calculate_elapsed_time(activity)
-        activity.recorded_time += elapsed
-        activity.last_timer_start = current_time
-
-    logger.info(f"Timer saved for activity {activity.id}")
-    return True
+    else:
+        values["timer_status"] = TIMER_TRANSITIONS[action][1]
+        values["last_timer_start"] = None
+    return values
+
+
+async def record_intervals(db, action, activities, current_time):
+    """
+    Log the running time of a transition applied to activities: close the
+    intervals that ended, rolling them up per day, and open new ones where
+    the timer (re)starts. save splits a running interval.
+    """
+    if action in ("pause", "stop", "save"):
+        by_id = {activity.id: activity for activity in activities}
+        closed = (
+            await db.execute(close_intervals(list(by_id), current_time))
+        ).all()
+        # Add the closed time to the daily rollups of each activity's tags
+        changes = Counter()
+        for row in closed:
+            activity = by_id[row.activity_id]
+            rollup_changes(
+                activity.user_id,
+                [tag.id for tag in activity.tags],
+                [(row.started_at, row.ended_at)],
+                changes=changes,
+            )
+        statement = apply_changes(db, changes)
+        if statement is not None:
+            await db.execute(statement)
+    opened = [
+        (activity.id, activity.user_id)
+        for activity in activities
+        if action == "start"
+        or (action == "save" and activity.timer_status == "running")
+    ]
+    if opened:
+        await db.execute(open_intervals(opened, current_time))
 
 
 @activity_router.post("/{activity_id}/timer", response_model=schemas.Activity)
 async def activity_timer(
     activity_id: int,
     timer_action: schemas.TimerAction,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
-    # Get activity
+    action = timer_action.action.lower()
+    if action not in TIMER_TRANSITIONS:
+        logger.warning(f"Invalid timer action: {action} for activity {activity_id}")
+        raise HTTPException(status_code=400, detail="Invalid timer action")
+
+    # Check the status and apply the transition in one conditional UPDATE,
+    # so concurrent actions on the same timer can't both succeed
+    current_time = datetime.now()
+    allowed_from = TIMER_TRANSITIONS[action][0]
     db_activity = (
-        db.query(models.Activity)
-        .filter(
-            models.Activity.id == activity_id,
-            models.Activity.user_id == current_user.id,
+        await db.scalars(
+            update(models.Activity)
+            .where(
+                models.Activity.id == activity_id,
+                models.Activity.user_id == current_user.id,
+                models.Activity.timer_status.in_(allowed_from),
+            )
+            .values(**timer_transition_values(action, current_time))
+            .returning(models.Activity)
+            .options(selectinload(models.Activity.tags)),
+            execution_options={"populate_existing": True},
         )
-        .first()
-    )
+    ).one_or_none()
 
     if not db_activity:
+        timer_status = await db.scalar(
+            select(models.Activity.timer_status).where(
+                models.Activity.id == activity_id,
+                models.Activity.user_id == current_user.id,
+            )
+        )
+        if timer_status is None:
+            logger.warning(
+                f"Timer action failed: Activity {activity_id} not found for "
+                f"user {current_user.email}"
+            )
+            raise HTTPException(status_code=404, detail=ACTIVITY_NOT_FOUND)
         logger.warning(
-            f"Timer action failed: Activity {activity_id} not found for "
-            f"user {current_user.email}"
+            f"Cannot {action} timer of activity {activity_id}: it is {timer_status}"
+        )
+        raise HTTPException(
+            status_code=409, detail=f"Cannot {action} a {timer_status} timer"
         )
-        raise HTTPException(status_code=404, detail=ACTIVITY_NOT_FOUND)
 
-    action = timer_action.action.lower()
-    current_time = datetime.now()
+    await record_intervals(db, action, [db_activity], current_time)
 
-    # Handle timer actions using action handlers
-    action_handlers = {
-        "start": handle_timer_start,
-        "pause": handle_timer_pause,
-        "stop": handle_timer_stop,
-        "save": handle_timer_save,
-    }
+    if action in TIMER_NOTIFICATIONS and current_user.telegram_chat_id:
+        enqueue_notification(
+            db,
+            current_user.telegram_chat_id,
+            TIMER_NOTIFICATIONS[action].format(
+                title=db_activity.title,
+                time=format_time(db_activity.recorded_time),
+            ),
+        )
 
-    if action not in action_handlers:
-        logger.warning(f"Invalid timer action: {action} for activity {activity_id}")
+    # Save the transition and queued notification in one transaction; the
+    # outbox relay delivers the notification after the response
+    await db.execute(etags.bump_activities_version(current_user.id))
+    await db.commit()
+    outbox_relay.wake()
+    logger.info(
+        f"Timer {action} for activity {activity_id} by user {current_user.email}"
+    )
+    return db_activity
+
+
+def timer_batch_message(action, activities):
+    """
+    Text of the one notification for a timer batch, or None if the action
+    has none
+    """
+    if action not in TIMER_NOTIFICATIONS:
+        return None
+    if len(activities) == 1:
+        return TIMER_NOTIFICATIONS[action].format(
+            title=activities[0].title,
+            time=format_time(activities[0].recorded_time),
+        )
+    lines = [TIMER_BATCH_NOTIFICATIONS[action].format(count=len(activities))]
+    lines.extend(
+        TIMER_BATCH_LINE.format(
+            title=activity.title, time=format_time(activity.recorded_time)
+        )
+        for activity in activities
+    )
+    return "\n".join(lines)
+
+
+@activity_router.post("/timers/batch", response_model=schemas.TimerBatchResult)
+async def batch_timer(
+    timer_batch: schemas.TimerBatch,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    action = timer_batch.action.lower()
+    if action not in TIMER_TRANSITIONS:
+        logger.warning(f"Invalid timer action: {action} for timer batch")
         raise HTTPException(status_code=400, detail="Invalid timer action")
+    if timer_batch.all_running == (timer_batch.activity_ids is not None):
+        raise HTTPException(
+            status_code=400, detail="Pass either activity_ids or all_running"
+        )
 
-    # Execute the appropriate handler
-    if action == "save":
-        handle_timer_save(db_activity, current_time)
+    # Apply the transition to every matching timer in one conditional
+    # UPDATE; timers in the wrong state are left alone and reported
+    current_time = datetime.now()
+    conditions = [
+        models.Activity.user_id == current_user.id,
+        models.Activity.timer_status.in_(TIMER_TRANSITIONS[action][0]),
+    ]
+    if timer_batch.all_running:
+        conditions.append(models.timer_running())
     else:
-        await action_handlers[action](db_activity, current_time, current_user)
-
-    # Save changes to database
-    db.commit()
-    db.refresh(db_activity)
-    return db_activity
+        conditions.append(models.Activity.id.in_(timer_batch.activity_ids))
+    activities = (
+        await db.scalars(
+            update(models.Activity)
+            .where(*conditions)
+            .values(**timer_transition_values(action, current_time))
+            .returning(models.Activity)
+            .options(selectinload(models.Activity.tags)),
+            execution_options={"populate_existing": True},
+        )
+    ).all()
+    activities.sort(key=lambda activity: activity.id)
+
+    if activities:
+        await record_intervals(db, action, activities, current_time)
+
+        message = timer_batch_message(action, activities)
+        if message and current_user.telegram_chat_id:
+            enqueue_notification(db, current_user.telegram_chat_id, message)
+        await db.execute(etags.bump_activities_version(current_user.id))
+
+    await db.commit()
+    outbox_relay.wake()
+
+    applied = {activity.id for activity in activities}
+    skipped = [
+        activity_id
+        for activity_id in dict.fromkeys(timer_batch.activity_ids or [])
+        if activity_id not in applied
+    ]
+    logger.info(
+        f"Timer {action} for {len(activities)} activities by user "
+        f"{current_user.email}, skipped: {len(skipped)}"
+    )
+    return {"activities": activities, "skipped": skipped}
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from .. import metrics
+
+
+metrics_router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@metrics_router.get("/")
+def read_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,218 @@
+from fastapi import APIRouter, Depends, HTTPException
+from collections import Counter
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas, auth
+from ..daily_rollups import ALL_TAGS, split_by_day
+from ..database import get_async_db
+from ..principal_cache import UserSnapshot
+from ..responses import model_response
+from ..sql_functions import period_start
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+report_router = APIRouter(prefix="/reports", tags=["reports"])
+
+# Serialize report rows straight to JSON
+TAG_TOTALS = TypeAdapter(List[schemas.TagTotal])
+PERIOD_TOTALS = TypeAdapter(List[schemas.PeriodTotal])
+TAG_DAY_TOTALS = TypeAdapter(List[schemas.TagDayTotal])
+
+# Days covered when the request gives no range
+DEFAULT_REPORT_DAYS = 30
+
+# First day of the period containing a day, matching sql_functions.period_start
+PERIOD_STARTS = {
+    "day": lambda day: day,
+    "week": lambda day: day - timedelta(days=day.weekday()),
+    "month": lambda day: day.replace(day=1),
+}
+
+
+class ReportRange:
+    """
+    Inclusive date range of a report, from the start and end query
+    parameters (the last DEFAULT_REPORT_DAYS days by default)
+    """
+
+    def __init__(self, start: Optional[date] = None, end: Optional[date] = None):
+        self.end = end or date.today()
+        self.start = start or self.end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+        if self.start > self.end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+
+
+# Reports add up the closed time in daily_rollups, then add the running
+# timers' elapsed time, which is the only part read from raw intervals
+
+
+def rollups_in_range(user_id: int, report_range: ReportRange):
+    rollup = models.DailyRollup
+    return (
+        rollup.user_id == user_id,
+        rollup.day >= report_range.start,
+        rollup.day <= report_range.end,
+    )
+
+
+def tag_totals(user_id: int, report_range: ReportRange):
+    rollup = models.DailyRollup
+    return (
+        select(models.Tag.name.label("tag"), func.sum(rollup.seconds).label("seconds"))
+        .select_from(rollup)
+        .outerjoin(models.Tag, models.Tag.id == rollup.tag_id)
+        .where(*rollups_in_range(user_id, report_range), rollup.tag_id != ALL_TAGS)
+        .group_by(rollup.tag_id, models.Tag.name)
+    )
+
+
+def period_totals(user_id: int, report_range: ReportRange, period: str):
+    rollup = models.DailyRollup
+    bucket = period_start(period, rollup.day).label("period")
+    return (
+        select(bucket, func.sum(rollup.seconds).label("seconds"))
+        .where(*rollups_in_range(user_id, report_range), rollup.tag_id == ALL_TAGS)
+        .group_by(bucket)
+    )
+
+
+def tag_day_totals(user_id: int, report_range: ReportRange):
+    # Rollup rows are already one per user, tag and day
+    rollup = models.DailyRollup
+    return (
+        select(rollup.day, models.Tag.name.label("tag"), rollup.seconds)
+        .select_from(rollup)
+        .outerjoin(models.Tag, models.Tag.id == rollup.tag_id)
+        .where(*rollups_in_range(user_id, report_range), rollup.tag_id != ALL_TAGS)
+    )
+
+
+def running_intervals(user_id: int):
+    """
+    The user's open intervals, one row per tag of their activity (tag None
+    for untagged activities). Served by ix_activity_intervals_user_id_open.
+    """
+    interval = models.ActivityInterval
+    return (
+        select(interval.id, interval.started_at, models.Tag.name.label("tag"))
+        .select_from(interval)
+        .outerjoin(
+            models.activity_tags,
+            models.activity_tags.c.activity_id == interval.activity_id,
+        )
+        .outerjoin(models.Tag, models.Tag.id == models.activity_tags.c.tag_id)
+        .where(interval.user_id == user_id, interval.ended_at.is_(None))
+    )
+
+
+def running_parts(running, report_range: ReportRange):
+    """
+    Split running intervals at midnight up to now. Yields (interval id,
+    day, tag, seconds) for the days within the range.
+    """
+    for row in running:
+        now = datetime.now(row.started_at.tzinfo)
+        for day, seconds in split_by_day(row.started_at, now):
+            if report_range.start <= day <= report_range.end:
+                yield row.id, day, row.tag, seconds
+
+
+def merge_tag_totals(rows, running, report_range: ReportRange):
+    totals = Counter()
+    for tag, seconds in rows:
+        totals[tag] += seconds
+    for _, _, tag, seconds in running_parts(running, report_range):
+        totals[tag] += seconds
+    return [
+        {"tag": tag, "seconds": seconds}
+        for tag, seconds in sorted(totals.items(), key=lambda item: -item[1])
+        if seconds
+    ]
+
+
+def merge_period_totals(rows, running, report_range: ReportRange, period: str):
+    totals = Counter()
+    for start, seconds in rows:
+        totals[start] += seconds
+    # Count each interval once, however many tags its activity has
+    parts = {
+        (interval_id, day): seconds
+        for interval_id, day, _, seconds in running_parts(running, report_range)
+    }
+    for (_, day), seconds in parts.items():
+        totals[PERIOD_STARTS[period](day)] += seconds
+    return [
+        {"period": start, "seconds": seconds}
+        for start, seconds in sorted(totals.items())
+        if seconds
+    ]
+
+
+def merge_tag_day_totals(rows, running, report_range: ReportRange):
+    # Unpacking rows is much cheaper than attribute access at this size
+    totals = {(day, tag): seconds for day, tag, seconds in rows}
+    for _, day, tag, seconds in running_parts(running, report_range):
+        totals[day, tag] = totals.get((day, tag), 0) + seconds
+    # Untagged time first within each day, then tags by name
+    keys = sorted(totals, key=lambda key: (key[0], key[1] is not None, key[1] or ""))
+    return [
+        {"day": day, "tag": tag, "seconds": totals[day, tag]}
+        for day, tag in keys
+        if totals[day, tag]
+    ]
+
+
+async def load_report(db: AsyncSession, query, user_id: int):
+    rows = (await db.execute(query)).all()
+    running = (await db.execute(running_intervals(user_id))).all()
+    return rows, running
+
+
+@report_router.get("/tags", response_model=List[schemas.TagTotal])
+async def report_by_tag(
+    report_range: ReportRange = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    rows, running = await load_report(
+        db, tag_totals(current_user.id, report_range), current_user.id
+    )
+    logger.info(f"Tag report generated for user: {current_user.email}")
+    return model_response(TAG_TOTALS, merge_tag_totals(rows, running, report_range))
+
+
+@report_router.get("/periods", response_model=List[schemas.PeriodTotal])
+async def report_by_period(
+    period: Literal["day", "week", "month"] = "day",
+    report_range: ReportRange = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    rows, running = await load_report(
+        db, period_totals(current_user.id, report_range, period), current_user.id
+    )
+    logger.info(f"{period} report generated for user: {current_user.email}")
+    return model_response(
+        PERIOD_TOTALS, merge_period_totals(rows, running, report_range, period)
+    )
+
+
+@report_router.get("/tags/days", response_model=List[schemas.TagDayTotal])
+async def report_by_tag_and_day(
+    report_range: ReportRange = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    rows, running = await load_report(
+        db, tag_day_totals(current_user.id, report_range), current_user.id
+    )
+    logger.info(f"Tag by day report generated for user: {current_user.email}")
+    return model_response(
+        TAG_DAY_TOTALS, merge_tag_day_totals(rows, running, report_range)
+    )
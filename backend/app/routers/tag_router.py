@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from typing import List
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from .. import models, schemas, auth
 from ..database import get_db
+from ..principal_cache import UserSnapshot
+from ..responses import model_response
+from ..tag_catalogue import tag_catalogue
+from ..tag_service import search_tags
 import logging
 
 # Configure logging
@@ -12,18 +17,26 @@ logger = logging.getLogger(__name__)
 
 tag_router = APIRouter(prefix="/tags", tags=["tags"])
 
+# Serializes tag pages straight to JSON
+TAG_LIST = TypeAdapter(List[schemas.Tag])
+TAG_SUGGESTIONS = TypeAdapter(List[schemas.TagSuggestion])
+
+# Most suggestions a tag search returns
+TAG_SEARCH_MAX_LIMIT = 50
+
 
 # Tag endpoints
 @tag_router.post("/", response_model=schemas.Tag)
 def create_tag(
     tag: schemas.TagCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     db_tag = models.Tag(**tag.dict())
     db.add(db_tag)
     db.commit()
     db.refresh(db_tag)
+    tag_catalogue.add_created([(db_tag.name, db_tag.id)])
     logger.info(f"Tag {db_tag.name} created by user: {current_user.email}")
     return db_tag
 
@@ -33,8 +46,29 @@ def read_tags(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+):
+    # Tags are global, so every user shares the cached pages
+    body = tag_catalogue.get_page((skip, limit))
+    if body is None:
+        generation = tag_catalogue.generation
+        tags = (
+            db.query(models.Tag).order_by(models.Tag.id).offset(skip).limit(limit).all()
+        )
+        tag_catalogue.add((tag.name, tag.id) for tag in tags)
+        body = model_response(TAG_LIST, tags).body
+        tag_catalogue.put_page((skip, limit), body, generation)
+    logger.info(f"Tags retrieved for user: {current_user.email}")
+    return Response(body, media_type="application/json")
+
+
+@tag_router.get("/search", response_model=List[schemas.TagSuggestion])
+def search(
+    prefix: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=TAG_SEARCH_MAX_LIMIT),
+    db: Session = Depends(get_db),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
-    tags = db.query(models.Tag).offset(skip).limit(limit).all()
-    logger.info(f"Tags retrieved for user: {current_user.email}, count: {len(tags)}")
-    return tags
+    suggestions = search_tags(db, current_user.id, prefix, limit)
+    logger.info(f"Tags searched by user: {current_user.email}")
+    return model_response(TAG_SUGGESTIONS, suggestions)
@@ -1,11 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from email_validator import validate_email, EmailNotValidError
 import logging
 from .. import schemas, models, auth
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from datetime import timedelta
 from .. import config
+from ..email_deliverability import deliverability_cache
+from ..hashing import HashingBusy
+from ..chat_user_map import chat_user_map
+from ..principal_cache import UserSnapshot, principal_cache
 
 
 # Configure logging
@@ -15,27 +19,39 @@ logger = logging.getLogger(__name__)
 
 user_router = APIRouter(prefix="/users", tags=["users"])
 
+SERVER_BUSY = "Server is busy, please try again shortly"
 
-# Validate email with email-validator library
-def validate_email_address(email: str) -> bool:
-    try:
-        # Validate and get normalized result
-        valid = validate_email(email, check_deliverability=True)
 
-        logger.info(f"Email validated successfully: {valid.normalized}")
-        return True
-    except EmailNotValidError as e:
-        logger.warning(f"Email validation failed: {str(e)}")
+def server_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=SERVER_BUSY,
+        headers={"Retry-After": "1"},
+    )
+
+
+# Check that the email domain can receive mail, using the cached DNS lookup
+async def validate_email_address(email: str) -> bool:
+    domain = email.rsplit("@", 1)[-1]
+    if not await deliverability_cache.is_deliverable(domain):
+        logger.warning(f"Email validation failed: {domain} is not deliverable")
         return False
 
+    logger.info(f"Email validated successfully: {email}")
+    return True
+
 
 @user_router.post("/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(
+    user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)
+):
     # Log the request
     logger.info(f"User registration attempt: {user.email}")
 
     # Check if user with this email already exists
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await db.scalar(
+        select(models.User).where(models.User.email == user.email)
+    )
     if db_user:
         logger.warning(f"Registration failed: Email already registered: {user.email}")
         raise HTTPException(
@@ -43,7 +59,7 @@ async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
     # Validate email with email-validator library
-    if not validate_email_address(user.email):
+    if not await validate_email_address(user.email):
         logger.warning(f"Registration failed: Invalid email address: {user.email}")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,15 +67,19 @@ async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
     # Hash the password
-    hashed_password = auth.get_password_hash(user.password)
+    try:
+        hashed_password = await auth.hash_password(user.password)
+    except HashingBusy:
+        logger.warning(f"Registration rejected, hashing pool busy: {user.email}")
+        raise server_busy_exception()
 
     # Create new user
     db_user = models.User(email=user.email, hashed_password=hashed_password)
 
     # Save to database
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     logger.info(f"User registered successfully: {user.email}")
     return db_user
@@ -67,11 +87,19 @@ async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 # JSON-based login endpoint for frontend applications
 @user_router.post("/login", response_model=schemas.Token)
-async def login_json(login_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def login_json(
+    login_data: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)
+):
     logger.info(f"Login attempt for email: {login_data.email}")
 
     # Verify user exists and password is correct
-    user = auth.authenticate_user(db, login_data.email, login_data.password)
+    try:
+        user = await auth.authenticate_user(
+            db, login_data.email, login_data.password
+        )
+    except HashingBusy:
+        logger.warning(f"Login rejected, hashing pool busy: {login_data.email}")
+        raise server_busy_exception()
     if not user:
         logger.warning(f"Authentication failed for email: {login_data.email}")
         raise HTTPException(
@@ -94,7 +122,7 @@ async def login_json(login_data: schemas.UserCreate, db: Session = Depends(get_d
 
 @user_router.get("/me", response_model=schemas.User)
 async def read_users_me(
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     logger.info(f"Profile accessed by user: {current_user.email}")
     return current_user
@@ -102,7 +130,7 @@ async def read_users_me(
 
 @user_router.get("/me/telegram-status")
 async def get_telegram_status(
-    current_user: models.User = Depends(auth.get_current_active_user),
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
 ):
     return {
         "is_linked": bool(current_user.telegram_chat_id),
@@ -112,13 +140,19 @@ async def get_telegram_status(
 
 @user_router.delete("/me/telegram", response_model=dict)
 async def unlink_telegram(
-    current_user: models.User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not current_user.telegram_chat_id:
         raise HTTPException(status_code=400, detail="Telegram account not linked")
 
-    current_user.telegram_chat_id = None
-    db.commit()
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == current_user.id)
+        .values(telegram_chat_id=None)
+    )
+    await db.commit()
+    principal_cache.invalidate_user(current_user.id)
+    chat_user_map.unlink_user(current_user.id)
 
     return {"message": "Telegram account unlinked successfully"}
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, constr, field_validator
+from pydantic import BaseModel, EmailStr, computed_field, constr, field_validator
+from pydantic import Field, conint
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 from email_validator import validate_email, EmailNotValidError
 
 # Tag base schema
@@ -27,6 +28,13 @@ class Tag(TagBase):
         from_attributes = True
 
 
+# Tag search result; uses counts the current user's activities with the tag
+
+
+class TagSuggestion(Tag):
+    uses: int
+
+
 # Activity base schema
 
 
@@ -50,6 +58,16 @@ class ActivityCreate(ActivityBase):
         from_attributes = True
 
 
+# Activity import schema: a created activity plus the history an export
+# carries; start_time defaults to the time of the import
+
+
+class ActivityImport(ActivityCreate):
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    recorded_time: conint(ge=0) = 0
+
+
 # Activity update schema
 
 
@@ -71,6 +89,21 @@ class TimerAction(BaseModel):
     action: str  # start, pause, stop, save
 
 
+# Most items in each list of a batch request. Batches become IN lists and
+# multi-row VALUES, so this keeps them within SQLite's bound-variable limit
+BATCH_MAX_ITEMS = 500
+
+
+# Timer batch schema
+
+
+class TimerBatch(BaseModel):
+    action: str  # start, pause, stop, save
+    # Either the activities to act on or all_running for every running timer
+    activity_ids: Optional[List[int]] = Field(None, max_length=BATCH_MAX_ITEMS)
+    all_running: bool = False
+
+
 # Activity schema
 
 
@@ -82,13 +115,81 @@ class Activity(ActivityBase):
     recorded_time: int
     timer_status: str
     last_timer_start: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
     user_id: int
     tags: List[Tag] = []
 
+    # Live total for running timers, derived on output so reads never write
+    @computed_field
+    @property
+    def current_recorded_time(self) -> int:
+        if self.timer_status != "running" or not self.last_timer_start:
+            return self.recorded_time
+        elapsed = datetime.now(self.last_timer_start.tzinfo) - self.last_timer_start
+        return self.recorded_time + max(int(elapsed.total_seconds()), 0)
+
     class Config:
         from_attributes = True
 
 
+# Activity batch schemas
+
+
+class ActivityBatchUpdate(ActivityUpdate):
+    id: int
+
+
+class ActivityBatch(BaseModel):
+    create: List[ActivityCreate] = Field([], max_length=BATCH_MAX_ITEMS)
+    update: List[ActivityBatchUpdate] = Field([], max_length=BATCH_MAX_ITEMS)
+    delete: List[int] = Field([], max_length=BATCH_MAX_ITEMS)
+
+
+class ActivityBatchResult(BaseModel):
+    created: List[Activity]
+    updated: List[Activity]
+    deleted: List[int]
+
+
+class TimerBatchResult(BaseModel):
+    activities: List[Activity]
+    # Requested activities whose timer could not take the action, or that
+    # were not found
+    skipped: List[int] = []
+
+
+# Import report schemas
+
+
+class ImportRowError(BaseModel):
+    row: int  # Row number in the body, from 1; CSV rows after the header
+    errors: List[str]
+
+
+class ImportReport(BaseModel):
+    imported: int
+    errors: List[ImportRowError] = []
+
+
+# Report schemas
+
+
+class TagTotal(BaseModel):
+    tag: Optional[str] = None  # None for untagged activities
+    seconds: int
+
+
+class PeriodTotal(BaseModel):
+    period: date  # First day of the day, week or month
+    seconds: int
+
+
+class TagDayTotal(BaseModel):
+    day: date
+    tag: Optional[str] = None
+    seconds: int
+
+
 # User base schema
 
 
@@ -98,8 +199,9 @@ class UserBase(BaseModel):
     @field_validator("email")
     def validate_email_field(cls, v):
         try:
-            # Strict validation with deliverability check
-            valid = validate_email(v, check_deliverability=True)
+            # Syntax-only validation; deliverability is checked by the
+            # registration endpoint through the cached async DNS lookup
+            valid = validate_email(v, check_deliverability=False)
 
             # Check for common test domains
             domain = v.split("@")[1].lower()
@@ -123,6 +225,13 @@ class UserCreate(UserBase):
         }
 
 
+# User login schema
+
+
+class UserLogin(UserBase):
+    password: str
+
+
 # User update schema
 
 
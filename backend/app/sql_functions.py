@@ -0,0 +1,67 @@
+from sqlalchemy import Date, Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class seconds_between(FunctionElement):
+    """
+    Whole seconds from the first timestamp to the second, computed in SQL
+    """
+
+    type = Integer()
+    inherit_cache = True
+    name = "seconds_between"
+
+
+@compiles(seconds_between)
+def _seconds_between_postgresql(element, compiler, **kw):
+    start, end = [compiler.process(arg, **kw) for arg in element.clauses]
+    return f"CAST(FLOOR(EXTRACT(EPOCH FROM ({end} - {start}))) AS INTEGER)"
+
+
+@compiles(seconds_between, "sqlite")
+def _seconds_between_sqlite(element, compiler, **kw):
+    start, end = [compiler.process(arg, **kw) for arg in element.clauses]
+    # julianday is fractional days; round away float noise before truncating
+    return (
+        f"CAST(ROUND((julianday({end}) - julianday({start})) * 86400, 3) "
+        f"AS INTEGER)"
+    )
+
+
+# SQLite expressions for the first day of the period containing a timestamp
+_SQLITE_PERIOD_STARTS = {
+    "day": "date({})",
+    "week": "date({}, 'weekday 0', '-6 days')",  # Monday
+    "month": "strftime('%Y-%m-01', {})",
+}
+
+
+class period_start(FunctionElement):
+    """
+    First day (a DATE) of the day, week (from Monday) or month containing a
+    timestamp
+    """
+
+    type = Date()
+    # The period is part of the SQL text, so statements can't share a cache key
+    inherit_cache = False
+    name = "period_start"
+
+    def __init__(self, period: str, timestamp):
+        if period not in _SQLITE_PERIOD_STARTS:
+            raise ValueError(f"Unknown period: {period}")
+        self.period = period
+        super().__init__(timestamp)
+
+
+@compiles(period_start)
+def _period_start_postgresql(element, compiler, **kw):
+    timestamp = compiler.process(element.clauses, **kw)
+    return f"CAST(date_trunc('{element.period}', {timestamp}) AS DATE)"
+
+
+@compiles(period_start, "sqlite")
+def _period_start_sqlite(element, compiler, **kw):
+    timestamp = compiler.process(element.clauses, **kw)
+    return _SQLITE_PERIOD_STARTS[element.period].format(timestamp)
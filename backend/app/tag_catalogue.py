@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from . import config, metrics
+
+
+class TagCatalogue:
+    """
+    In-process catalogue of the global tags table: a bounded LRU map of tag
+    name -> id, and serialized GET /tags pages.
+
+    Tags are never renamed or deleted, so a cached id stays correct and a
+    name missing from the map only means the database must be asked. Tags
+    created through this process are added once their transaction commits,
+    which also drops the cached pages. Pages expire after page_ttl_seconds,
+    so tags created by other processes show up.
+    """
+
+    def __init__(self, max_names: int, max_pages: int, page_ttl_seconds: float):
+        self.max_names = max_names
+        self.max_pages = max_pages
+        self.page_ttl_seconds = page_ttl_seconds
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._pages: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Bumped whenever pages are dropped, so a page read from the database
+        # before a tag was created isn't cached after it
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, names: Iterable[str]) -> Tuple[Dict[str, int], List[str]]:
+        """
+        Split tag names into the cached name -> id map and the missing names
+        """
+        found, missing = {}, []
+        with self._lock:
+            for name in names:
+                tag_id = self._ids.get(name)
+                if tag_id is None:
+                    missing.append(name)
+                else:
+                    self._ids.move_to_end(name)
+                    found[name] = tag_id
+        metrics.increment("tag_catalogue.hit", len(found))
+        metrics.increment("tag_catalogue.miss", len(missing))
+        return found, missing
+
+    def add(self, tags: Iterable[Tuple[str, int]]):
+        """
+        Cache (name, id) pairs of committed tags
+        """
+        with self._lock:
+            for name, tag_id in tags:
+                self._ids[name] = tag_id
+                self._ids.move_to_end(name)
+            while len(self._ids) > self.max_names:
+                self._ids.popitem(last=False)
+
+    def add_created(self, tags: Iterable[Tuple[str, int]]):
+        """
+        Cache newly committed tags and drop the pages that lack them
+        """
+        self.add(tags)
+        with self._lock:
+            self._pages.clear()
+            self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_page(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._pages[key]
+                entry = None
+            if entry is None:
+                metrics.increment("tag_catalogue.page_miss")
+                return None
+            self._pages.move_to_end(key)
+        metrics.increment("tag_catalogue.page_hit")
+        return entry[0]
+
+    def put_page(self, key: Hashable, body: bytes, generation: int):
+        """
+        Cache a serialized page read while generation was current
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pages[key] = (body, time.monotonic() + self.page_ttl_seconds)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._pages.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._ids)
+
+
+tag_catalogue = TagCatalogue(
+    max_names=config.TAG_CATALOGUE_MAX_NAMES,
+    max_pages=config.TAG_CATALOGUE_MAX_PAGES,
+    page_ttl_seconds=config.TAG_CATALOGUE_PAGE_TTL_SECONDS,
+)
+metrics.register_gauge("tag_catalogue.size", lambda: len(tag_catalogue))
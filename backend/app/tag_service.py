@@ -0,0 +1,181 @@
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from . import models
+from .database import dialect_insert
+from .tag_catalogue import tag_catalogue
+
+# Session.info key of the (name, id) pairs of tags created in the current
+# transaction, published to the tag catalogue once it commits
+CREATED_TAGS = "created_tags"
+
+
+def unique_tag_names(tag_names: Iterable[str]) -> List[str]:
+    """
+    Drop duplicate tag names while keeping the order they were given in
+    """
+    return list(dict.fromkeys(tag_names))
+
+
+def resolve_tag_ids(db: Session, tag_names: Iterable[str]) -> Dict[str, int]:
+    """
+    Resolve tag names to a name -> id map, creating the missing tags.
+
+    Names come from the tag catalogue where possible. The rest are loaded
+    with a single IN query and the ones still missing are inserted with one
+    bulk INSERT ... ON CONFLICT DO NOTHING, so a tag created by a concurrent
+    request is picked up instead of failing on the unique constraint.
+    Nothing is committed here; created tags reach the catalogue when the
+    caller commits them together with the activities they are attached to.
+    """
+    names = unique_tag_names(tag_names)
+    if not names:
+        return {}
+
+    ids, missing = tag_catalogue.lookup(names)
+    if not missing:
+        return ids
+
+    existing = dict(
+        db.execute(
+            select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(missing))
+        ).all()
+    )
+    tag_catalogue.add(existing.items())
+    ids.update(existing)
+
+    missing = [name for name in missing if name not in ids]
+    if missing:
+        db.execute(
+            dialect_insert(db, models.Tag.__table__)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        created = dict(
+            db.execute(
+                select(models.Tag.name, models.Tag.id).where(
+                    models.Tag.name.in_(missing)
+                )
+            ).all()
+        )
+        db.info.setdefault(CREATED_TAGS, []).extend(created.items())
+        ids.update(created)
+
+    return ids
+
+
+def resolve_tags(db: Session, tag_names: Iterable[str]) -> List[models.Tag]:
+    """
+    Resolve tag names to Tag rows, in the order given, creating the missing
+    ones. Tags resolved from the catalogue are attached to the session
+    without being loaded.
+    """
+    names = unique_tag_names(tag_names)
+    ids = resolve_tag_ids(db, names)
+    tags = []
+    for name in names:
+        tag = models.Tag(id=ids[name], name=name)
+        make_transient_to_detached(tag)
+        tags.append(db.merge(tag, load=False))
+    return tags
+
+
+def prefix_range(prefix: str):
+    """
+    Condition matching tags whose folded name starts with prefix, written as
+    a range so it is served by the name_folded index
+    """
+    lower = models.fold_tag_name(prefix)
+    if ord(lower[-1]) == sys.maxunicode:
+        return models.Tag.name_folded >= lower
+    upper = lower[:-1] + chr(ord(lower[-1]) + 1)
+    return (models.Tag.name_folded >= lower) & (models.Tag.name_folded < upper)
+
+
+def usage_changes(
+    user_id: int,
+    tag_ids: Iterable[int],
+    sign: int = 1,
+    changes: Optional[Counter] = None,
+) -> Counter:
+    """
+    Count one activity with the given tags in a (user_id, tag_id) -> uses
+    Counter. sign=-1 takes it away instead.
+    """
+    changes = Counter() if changes is None else changes
+    for tag_id in set(tag_ids):
+        # update() keeps negative and zero counts, unlike +=
+        changes.update({(user_id, tag_id): sign})
+    return changes
+
+
+def apply_usage_changes(db: Session, changes: Counter):
+    """
+    Add the Counter's uses to tag_usage
+    """
+    rows = [
+        {"user_id": user_id, "tag_id": tag_id, "uses": uses}
+        for (user_id, tag_id), uses in changes.items()
+        if uses
+    ]
+    if not rows:
+        return
+    table = models.TagUsage.__table__
+    statement = dialect_insert(db, table).values(rows)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["user_id", "tag_id"],
+            set_={"uses": table.c.uses + statement.excluded.uses},
+        )
+    )
+
+
+def search_tags(db: Session, user_id: int, prefix: str, limit: int) -> List[dict]:
+    """
+    Tags whose name starts with prefix, case-insensitively. The user's own
+    tags come first, most used first; the rest of the page is filled with
+    other matching tags in name order. Each result carries its use count.
+
+    The first query reads only the user's tag_usage rows, the second at most
+    limit + (used tags found) entries of the name_folded index, so neither
+    grows with the number of tags or activities.
+    """
+    matches = prefix_range(prefix)
+    usage = models.TagUsage
+    used = db.execute(
+        select(models.Tag.id, models.Tag.name, usage.uses)
+        .join(usage, usage.tag_id == models.Tag.id)
+        .where(usage.user_id == user_id, usage.uses > 0, matches)
+        .order_by(usage.uses.desc(), models.Tag.name_folded, models.Tag.id)
+        .limit(limit)
+    ).all()
+    results = [{"id": id, "name": name, "uses": uses} for id, name, uses in used]
+    if len(results) < limit:
+        # The used tags may sit anywhere in the range, so read past them
+        seen = {row["id"] for row in results}
+        others = db.execute(
+            select(models.Tag.id, models.Tag.name)
+            .where(matches)
+            .order_by(models.Tag.name_folded, models.Tag.id)
+            .limit(limit + len(seen))
+        )
+        for id, name in others:
+            if id not in seen:
+                results.append({"id": id, "name": name, "uses": 0})
+                if len(results) == limit:
+                    break
+    return results
+
+
+@event.listens_for(Session, "after_commit")
+def publish_created_tags(session: Session):
+    created = session.info.pop(CREATED_TAGS, None)
+    if created:
+        tag_catalogue.add_created(created)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_created_tags(session: Session):
+    session.info.pop(CREATED_TAGS, None)
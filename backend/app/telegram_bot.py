@@ -4,10 +4,17 @@ from aiogram.filters import Command
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import asyncio
+from sqlalchemy import select, update
 from . import models, database, auth
+from .chat_user_map import chat_user_map
+from .hashing import HashingBusy
+from .notification_dispatcher import create_dispatcher
+from .notification_outbox import outbox_relay
+from .principal_cache import principal_cache
+from .reminder_scheduler import REMINDER_LEAD_TIME, reminder_scheduler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,6 +29,12 @@ BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
+notification_dispatcher = create_dispatcher(
+    lambda chat_id, text: bot.send_message(chat_id, text)
+)
+
+# Reminders marked notified per UPDATE
+REMINDER_BATCH_SIZE = 100
 
 # Create keyboard menu
 
@@ -88,10 +101,12 @@ async def cmd_link(message: types.Message, state: FSMContext):
 async def process_email(message: types.Message, state: FSMContext):
     email = message.text.strip()
 
-    db = next(database.get_db())
-    user = db.query(models.User).filter(models.User.email == email).first()
+    async with database.background_session() as db:
+        user_id = await db.scalar(
+            select(models.User.id).where(models.User.email == email)
+        )
 
-    if not user:
+    if user_id is None:
         await message.answer(
             "The user with this email was not found. Try again:",
             reply_markup=types.ReplyKeyboardRemove(),
@@ -111,17 +126,43 @@ async def process_password(message: types.Message, state: FSMContext):
     data = await state.get_data()
     email = data.get("email")
 
-    db = next(database.get_db())
-    user = auth.authenticate_user(db, email, password)
-
-    if not user:
-        await message.answer(
-            "Invalid password. Try again:", reply_markup=types.ReplyKeyboardRemove()
-        )
-        return
+    async with database.background_session() as db:
+        try:
+            user = await auth.authenticate_user(db, email, password)
+        except HashingBusy:
+            await message.answer(
+                "The server is busy right now. Please send your password again "
+                "in a moment:",
+                reply_markup=types.ReplyKeyboardRemove(),
+            )
+            return
 
-    user.telegram_chat_id = str(message.from_user.id)
-    db.commit()
+        if not user:
+            await message.answer(
+                "Invalid password. Try again:",
+                reply_markup=types.ReplyKeyboardRemove(),
+            )
+            return
+
+        chat_id = str(message.from_user.id)
+        # A chat links to one account at a time; move it off any other user
+        previous_owners = (
+            await db.scalars(
+                update(models.User)
+                .where(
+                    models.User.telegram_chat_id == chat_id,
+                    models.User.id != user.id,
+                )
+                .values(telegram_chat_id=None)
+                .returning(models.User.id)
+            )
+        ).all()
+        user.telegram_chat_id = chat_id
+        await db.commit()
+    for user_id in previous_owners:
+        principal_cache.invalidate_user(user_id)
+    principal_cache.invalidate_user(user.id)
+    chat_user_map.link(chat_id, user.id)
 
     await state.clear()
     await message.answer(
@@ -130,32 +171,47 @@ async def process_password(message: types.Message, state: FSMContext):
     )
 
 
+def running_activity_query(user_id: int):
+    """
+    Query for the user's running timer, served by ix_activities_user_id_running
+    """
+    return (
+        select(
+            models.Activity.title,
+            models.Activity.recorded_time,
+            models.Activity.last_timer_start,
+        )
+        .where(models.Activity.user_id == user_id, models.timer_running())
+        .limit(1)
+    )
+
+
 @dp.message(Command("current"))
 async def cmd_current(message: types.Message):
     telegram_id = str(message.from_user.id)
-    db = next(database.get_db())
-
-    user = (
-        db.query(models.User)
-        .filter(models.User.telegram_chat_id == telegram_id)
-        .first()
-    )
-    if not user:
+    async with database.background_session() as db:
+        user_id = chat_user_map.get(telegram_id)
+        if user_id is None:
+            user_id = await db.scalar(
+                select(models.User.id).where(
+                    models.User.telegram_chat_id == telegram_id
+                )
+            )
+            if user_id is not None:
+                chat_user_map.link(telegram_id, user_id)
+        current_activity = None
+        if user_id is not None:
+            current_activity = (
+                await db.execute(running_activity_query(user_id))
+            ).first()
+
+    if user_id is None:
         await message.answer(
             "First, link the account with the /link command",
             reply_markup=get_main_keyboard(),
         )
         return
 
-    current_activity = (
-        db.query(models.Activity)
-        .filter(
-            models.Activity.user_id == user.id,
-            models.Activity.timer_status == "running",
-        )
-        .first()
-    )
-
     if not current_activity:
         await message.answer(
             "There are no active tasks with the timer running",
@@ -203,73 +259,85 @@ def format_time(seconds):
     return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
 
-async def send_notification(user_id: int, message: str):
-    db = next(database.get_db())
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-
-    if user and user.telegram_chat_id:
-        try:
-            await bot.send_message(user.telegram_chat_id, message)
-        except Exception as e:
-            logger.error(f"Failed to send notification to user {user_id}: {e}")
-
-
-async def check_upcoming_tasks():
-    """Check for tasks that are scheduled to start in 10 minutes and send
-    notifications."""
-    while True:
-        try:
-            db = next(database.get_db())
-            now = datetime.utcnow()
-            ten_minutes_from_now = now + timedelta(minutes=10)
-            logger.info(
-                f"[NOTIFY] Now: {now.isoformat()}, "
-                f"10min from now: {ten_minutes_from_now.isoformat()}"
-            )
-
-            # Find tasks scheduled to start in the next 10 minutes
-            upcoming_tasks = (
-                db.query(models.Activity)
-                .filter(
+async def send_notification(chat_id: str, message: str) -> bool:
+    """Send a message to a linked Telegram chat through the dispatcher.
+    Returns whether it was delivered."""
+    return await notification_dispatcher.send(chat_id, message)
+
+
+async def send_due_reminders(activity_ids):
+    """Send reminders for the given activities if they are still due: stopped,
+    not notified yet and scheduled to start within the reminder lead time.
+    Reminders go out concurrently, and each batch is marked notified with one
+    UPDATE in a short session of its own, so no session is held while
+    sending."""
+    now = datetime.utcnow()
+    async with database.background_session() as db:
+        due_tasks = (
+            await db.execute(
+                select(
+                    models.Activity.id,
+                    models.Activity.title,
+                    models.User.telegram_chat_id,
+                )
+                .join(models.User, models.Activity.user_id == models.User.id)
+                .where(
+                    models.Activity.id.in_(activity_ids),
                     models.Activity.scheduled_time >= now,
-                    models.Activity.scheduled_time <= ten_minutes_from_now,
+                    models.Activity.scheduled_time <= now + REMINDER_LEAD_TIME,
                     models.Activity.timer_status == "stopped",
-                    models.Activity.notified.is_(False)
+                    models.Activity.notified.is_(False),
                 )
-                .all()
             )
-            logger.info(f"[NOTIFY] Found {len(upcoming_tasks)} upcoming tasks")
+        ).all()
+    logger.info(f"[NOTIFY] Found {len(due_tasks)} due reminders")
+
+    for start in range(0, len(due_tasks), REMINDER_BATCH_SIZE):
+        batch = due_tasks[start:start + REMINDER_BATCH_SIZE]
+        linked = [task for task in batch if task.telegram_chat_id]
+        delivered = await notification_dispatcher.send_many(
+            (
+                task.telegram_chat_id,
+                f"🔔 Reminder: Task '{task.title}' is scheduled "
+                f"to start in 10 minutes!",
+            )
+            for task in linked
+        )
 
-            for task in upcoming_tasks:
-                logger.info(
-                    f"[NOTIFY] Task id={task.id}, title='{task.title}', "
-                    f"scheduled_time={task.scheduled_time}, "
-                    f"timer_status={task.timer_status}"
-                )
-                await send_notification(
-                    task.user_id,
-                    f"🔔 Reminder: Task '{task.title}' is scheduled "
-                    f"to start in 10 minutes!"
+        # Unlinked users can't be reminded; don't retry them either
+        notified_ids = [task.id for task in batch if not task.telegram_chat_id]
+        notified_ids += [task.id for task, sent in zip(linked, delivered) if sent]
+        if notified_ids:
+            async with database.background_session() as db:
+                await db.execute(
+                    update(models.Activity)
+                    .where(models.Activity.id.in_(notified_ids))
+                    .values(notified=True)
                 )
-                task.notified = True  # Mark that we've sent the notification
-                db.commit()
-
-            # Sleep for 1 minute before checking again
-            await asyncio.sleep(60)
-
-        except Exception as e:
-            logger.error(f"Error in check_upcoming_tasks: {e}")
-            await asyncio.sleep(60)  # Sleep for 1 minute before retrying
+                await db.commit()
+        logger.info(
+            f"[NOTIFY] Sent {sum(delivered)} of {len(linked)} reminders in batch"
+        )
 
 
 async def start_bot():
     logger.info("Starting telegram bot...")
-    # Start the background task for checking upcoming tasks
-    asyncio.create_task(check_upcoming_tasks())
-    await dp.start_polling(bot)
+    notification_dispatcher.start()
+    # Start the scheduler that sends reminders for upcoming tasks
+    reminder_task = asyncio.create_task(reminder_scheduler.run(send_due_reminders))
+    # Start the relay that delivers queued notifications from the outbox
+    outbox_task = asyncio.create_task(
+        outbox_relay.run(notification_dispatcher.send_many)
+    )
+    try:
+        await dp.start_polling(bot)
+    finally:
+        reminder_task.cancel()
+        outbox_task.cancel()
 
 
 async def stop_bot():
     logger.info("Stopping telegram bot...")
     await dp.stop_polling()
+    await notification_dispatcher.stop()
     await bot.session.close()
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Iterable, Tuple
+from sqlalchemy import func, insert, select, update
+from . import models
+from .sql_functions import seconds_between
+
+
+def open_intervals(activities: Iterable[Tuple[int, int]], started_at: datetime):
+    """
+    INSERT opening an interval for each (activity_id, user_id). started_at
+    must be the value written to the activities' last_timer_start.
+    """
+    return insert(models.ActivityInterval).values(
+        [
+            {"activity_id": activity_id, "user_id": user_id, "started_at": started_at}
+            for activity_id, user_id in activities
+        ]
+    )
+
+
+def close_intervals(activity_ids: Iterable[int], ended_at: datetime):
+    """
+    UPDATE closing the open interval of each activity, with the same time the
+    elapsed seconds were folded into recorded_time. Returns the closed
+    intervals' activity_id, started_at and ended_at.
+    """
+    interval = models.ActivityInterval
+    return (
+        update(interval)
+        .where(
+            interval.activity_id.in_(list(activity_ids)),
+            interval.ended_at.is_(None),
+        )
+        .values(ended_at=ended_at)
+        .returning(interval.activity_id, interval.started_at, interval.ended_at)
+    )
+
+
+def closed_intervals(activity_id: int):
+    """
+    SELECT of the (started_at, ended_at) of an activity's closed intervals
+    """
+    interval = models.ActivityInterval
+    return select(interval.started_at, interval.ended_at).where(
+        interval.activity_id == activity_id, interval.ended_at.isnot(None)
+    )
+
+
+def closed_seconds():
+    """
+    Sum of the closed intervals in seconds, computed the same way timer
+    actions add elapsed time to recorded_time
+    """
+    interval = models.ActivityInterval
+    return func.coalesce(
+        func.sum(seconds_between(interval.started_at, interval.ended_at)), 0
+    )
@@ -0,0 +1,85 @@
+"""
+Check that streaming an export keeps memory flat as the history grows
+
+Seeds throwaway SQLite databases with one user holding each of --sizes
+activities (two tags each), streams the NDJSON export and reports the
+peak Python memory allocated while streaming.
+
+Usage: python benchmarks/export.py [--sizes 10000 100000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The export opens sessions on the app's engines, so point them at a
+# throwaway database before the app is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/export.db"
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from app import activity_io, database, models  # noqa: E402
+
+
+def seed(activities: int):
+    with database.SessionLocal() as db:
+        for table in reversed(database.Base.metadata.sorted_tables):
+            db.execute(delete(table))
+        db.execute(insert(models.User), [{"id": 1, "email": "heavy@gmail.com"}])
+        db.execute(insert(models.Tag), [{"id": 1, "name": "a"}, {"id": 2, "name": "b"}])
+        db.execute(
+            insert(models.Activity),
+            [
+                {"id": n, "title": f"task {n}", "user_id": 1, "recorded_time": n}
+                for n in range(1, activities + 1)
+            ],
+        )
+        db.execute(
+            insert(models.activity_tags),
+            [
+                {"activity_id": n, "tag_id": tag_id}
+                for n in range(1, activities + 1)
+                for tag_id in (1, 2)
+            ],
+        )
+        db.commit()
+
+
+async def stream():
+    written = 0
+    try:
+        async for chunk in activity_io.export_activities(1, "ndjson"):
+            written += len(chunk)
+    finally:
+        await database.async_engine.dispose()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    database.init_db()
+    for size in args.sizes:
+        seed(size)
+        tracemalloc.start()
+        started = time.perf_counter()
+        written = asyncio.run(stream())
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{size:>8} activities: {written / 1e6:7.1f} MB written in "
+            f"{elapsed:5.1f} s, peak memory {peak / 1e6:5.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
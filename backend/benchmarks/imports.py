@@ -0,0 +1,92 @@
+"""
+Time a bulk import of --rows activities
+
+Builds an NDJSON body with two tags per activity out of a pool of
+--tags names, then feeds it to the import pipeline in 64 KiB chunks the
+way the endpoint receives it, committing each batch.
+
+Usage: python benchmarks/imports.py [--rows 100000] [--tags 200]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The import opens sessions on the app's engines, so point them at a
+# throwaway database before the app is imported
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/import.db"
+
+from sqlalchemy import func, insert, select  # noqa: E402
+
+from app import activity_io, database, models  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def build_body(rows: int, tags: int) -> bytes:
+    return "".join(
+        json.dumps(
+            {
+                "title": f"task {n}",
+                "description": f"imported task number {n}",
+                "duration": n % 3600,
+                "tags": [f"tag{n % tags}", f"tag{(n * 7) % tags}"],
+            }
+        )
+        + "\n"
+        for n in range(rows)
+    ).encode()
+
+
+async def body_chunks(body: bytes):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+async def run_import(body: bytes):
+    imported = 0
+    try:
+        async with database.AsyncSessionLocal() as db:
+            async for activities, _ in activity_io.import_batches(
+                body_chunks(body), "ndjson"
+            ):
+                inserted = await db.run_sync(activity_io.insert_batch, 1, activities)
+                await db.commit()
+                imported += len(inserted)
+    finally:
+        await database.async_engine.dispose()
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--tags", type=int, default=200)
+    args = parser.parse_args()
+
+    database.init_db()
+    with database.SessionLocal() as db:
+        db.execute(insert(models.User), [{"id": 1, "email": "heavy@gmail.com"}])
+        db.commit()
+
+    body = build_body(args.rows, args.tags)
+    started = time.perf_counter()
+    imported = asyncio.run(run_import(body))
+    elapsed = time.perf_counter() - started
+
+    with database.SessionLocal() as db:
+        links = db.scalar(select(func.count()).select_from(models.activity_tags))
+    print(
+        f"{imported} activities ({len(body) / 1e6:.1f} MB, {links} tag links) "
+        f"imported in {elapsed:.1f} s, {imported / elapsed:,.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
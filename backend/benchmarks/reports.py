@@ -0,0 +1,121 @@
+"""
+Time the /reports queries for a heavy user over a one-year range
+
+Seeds a throwaway SQLite database with one user holding --activities
+activities (two timer intervals and up to two of 20 tags each) spread over
+a year plus one running timer, builds the daily rollups, then runs each
+report (rollup query, running-interval query and merge) --repeat times.
+
+Usage: python benchmarks/reports.py [--activities 50000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, database, maintenance, models  # noqa: E402
+from app.routers import report_router  # noqa: E402
+
+YEAR_START = datetime(2024, 1, 1)
+
+
+def seed(db: Session, activities: int):
+    rng = random.Random(42)
+    db.execute(insert(models.User), [{"id": 1, "email": "heavy@gmail.com"}])
+    db.execute(
+        insert(models.Tag), [{"id": n, "name": f"tag-{n}"} for n in range(1, 21)]
+    )
+    activity_rows, tag_rows, interval_rows = [], [], []
+    for activity_id in range(1, activities + 1):
+        started = YEAR_START + timedelta(seconds=rng.randrange(365 * 86400))
+        activity_rows.append(
+            {"id": activity_id, "title": f"task {activity_id}", "user_id": 1}
+        )
+        for tag_id in rng.sample(range(1, 21), rng.randrange(3)):
+            tag_rows.append({"activity_id": activity_id, "tag_id": tag_id})
+        for offset in (0, 3600):
+            interval_rows.append(
+                {
+                    "activity_id": activity_id,
+                    "user_id": 1,
+                    "started_at": started + timedelta(seconds=offset),
+                    "ended_at": started + timedelta(seconds=offset + 1500),
+                }
+            )
+    interval_rows.append(
+        {
+            "activity_id": activities,
+            "user_id": 1,
+            "started_at": datetime.now() - timedelta(hours=2),
+            "ended_at": None,
+        }
+    )
+    db.execute(insert(models.Activity), activity_rows)
+    db.execute(insert(models.activity_tags), tag_rows)
+    db.execute(insert(models.ActivityInterval), interval_rows)
+    db.commit()
+    maintenance.rebuild_rollups(db)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--activities", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    year = report_router.ReportRange(date(2024, 1, 1), date(2024, 12, 31))
+    reports = {
+        "tags": (
+            report_router.tag_totals(1, year),
+            lambda rows, running: report_router.merge_tag_totals(rows, running, year),
+        ),
+        "tags x days": (
+            report_router.tag_day_totals(1, year),
+            lambda rows, running: report_router.merge_tag_day_totals(
+                rows, running, year
+            ),
+        ),
+    }
+    for period in report_router.PERIOD_STARTS:
+        reports[f"{period}s"] = (
+            report_router.period_totals(1, year, period),
+            lambda rows, running, period=period: report_router.merge_period_totals(
+                rows, running, year, period
+            ),
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{tmp}/reports.db"
+        engine = create_engine(url, **database.get_engine_options(url))
+        database.set_sqlite_pragmas(engine, config.SQLITE_PRAGMAS)
+        database.Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            seed(db, args.activities)
+            for name, (query, merge) in reports.items():
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    rows = db.execute(query).all()
+                    running = db.execute(report_router.running_intervals(1)).all()
+                    totals = merge(rows, running)
+                    timings.append(time.perf_counter() - started)
+                print(
+                    f"{name:>12}: {len(totals):5d} rows, "
+                    f"median {statistics.median(timings) * 1000:6.1f} ms, "
+                    f"max {max(timings) * 1000:6.1f} ms"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
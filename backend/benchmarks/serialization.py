@@ -0,0 +1,106 @@
+"""
+Compare serializing a page of activities before and after the fast JSON path
+
+Builds --rows activities with descriptions, three tags and datetimes, then
+times FastAPI's former path (pydantic models, jsonable_encoder, stdlib
+json) against model_response (one TypeAdapter pass to JSON bytes), and
+reports the gzip and brotli sizes and times of the body.
+
+Usage: python benchmarks/serialization.py [--rows 1000] [--repeat 50]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/serialization.db"
+
+import brotli  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app import config, models, schemas  # noqa: E402
+from app.responses import model_response  # noqa: E402
+from app.routers.activity_router import ACTIVITY_LIST  # noqa: E402
+
+
+def build_activities(rows: int):
+    tags = [models.Tag(id=n, name=f"tag-{n}") for n in range(20)]
+    started = datetime(2024, 1, 1, 9)
+    return [
+        models.Activity(
+            id=n,
+            title=f"Task number {n}",
+            description=f"Notes for task {n}: " + "lorem ipsum dolor sit amet " * 4,
+            start_time=started + timedelta(minutes=n),
+            duration=1800,
+            recorded_time=n * 7,
+            timer_status="stopped",
+            updated_at=started + timedelta(minutes=n, seconds=30),
+            user_id=1,
+            tags=[tags[n % 20], tags[(n + 7) % 20], tags[(n + 13) % 20]],
+        )
+        for n in range(rows)
+    ]
+
+
+def before(activities) -> bytes:
+    content = jsonable_encoder(
+        [schemas.Activity.model_validate(activity) for activity in activities]
+    )
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode()
+
+
+def after(activities) -> bytes:
+    return model_response(ACTIVITY_LIST, activities).body
+
+
+def best_of(repeat: int, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    activities = build_activities(args.rows)
+    before_ms, before_body = best_of(args.repeat, before, activities)
+    after_ms, after_body = best_of(args.repeat, after, activities)
+    assert json.loads(before_body) == json.loads(after_body)
+    print(f"{args.rows} activities, {len(after_body) / 1024:.0f} KiB of JSON")
+    print(f"  jsonable_encoder + json: {before_ms:6.2f} ms")
+    print(f"  TypeAdapter.dump_json:   {after_ms:6.2f} ms")
+
+    encoders = {
+        f"gzip level {config.GZIP_LEVEL}": lambda body: gzip.compress(
+            body, config.GZIP_LEVEL
+        ),
+        f"brotli quality {config.BROTLI_QUALITY}": lambda body: brotli.compress(
+            body, quality=config.BROTLI_QUALITY
+        ),
+    }
+    for name, encode in encoders.items():
+        encode_ms, encoded = best_of(args.repeat, encode, after_body)
+        print(
+            f"  {name + ':':<24} {encode_ms:6.2f} ms, "
+            f"{len(encoded) / 1024:.0f} KiB ({len(encoded) / len(after_body):.0%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
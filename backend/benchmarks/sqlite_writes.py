@@ -0,0 +1,115 @@
+"""
+Compare SQLite write throughput with default settings and the PRAGMA profile
+
+Each writer thread commits small transactions shaped like timer updates
+(one insert plus one update) while reader threads page through activities,
+which is the contention the API sees under load.
+
+Usage: python benchmarks/sqlite_writes.py [--writers 4] [--readers 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config, database  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE activities (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR,
+    recorded_time INTEGER DEFAULT 0,
+    user_id INTEGER
+)
+"""
+
+
+def make_engine(path: str, pragmas: dict):
+    url = f"sqlite:///{path}"
+    engine = create_engine(url, **database.get_engine_options(url))
+    database.set_sqlite_pragmas(engine, pragmas)
+    return engine
+
+
+def run(engine, writers: int, readers: int, transactions: int):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA)
+    errors = []
+    stop = threading.Event()
+
+    def write(user_id: int):
+        for i in range(transactions):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("INSERT INTO activities (title, user_id) VALUES (:t, :u)"),
+                        {"t": f"task {i}", "u": user_id},
+                    )
+                    conn.execute(
+                        text(
+                            "UPDATE activities SET recorded_time = recorded_time + 1 "
+                            "WHERE user_id = :u"
+                        ),
+                        {"u": user_id},
+                    )
+            except Exception as exc:  # "database is locked" without busy_timeout
+                errors.append(exc)
+
+    def read(user_id: int):
+        while not stop.is_set():
+            with engine.connect() as conn:
+                conn.execute(
+                    text(
+                        "SELECT * FROM activities WHERE user_id = :u "
+                        "ORDER BY id DESC LIMIT 15"
+                    ),
+                    {"u": user_id},
+                ).all()
+
+    reader_threads = [
+        threading.Thread(target=read, args=(n,)) for n in range(readers)
+    ]
+    writer_threads = [
+        threading.Thread(target=write, args=(n,)) for n in range(writers)
+    ]
+    for thread in reader_threads:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    engine.dispose()
+
+    committed = writers * transactions - len(errors)
+    return committed / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--transactions", type=int, default=250)
+    args = parser.parse_args()
+
+    profiles = {"default": {}, "tuned": config.SQLITE_PRAGMAS}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pragmas in profiles.items():
+            engine = make_engine(os.path.join(tmp, f"{name}.db"), pragmas)
+            rate, failed = run(engine, args.writers, args.readers, args.transactions)
+            print(f"{name:>8}: {rate:8.0f} commits/s, {failed} failed")
+
+
+if __name__ == "__main__":
+    main()
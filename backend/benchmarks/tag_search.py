@@ -0,0 +1,104 @@
+"""
+Time tag prefix search against a large tags table
+
+Creates --tags tags and --activities activities for one user, each with
+up to three of 300 tags, and counts their usage. Then times search_tags for
+prefixes of one to three letters against the tag picker's former approach:
+loading every tag and filtering client-side.
+
+Usage: python benchmarks/tag_search.py [--tags 50000] [--activities 20000]
+    [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tag_search.db"
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from app import models  # noqa: E402
+from app.database import SessionLocal, init_db  # noqa: E402
+from app.maintenance import rebuild_tag_usage  # noqa: E402
+from app.tag_service import search_tags  # noqa: E402
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def populate(db, tags: int, activities: int):
+    names = {
+        "".join(random.choices(LETTERS, k=random.randint(4, 12))) for _ in range(tags)
+    }
+    db.execute(
+        insert(models.Tag),
+        [{"name": name.capitalize() if len(name) % 3 == 0 else name} for name in names],
+    )
+    user = models.User(email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    db.execute(
+        insert(models.Activity),
+        [{"title": f"Task {n}", "user_id": user.id} for n in range(activities)],
+    )
+    tag_ids = db.scalars(select(models.Tag.id)).all()
+    activity_ids = db.scalars(select(models.Activity.id)).all()
+    # Skewed so a few tags are used far more often than the rest
+    used = random.sample(tag_ids, 300)
+    db.execute(
+        insert(models.activity_tags),
+        [
+            {"activity_id": activity_id, "tag_id": tag_id}
+            for activity_id in activity_ids
+            for tag_id in set(random.choices(used, weights=range(300, 0, -1), k=3))
+        ],
+    )
+    db.commit()
+    rebuild_tag_usage(db)
+    return user.id
+
+
+def best_of(repeat: int, function, *args):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, sorted(timings)[len(timings) // 2] * 1000
+
+
+def load_all(db, prefix: str):
+    folded = prefix.casefold()
+    return [
+        name
+        for name in db.scalars(select(models.Tag.name))
+        if name.casefold().startswith(folded)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tags", type=int, default=50000)
+    parser.add_argument("--activities", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(0)
+    init_db()
+    with SessionLocal() as db:
+        user_id = populate(db, args.tags, args.activities)
+        print(f"{args.tags} tags, {args.activities} activities")
+        for prefix in ("s", "St", "str"):
+            best, median = best_of(args.repeat, search_tags, db, user_id, prefix, 10)
+            print(f"  search_tags {prefix!r:6} best {best:.3f} ms, median {median:.3f}")
+        best, median = best_of(10, load_all, db, "st")
+        print(f"  load every tag and filter: best {best:.2f} ms, median {median:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,56 @@
+import asyncio
+import os
+import tempfile
 import pytest
 from unittest.mock import patch
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event
 
-from app.database import Base, get_db
-from app.main import app
+# Point the app at a throwaway SQLite file before it is imported, so the
+# sync and async engines share one test database
+TEST_DATABASE_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{TEST_DATABASE_DIR}/test.db"
 
-# Use an in-memory SQLite database for testing
-TEST_DATABASE_URL = "sqlite:///:memory:"
+from app import database  # noqa: E402
+from app.database import Base, SessionLocal, async_engine, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.chat_user_map import chat_user_map  # noqa: E402
+from app.principal_cache import principal_cache  # noqa: E402
+from app.tag_catalogue import tag_catalogue  # noqa: E402
 
-engine = create_engine(
-    TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine)
 
-# Create test database and tables
-Base.metadata.create_all(bind=engine)
+class QueryCounter:
+    """
+    Collects the SQL statements sent to the test database
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def reset(self):
+        self.statements = []
+
+
+@pytest.fixture(scope="function")
+def query_counter():
+    """
+    Count SQL statements executed against the test database.
+    """
+    counter = QueryCounter()
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    engines = [engine, async_engine.sync_engine]
+    for db_engine in engines:
+        event.listen(db_engine, "before_cursor_execute", record_statement)
+    yield counter
+    for db_engine in engines:
+        event.remove(db_engine, "before_cursor_execute", record_statement)
 
 
 @pytest.fixture(scope="function")
@@ -30,34 +58,25 @@ def db_session():
     """
     Returns a SQLAlchemy session for testing.
     """
-    connection = engine.connect()
-    transaction = connection.begin()
-    session = TestingSessionLocal(bind=connection)
+    session = SessionLocal()
 
     yield session
 
     # Clean up
     session.close()
-    transaction.rollback()
-    connection.close()
+    principal_cache.clear()
+    chat_user_map.clear()
+    tag_catalogue.clear()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
 
 
 @pytest.fixture(scope="function")
 def client(db_session):
     """
-    Create a FastAPI TestClient that uses the db_session fixture.
+    Create a FastAPI TestClient that uses the test database.
     """
-    # Override the get_db dependency to use our test database
-    def override_get_db():
-        try:
-            yield db_session
-        except Exception as e:
-            print(f"Error in db_session: {e}")
-            raise e
-
-    # Apply the overrides
-    app.dependency_overrides[get_db] = override_get_db
-
     # Mock the Telegram bot functions to prevent them from being called
     with patch("app.telegram_bot.start_bot"), \
             patch("app.telegram_bot.stop_bot"):
@@ -65,8 +84,40 @@ def client(db_session):
         with TestClient(app) as client:
             yield client
 
-    # Clean up
-    app.dependency_overrides = {}
+
+@pytest.fixture(scope="function")
+def request_query_count(client, query_counter):
+    """
+    Send a request and return the response together with the number of
+    SQL statements it executed.
+    """
+    def send(method, url, **kwargs):
+        query_counter.reset()
+        response = client.request(method, url, **kwargs)
+        return response, query_counter.count
+
+    return send
+
+
+@pytest.fixture(scope="function")
+def single_background_session(monkeypatch):
+    """
+    Leave background work a single session slot. Returns a coroutine
+    function that opens and closes a background session, failing if the
+    slot doesn't free up.
+    """
+    monkeypatch.setattr(
+        database, "background_session", database.make_session_scope(1)
+    )
+
+    async def open_session():
+        async def open_and_close():
+            async with database.background_session():
+                pass
+
+        await asyncio.wait_for(open_and_close(), timeout=5)
+
+    return open_session
 
 
 @pytest.fixture(scope="function")
@@ -1,3 +1,12 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import activity_io, models, schemas
+
+
 def test_create_activity(client, auth_headers):
     """Test creating an activity"""
     activity_data = {
@@ -19,6 +28,61 @@ def test_create_activity(client, auth_headers):
     assert data["recorded_time"] == 0
 
 
+def test_create_activity_duplicate_tags(client, auth_headers):
+    """Test repeated tag names are attached only once"""
+    activity_data = {"title": "Test Activity", "tags": ["work", "work", "test"]}
+
+    response = client.post("/activities/", json=activity_data, headers=auth_headers)
+
+    assert response.status_code == 200
+    tag_names = [tag["name"] for tag in response.json()["tags"]]
+    assert sorted(tag_names) == ["test", "work"]
+
+
+def test_create_activity_tag_query_count(client, auth_headers, query_counter):
+    """Test tag resolution issues a fixed number of queries per request"""
+    # Warm the authenticated user cache so both requests do the same lookups
+    client.get("/users/me", headers=auth_headers)
+    counts = []
+    for tag_count in (1, 20):
+        tags = [f"tag-{tag_count}-{i}" for i in range(tag_count)]
+        query_counter.reset()
+
+        response = client.post(
+            "/activities/",
+            json={"title": "Many tags", "tags": tags},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()["tags"]) == tag_count
+        counts.append(query_counter.count)
+
+    assert counts[0] == counts[1]
+
+
+def test_update_activity_tag_query_count(
+    client, auth_headers, test_activity, query_counter
+):
+    """Test updating tags issues a fixed number of queries per request"""
+    counts = []
+    for tag_count in (1, 20):
+        tags = [f"tag-{tag_count}-{i}" for i in range(tag_count)]
+        query_counter.reset()
+
+        response = client.put(
+            f"/activities/{test_activity['id']}",
+            json={"tags": tags},
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()["tags"]) == tag_count
+        counts.append(query_counter.count)
+
+    assert counts[0] == counts[1]
+
+
 def test_get_activities_empty(client, auth_headers):
     """Test getting activities when none exist"""
     response = client.get("/activities/", headers=auth_headers)
@@ -41,6 +105,53 @@ def test_get_activities(client, auth_headers, test_activity):
     assert data[0]["title"] == test_activity["title"]
 
 
+def test_get_activities_query_count(client, auth_headers, request_query_count):
+    """Test listing activities does not issue a query per activity"""
+    activity_data = {"title": "Tagged", "tags": ["work", "test"]}
+    counts = []
+    for page_size, new_activities in ((1, 1), (10, 9)):
+        for _ in range(new_activities):
+            client.post("/activities/", json=activity_data, headers=auth_headers)
+
+        response, count = request_query_count(
+            "GET", f"/activities/?limit={page_size}", headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()) == page_size
+        assert all(len(activity["tags"]) == 2 for activity in response.json())
+        counts.append(count)
+
+    assert counts[0] == counts[1]
+
+
+def test_activity_endpoints_load_tags_eagerly(
+    client, auth_headers, test_activity, query_counter
+):
+    """Test single-activity endpoints load tags with the activity"""
+    activity_id = test_activity["id"]
+    requests = [
+        ("GET", f"/activities/{activity_id}", None),
+        ("PUT", f"/activities/{activity_id}", {"title": "Renamed"}),
+        ("POST", f"/activities/{activity_id}/timer", {"action": "start"}),
+        ("POST", "/activities/", {"title": "New", "tags": ["test"]}),
+    ]
+    for method, url, body in requests:
+        query_counter.reset()
+
+        response = client.request(method, url, json=body, headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json()["tags"]
+        lazy_loads = [
+            statement
+            for statement in query_counter.statements
+            if statement.lstrip().startswith("SELECT")
+            and "FROM tags, activity_tags" in statement
+        ]
+        assert lazy_loads == []
+
+
 def test_get_activities_by_tag(client, auth_headers, test_activity):
     """Test getting activities filtered by tag"""
     # First tag from test_activity
@@ -62,6 +173,44 @@ def test_get_activities_by_tag(client, auth_headers, test_activity):
     assert len(data) == 0
 
 
+def test_get_activities_cursor_pagination(client, auth_headers):
+    """Test walking all activities page by page with the next cursor"""
+    created_ids = []
+    for i in range(5):
+        response = client.post(
+            "/activities/", json={"title": f"Activity {i}"}, headers=auth_headers
+        )
+        created_ids.append(response.json()["id"])
+
+    seen_ids = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/activities/", params=params, headers=auth_headers)
+        assert response.status_code == 200
+        seen_ids.extend(activity["id"] for activity in response.json())
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        params = {"limit": 2, "cursor": next_cursor}
+
+    assert sorted(seen_ids) == sorted(created_ids)
+    assert len(seen_ids) == len(set(seen_ids))
+
+    # Offset pagination returns the same order
+    response = client.get("/activities/", params={"limit": 5}, headers=auth_headers)
+    assert [activity["id"] for activity in response.json()] == seen_ids
+
+
+def test_get_activities_invalid_cursor(client, auth_headers):
+    """Test a malformed cursor is rejected"""
+    response = client.get(
+        "/activities/", params={"cursor": "not-a-cursor"}, headers=auth_headers
+    )
+
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
 def test_get_activity_by_id(client, auth_headers, test_activity):
     """Test getting a specific activity by ID"""
     response = client.get(f"/activities/{test_activity['id']}", headers=auth_headers)
@@ -81,6 +230,164 @@ def test_get_activity_by_id_not_found(client, auth_headers):
     assert "Activity not found" in response.json()["detail"]
 
 
+def test_get_activity_etag(client, auth_headers, test_activity):
+    """Test conditional GETs of an activity until one of its writes"""
+    url = f"/activities/{test_activity['id']}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+
+    response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    writes = [
+        ("PUT", url, {"title": "Renamed"}),
+        ("PUT", url, {"tags": ["other"]}),
+        ("POST", f"{url}/timer", {"action": "start"}),
+        ("POST", f"{url}/timer", {"action": "pause"}),
+    ]
+    for method, write_url, body in writes:
+        client.request(method, write_url, json=body, headers=auth_headers)
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        if body.get("action") == "start":
+            # Running timers are never cached
+            assert "ETag" not in response.headers
+            continue
+        assert response.headers["ETag"] != etag
+        etag = response.headers["ETag"]
+
+
+def test_running_timer_not_cached(client, auth_headers, test_activity):
+    """Test activities and pages with a running timer get no ETag"""
+    url = f"/activities/{test_activity['id']}"
+    page_etag = client.get("/activities/", headers=auth_headers).headers["ETag"]
+    client.post(f"{url}/timer", json={"action": "start"}, headers=auth_headers)
+
+    # "*" matches any ETag the representation could have
+    conditional = [(url, "*"), ("/activities/", "*"), ("/activities/", page_etag)]
+    for read_url, etag in conditional:
+        response = client.get(
+            read_url, headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+
+    client.post(f"{url}/timer", json={"action": "pause"}, headers=auth_headers)
+    for read_url in (url, "/activities/"):
+        response = client.get(
+            read_url, headers={**auth_headers, "If-None-Match": "*"}
+        )
+        assert response.status_code == 304
+    response = client.get(
+        "/activities/", headers={**auth_headers, "If-None-Match": page_etag}
+    )
+    assert response.status_code == 200
+
+
+def test_get_activity_not_modified_query_count(
+    client, auth_headers, test_activity, request_query_count
+):
+    """Test an unchanged activity is answered without loading it"""
+    url = f"/activities/{test_activity['id']}"
+    etag = client.get(url, headers=auth_headers).headers["ETag"]
+
+    response, count = request_query_count(
+        "GET", url, headers={**auth_headers, "If-None-Match": etag}
+    )
+
+    assert response.status_code == 304
+    assert count == 1
+
+
+def test_get_activities_etag(client, auth_headers, test_activity, request_query_count):
+    """Test list ETags follow creates, deletes and the query string"""
+    etag = client.get("/activities/", headers=auth_headers).headers["ETag"]
+
+    response, count = request_query_count(
+        "GET", "/activities/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert count == 1
+    other_page = client.get(
+        "/activities/?limit=5", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert other_page.status_code == 200
+
+    created = client.post(
+        "/activities/", json={"title": "New"}, headers=auth_headers
+    ).json()
+    response = client.get(
+        "/activities/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    client.delete(f"/activities/{created['id']}", headers=auth_headers)
+    response = client.get(
+        "/activities/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert [activity["title"] for activity in response.json()] == ["Test Activity"]
+
+
+def test_get_activities_etag_follows_writes(client, auth_headers, test_activity):
+    """Test every kind of activity write changes the list ETag"""
+    url = f"/activities/{test_activity['id']}"
+    writes = [
+        ("PUT", url, {"title": "Renamed"}),
+        ("POST", f"{url}/timer", {"action": "start"}),
+        ("POST", "/activities/timers/batch", {"action": "pause", "all_running": True}),
+        ("POST", f"{url}/timer", {"action": "stop"}),
+        ("POST", "/activities/batch", {"create": [{"title": "Batched"}]}),
+        ("DELETE", url, None),
+    ]
+    etag = client.get("/activities/", headers=auth_headers).headers["ETag"]
+    for method, write_url, body in writes:
+        response = client.request(method, write_url, json=body, headers=auth_headers)
+        assert response.status_code == 200, (write_url, response.text)
+        response = client.get(
+            "/activities/", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        if "ETag" in response.headers:
+            assert response.headers["ETag"] != etag
+            etag = response.headers["ETag"]
+
+
+def test_get_running_activity_is_read_only(
+    client, auth_headers, test_activity, db_session, query_counter
+):
+    """Test GETs of a running timer report live time without issuing DML"""
+    activity_id = test_activity["id"]
+    client.post(
+        f"/activities/{activity_id}/timer",
+        json={"action": "start"},
+        headers=auth_headers,
+    )
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(last_timer_start=datetime.now() - timedelta(seconds=90))
+    )
+    db_session.commit()
+
+    query_counter.reset()
+    single = client.get(f"/activities/{activity_id}", headers=auth_headers).json()
+    listed = client.get("/activities/", headers=auth_headers).json()[0]
+
+    writes = [
+        s for s in query_counter.statements
+        if s.lstrip().split()[0].upper() in ("INSERT", "UPDATE", "DELETE")
+    ]
+    assert writes == []
+    for data in (single, listed):
+        assert data["recorded_time"] == 0
+        assert data["current_recorded_time"] >= 90
+    db_session.expire_all()
+    assert db_session.get(models.Activity, activity_id).recorded_time == 0
+
+
 def test_update_activity(client, auth_headers, test_activity):
     """Test updating an activity"""
     update_data = {
@@ -197,3 +504,471 @@ def test_timer_invalid_action(client, auth_headers, test_activity):
 
     assert response.status_code == 400
     assert "Invalid timer action" in response.json()["detail"]
+
+
+def test_timer_invalid_transition(client, auth_headers, test_activity):
+    """Test timer actions not allowed from the current status return 409"""
+    url = f"/activities/{test_activity['id']}/timer"
+
+    response = client.post(url, json={"action": "pause"}, headers=auth_headers)
+    assert response.status_code == 409
+    assert "Cannot pause a stopped timer" in response.json()["detail"]
+
+    client.post(url, json={"action": "start"}, headers=auth_headers)
+    response = client.post(url, json={"action": "start"}, headers=auth_headers)
+    assert response.status_code == 409
+
+
+def test_timer_action_not_found(client, auth_headers):
+    """Test timer action on a non-existent activity"""
+    response = client.post(
+        "/activities/999/timer", json={"action": "start"}, headers=auth_headers
+    )
+
+    assert response.status_code == 404
+
+
+def test_timer_action_single_update(
+    client, auth_headers, test_activity, request_query_count
+):
+    """Test a timer action updates the row without reading it first"""
+    client.get("/users/me", headers=auth_headers)
+
+    response, count = request_query_count(
+        "post",
+        f"/activities/{test_activity['id']}/timer",
+        json={"action": "start"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    # UPDATE ... RETURNING, the interval INSERT, the tags, then the
+    # activities_version bump
+    assert count == 4
+
+
+def test_timer_concurrent_pauses(client, auth_headers, test_activity, db_session):
+    """Test parallel pauses of one timer add its elapsed time only once"""
+    activity_id = test_activity["id"]
+    url = f"/activities/{activity_id}/timer"
+    client.post(url, json={"action": "start"}, headers=auth_headers)
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(last_timer_start=datetime.now() - timedelta(seconds=60))
+    )
+    db_session.commit()
+
+    def pause(_):
+        return client.post(url, json={"action": "pause"}, headers=auth_headers)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = sorted(r.status_code for r in pool.map(pause, range(8)))
+
+    assert statuses == [200] + [409] * 7
+    db_session.expire_all()
+    activity = db_session.get(models.Activity, activity_id)
+    assert activity.timer_status == "paused"
+    assert 60 <= activity.recorded_time <= 62
+
+
+def create_activities(client, auth_headers, count):
+    return [
+        client.post(
+            "/activities/",
+            json={"title": f"Task {n}", "tags": [f"tag{n}", "shared"]},
+            headers=auth_headers,
+        ).json()
+        for n in range(count)
+    ]
+
+
+def test_export_ndjson(client, auth_headers):
+    """Test exporting activities as NDJSON with their tags"""
+    created = create_activities(client, auth_headers, 3)
+
+    response = client.get("/activities/export", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [activity["id"] for activity in created]
+    assert rows[1]["title"] == "Task 1"
+    assert sorted(rows[1]["tags"]) == ["shared", "tag1"]
+    assert rows[1]["start_time"] == created[1]["start_time"]
+
+
+def test_export_csv(client, auth_headers):
+    """Test exporting activities as CSV with a header row"""
+    create_activities(client, auth_headers, 2)
+
+    response = client.get(
+        "/activities/export", params={"format": "csv"}, headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Task 0", "Task 1"]
+    assert sorted(rows[0]["tags"].split(";")) == ["shared", "tag0"]
+    assert rows[0]["timer_status"] == "stopped"
+
+
+def test_export_loads_tags_per_batch(
+    client, auth_headers, query_counter, monkeypatch
+):
+    """Test the export streams activities once and loads tags per batch"""
+    create_activities(client, auth_headers, 5)
+    client.get("/users/me", headers=auth_headers)
+    monkeypatch.setattr(activity_io, "EXPORT_BATCH_SIZE", 2)
+
+    query_counter.reset()
+    response = client.get("/activities/export", headers=auth_headers)
+
+    assert len(response.text.splitlines()) == 5
+    activity_queries = [s for s in query_counter.statements if "FROM activities" in s]
+    tag_queries = [s for s in query_counter.statements if "FROM activity_tags" in s]
+    assert len(activity_queries) == 1
+    assert len(tag_queries) == 3
+
+
+def test_export_invalid_format(client, auth_headers):
+    """Test exporting in an unknown format"""
+    response = client.get(
+        "/activities/export", params={"format": "xml"}, headers=auth_headers
+    )
+
+    assert response.status_code == 422
+
+
+def test_import_ndjson(client, auth_headers):
+    """Test importing activities from NDJSON with their tags"""
+    body = "\n".join(
+        json.dumps(row)
+        for row in [
+            {"title": "Imported 1", "tags": ["work", "imported"]},
+            {"title": "Imported 2", "description": "Notes", "duration": 60},
+        ]
+    )
+
+    response = client.post(
+        "/activities/import", content=body.encode(), headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"imported": 2, "errors": []}
+    activities = client.get("/activities/", headers=auth_headers).json()
+    by_title = {activity["title"]: activity for activity in activities}
+    assert sorted(tag["name"] for tag in by_title["Imported 1"]["tags"]) == [
+        "imported",
+        "work",
+    ]
+    assert by_title["Imported 2"]["description"] == "Notes"
+    assert by_title["Imported 2"]["duration"] == 60
+
+
+def test_import_csv(client, auth_headers):
+    """Test importing activities from CSV, including a multi-line field"""
+    body = (
+        "title,description,tags\n"
+        'Read,"Chapter 1\nand 2",books;evening\n'
+        "Run,,sport\n"
+    )
+
+    response = client.post(
+        "/activities/import",
+        params={"format": "csv"},
+        content=body.encode(),
+        headers=auth_headers,
+    )
+
+    assert response.json() == {"imported": 2, "errors": []}
+    activities = client.get("/activities/", headers=auth_headers).json()
+    by_title = {activity["title"]: activity for activity in activities}
+    assert by_title["Read"]["description"] == "Chapter 1\nand 2"
+    assert sorted(tag["name"] for tag in by_title["Read"]["tags"]) == [
+        "books",
+        "evening",
+    ]
+    assert by_title["Run"]["description"] is None
+
+
+def test_import_reports_row_errors(client, auth_headers):
+    """Test that invalid rows are reported while valid ones are imported"""
+    body = "\n".join(
+        [
+            json.dumps({"title": "Good"}),
+            "not json",
+            json.dumps({"description": "No title"}),
+            json.dumps({"title": "Bad duration", "duration": "long"}),
+            json.dumps({"title": "Negative", "recorded_time": -5}),
+        ]
+    )
+
+    response = client.post(
+        "/activities/import", content=body.encode(), headers=auth_headers
+    )
+
+    report = response.json()
+    assert report["imported"] == 1
+    assert [error["row"] for error in report["errors"]] == [2, 3, 4, 5]
+    assert report["errors"][1]["errors"] == ["title: Field required"]
+    assert report["errors"][2]["errors"][0].startswith("duration:")
+    assert report["errors"][3]["errors"][0].startswith("recorded_time:")
+
+
+def test_import_round_trips_export(client, auth_headers):
+    """Test that an NDJSON export can be imported back"""
+    create_activities(client, auth_headers, 3)
+    export = client.get("/activities/export", headers=auth_headers).content
+
+    response = client.post(
+        "/activities/import", content=export, headers=auth_headers
+    )
+
+    assert response.json() == {"imported": 3, "errors": []}
+    activities = client.get("/activities/", headers=auth_headers).json()
+    assert len(activities) == 6
+    fields = ["title", "start_time", "end_time", "recorded_time"]
+    copies = sorted(
+        tuple(activity[field] for field in fields) for activity in activities
+    )
+    assert copies[0::2] == copies[1::2]
+
+
+def test_import_keeps_history(client, auth_headers):
+    """Test imported start times and tracked time reach reads and reports"""
+    body = json.dumps(
+        {
+            "title": "Last year",
+            "start_time": "2024-03-01T23:30:00",
+            "end_time": "2024-03-02T01:00:00",
+            "recorded_time": 3600,
+            "tags": ["history"],
+        }
+    )
+
+    response = client.post(
+        "/activities/import", content=body.encode(), headers=auth_headers
+    )
+
+    assert response.json() == {"imported": 1, "errors": []}
+    (activity,) = client.get("/activities/", headers=auth_headers).json()
+    assert activity["start_time"].startswith("2024-03-01T23:30:00")
+    assert activity["end_time"].startswith("2024-03-02T01:00:00")
+    assert activity["recorded_time"] == 3600
+    days = client.get(
+        "/reports/tags/days",
+        params={"start": "2024-03-01", "end": "2024-03-02"},
+        headers=auth_headers,
+    ).json()
+    assert days == [
+        {"day": "2024-03-01", "tag": "history", "seconds": 1800},
+        {"day": "2024-03-02", "tag": "history", "seconds": 1800},
+    ]
+
+
+def test_import_batches_statements(
+    client, auth_headers, query_counter, monkeypatch
+):
+    """Test the import inserts each batch with one statement per table"""
+    client.get("/users/me", headers=auth_headers)
+    monkeypatch.setattr(activity_io, "IMPORT_BATCH_SIZE", 2)
+    body = "\n".join(
+        json.dumps({"title": f"Task {n}", "tags": ["shared", f"tag{n}"]})
+        for n in range(5)
+    )
+
+    query_counter.reset()
+    response = client.post(
+        "/activities/import", content=body.encode(), headers=auth_headers
+    )
+
+    assert response.json()["imported"] == 5
+    activity_inserts = [
+        s for s in query_counter.statements if s.startswith("INSERT INTO activities")
+    ]
+    link_inserts = [
+        s
+        for s in query_counter.statements
+        if s.startswith("INSERT INTO activity_tags")
+    ]
+    assert len(activity_inserts) == 3
+    assert len(link_inserts) == 3
+
+
+def test_batch_activities(client, auth_headers, test_activity):
+    """Test creating, updating and deleting activities in one batch"""
+    kept, removed = create_activities(client, auth_headers, 2)
+
+    response = client.post(
+        "/activities/batch",
+        json={
+            "create": [{"title": "New", "tags": ["fresh"]}],
+            "update": [
+                {"id": test_activity["id"], "title": "Renamed"},
+                {"id": kept["id"], "tags": ["retagged"]},
+            ],
+            "delete": [removed["id"]],
+        },
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [activity["title"] for activity in data["created"]] == ["New"]
+    assert [tag["name"] for tag in data["created"][0]["tags"]] == ["fresh"]
+    renamed, retagged = data["updated"]
+    assert renamed["title"] == "Renamed"
+    assert sorted(tag["name"] for tag in renamed["tags"]) == ["pytest", "test"]
+    assert retagged["title"] == "Task 0"
+    assert [tag["name"] for tag in retagged["tags"]] == ["retagged"]
+    assert data["deleted"] == [removed["id"]]
+    activities = client.get("/activities/", headers=auth_headers).json()
+    assert sorted(activity["title"] for activity in activities) == [
+        "New",
+        "Renamed",
+        "Task 0",
+    ]
+
+
+def test_batch_activities_is_all_or_nothing(client, auth_headers, test_activity):
+    """Test a batch naming an unknown activity changes nothing"""
+    response = client.post(
+        "/activities/batch",
+        json={
+            "create": [{"title": "New"}],
+            "update": [{"id": test_activity["id"], "title": "Renamed"}],
+            "delete": [999],
+        },
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 404
+    activities = client.get("/activities/", headers=auth_headers).json()
+    assert [activity["title"] for activity in activities] == ["Test Activity"]
+
+
+def test_batch_activities_repeated_id(client, auth_headers, test_activity):
+    """Test an activity can't be both updated and deleted in one batch"""
+    response = client.post(
+        "/activities/batch",
+        json={
+            "update": [{"id": test_activity["id"], "title": "Renamed"}],
+            "delete": [test_activity["id"]],
+        },
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 400
+
+
+def test_batches_capped(client, auth_headers):
+    """Test batch lists are capped and a batch at the cap succeeds"""
+    too_many = schemas.BATCH_MAX_ITEMS + 1
+    bodies = [
+        ("/activities/batch", {"create": [{"title": "Task"}] * too_many}),
+        ("/activities/batch", {"update": [{"id": n} for n in range(too_many)]}),
+        ("/activities/batch", {"delete": list(range(too_many))}),
+        (
+            "/activities/timers/batch",
+            {"action": "stop", "activity_ids": list(range(too_many))},
+        ),
+    ]
+
+    for url, body in bodies:
+        response = client.post(url, json=body, headers=auth_headers)
+        assert response.status_code == 422
+
+    assert client.get("/activities/", headers=auth_headers).json() == []
+
+    most = schemas.BATCH_MAX_ITEMS
+    created = client.post(
+        "/activities/batch",
+        json={"create": [{"title": "Task", "tags": ["a", "b"]}] * most},
+        headers=auth_headers,
+    ).json()["created"]
+    ids = [activity["id"] for activity in created]
+    response = client.post(
+        "/activities/batch",
+        json={"update": [{"id": n, "tags": ["c"]} for n in ids[:250]]}
+        | {"delete": ids[250:]},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+
+def test_batch_activities_query_count(client, auth_headers, request_query_count):
+    """Test the statements a batch runs don't grow with its size"""
+    client.get("/users/me", headers=auth_headers)
+
+    def send_batch(size):
+        activities = create_activities(client, auth_headers, 2 * size)
+        response, count = request_query_count(
+            "post",
+            "/activities/batch",
+            json={
+                "create": [{"title": "New", "tags": ["new"]}] * size,
+                "update": [
+                    {"id": activity["id"], "title": "Renamed", "tags": ["renamed"]}
+                    for activity in activities[:size]
+                ],
+                "delete": [activity["id"] for activity in activities[size:]],
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        return count
+
+    # The first batch also creates its tags
+    send_batch(1)
+    assert send_batch(1) == send_batch(5)
+
+
+def test_batch_timers(client, auth_headers):
+    """Test starting listed timers and stopping all running ones"""
+    first, second, third = create_activities(client, auth_headers, 3)
+
+    response = client.post(
+        "/activities/timers/batch",
+        json={"action": "start", "activity_ids": [first["id"], second["id"], 999]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [activity["id"] for activity in data["activities"]] == [
+        first["id"],
+        second["id"],
+    ]
+    assert all(activity["timer_status"] == "running" for activity in data["activities"])
+    assert data["skipped"] == [999]
+
+    response = client.post(
+        "/activities/timers/batch",
+        json={"action": "stop", "all_running": True},
+        headers=auth_headers,
+    )
+
+    data = response.json()
+    assert [activity["id"] for activity in data["activities"]] == [
+        first["id"],
+        second["id"],
+    ]
+    assert all(activity["timer_status"] == "stopped" for activity in data["activities"])
+    assert data["skipped"] == []
+    third = client.get(f"/activities/{third['id']}", headers=auth_headers).json()
+    assert third["timer_status"] == "stopped"
+
+
+def test_batch_timers_invalid_request(client, auth_headers, test_activity):
+    """Test a timer batch needs a valid action and one kind of target"""
+    for body in (
+        {"action": "rewind", "all_running": True},
+        {"action": "stop"},
+        {"action": "stop", "all_running": True, "activity_ids": [test_activity["id"]]},
+    ):
+        response = client.post(
+            "/activities/timers/batch", json=body, headers=auth_headers
+        )
+        assert response.status_code == 400
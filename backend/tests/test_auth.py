@@ -1,5 +1,10 @@
+import asyncio
+import time
+import pytest
 from jose import jwt
 from app import auth, config
+from app.hashing import HashingBusy, PasswordHasher
+from app.principal_cache import PrincipalCache, UserSnapshot
 
 
 def test_password_hashing():
@@ -32,3 +37,90 @@ def test_token_creation_and_decoding():
     # Check payload
     assert payload["sub"] == "test@example.com"
     assert "exp" in payload
+
+
+def test_password_hasher_hash_and_verify():
+    """Test hashing and verification through the process pool"""
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+
+    async def hash_and_verify():
+        hashed = await hasher.hash("testpassword123")
+        return (
+            await hasher.verify("testpassword123", hashed),
+            await hasher.verify("wrongpassword", hashed),
+        )
+
+    try:
+        assert asyncio.run(hash_and_verify()) == (True, False)
+    finally:
+        hasher.shutdown()
+
+
+def test_password_hasher_rejects_when_saturated():
+    """Test the hashing pool fails fast instead of queueing without bound"""
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    hasher.in_flight = hasher.capacity
+
+    with pytest.raises(HashingBusy):
+        asyncio.run(hasher.hash("testpassword123"))
+
+
+def test_password_hasher_recovers_from_dead_worker():
+    """Test a killed worker fails one call and the next gets a new pool"""
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+
+    async def kill_worker_then_hash():
+        hashed = await hasher.hash("testpassword123")
+        for process in list(hasher._executor._processes.values()):
+            process.kill()
+            process.join()
+        with pytest.raises(HashingBusy):
+            await hasher.hash("testpassword123")
+        return await hasher.verify("testpassword123", hashed)
+
+    try:
+        assert asyncio.run(kill_worker_then_hash()) is True
+    finally:
+        hasher.shutdown()
+
+
+def test_hashing_metrics(client, test_user):
+    """Test queue wait and hash time are exposed as metrics"""
+    response = client.get("/metrics/")
+
+    assert response.status_code == 200
+    timings = response.json()["timings"]
+    assert timings["hashing.queue_wait"]["count"] >= 1
+    assert timings["hashing.hash_time"]["count"] >= 1
+
+
+def test_principal_cache_expiry():
+    """Test cached users never outlive the token expiry"""
+    cache = PrincipalCache(max_size=10, ttl_seconds=60)
+    user = UserSnapshot(id=1, email="testuser@gmail.com", is_active=True)
+
+    cache.put("valid", user, time.time() + 60)
+    cache.put("expired", user, time.time() - 1)
+
+    assert cache.get("valid") == user
+    assert cache.get("expired") is None
+
+
+def test_principal_cache_eviction_and_invalidation():
+    """Test the cache stays bounded and drops all tokens of a user"""
+    cache = PrincipalCache(max_size=2, ttl_seconds=60)
+    first = UserSnapshot(id=1, email="first@gmail.com", is_active=True)
+    second = UserSnapshot(id=2, email="second@gmail.com", is_active=True)
+    expires_at = time.time() + 60
+
+    cache.put("token-a", first, expires_at)
+    cache.put("token-b", second, expires_at)
+    cache.put("token-c", first, expires_at)
+
+    assert len(cache) == 2
+    assert cache.get("token-a") is None
+
+    cache.invalidate_user(first.id)
+
+    assert cache.get("token-c") is None
+    assert cache.get("token-b") == second
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import tempfile
+from sqlalchemy import create_engine, event, inspect, select
+from app import config, database, models, telegram_bot
+
+
+def test_async_database_url_sqlite():
+    """Test SQLite URLs are mapped to the aiosqlite driver"""
+    url = database.get_async_database_url("sqlite:///./plan_tracker.db")
+
+    assert url.drivername == "sqlite+aiosqlite"
+    assert url.database == "./plan_tracker.db"
+
+
+def test_async_database_url_postgres():
+    """Test PostgreSQL URLs are mapped to the asyncpg driver"""
+    url = database.get_async_database_url("postgresql+psycopg2://user:pw@db/plans")
+
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.host == "db"
+    assert url.database == "plans"
+
+
+def test_async_endpoints_skip_sync_engine(client, auth_headers, test_activity):
+    """Test async endpoints only query through the async engine"""
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", record_statement)
+    try:
+        client.post(
+            "/users/login",
+            json={"email": "testuser@gmail.com", "password": "testpassword123"},
+        )
+        client.get("/users/me", headers=auth_headers)
+        client.post(
+            f"/activities/{test_activity['id']}/timer",
+            json={"action": "start"},
+            headers=auth_headers,
+        )
+    finally:
+        event.remove(database.engine, "before_cursor_execute", record_statement)
+
+    assert statements == []
+
+
+def test_add_missing_columns():
+    """Test columns added to a model are added to an existing table"""
+    path = os.path.join(tempfile.mkdtemp(), "old.db")
+    old_engine = create_engine(f"sqlite:///{path}")
+    with old_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE activities (id INTEGER PRIMARY KEY, title VARCHAR)"
+        )
+
+    database.add_missing_columns(old_engine)
+
+    columns = {
+        column["name"] for column in inspect(old_engine).get_columns("activities")
+    }
+    assert columns == set(models.Activity.__table__.columns.keys())
+    old_engine.dispose()
+
+
+def test_clear_duplicate_chat_links():
+    """Test a chat linked to several accounts stays on the oldest only"""
+    path = os.path.join(tempfile.mkdtemp(), "old.db")
+    old_engine = create_engine(f"sqlite:///{path}")
+    with old_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_chat_id VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO users VALUES (1, '42'), (2, '42'), (3, '7'), (4, NULL)"
+        )
+
+    database.clear_duplicate_chat_links(old_engine)
+    index = next(
+        index
+        for index in models.User.__table__.indexes
+        if index.name == "ix_users_telegram_chat_id"
+    )
+    index.create(bind=old_engine)
+
+    with old_engine.connect() as connection:
+        links = connection.exec_driver_sql(
+            "SELECT id, telegram_chat_id FROM users ORDER BY id"
+        ).all()
+    assert links == [(1, "42"), (2, None), (3, "7"), (4, None)]
+    old_engine.dispose()
+
+
+def test_drop_retired_indexes():
+    """Test indexes nothing queries any more are dropped from old databases"""
+    path = os.path.join(tempfile.mkdtemp(), "old.db")
+    old_engine = create_engine(f"sqlite:///{path}")
+    with old_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE activities (id INTEGER PRIMARY KEY, user_id INTEGER)"
+        )
+        connection.exec_driver_sql(
+            "CREATE INDEX ix_activities_user_id_updated_at ON activities (user_id)"
+        )
+
+    database.drop_retired_indexes(old_engine)
+    database.drop_retired_indexes(old_engine)
+
+    assert inspect(old_engine).get_indexes("activities") == []
+    old_engine.dispose()
+
+
+def test_sessions_share_database(client, db_session):
+    """Test rows written through the async layer are visible to sync sessions"""
+    response = client.post(
+        "/users/", json={"email": "shared@gmail.com", "password": "password123"}
+    )
+    assert response.status_code == 201
+
+    user = db_session.get(models.User, response.json()["id"])
+    assert user.email == "shared@gmail.com"
+
+
+def test_sqlite_pragmas_applied():
+    """Test new SQLite connections get the configured PRAGMA profile"""
+    with database.engine.connect() as conn:
+        journal_mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        busy_timeout = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+        temp_store = conn.exec_driver_sql("PRAGMA temp_store").scalar()
+
+    assert journal_mode == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == int(config.SQLITE_PRAGMAS["busy_timeout"])
+    assert temp_store == 2  # MEMORY
+
+
+def test_engine_options_pool_settings():
+    """Test pool settings apply to server databases but not in-memory SQLite"""
+    postgres = database.get_engine_options("postgresql://user:pw@db/plans")
+    memory = database.get_engine_options("sqlite://")
+
+    assert postgres["pool_size"] == config.DB_POOL_SIZE
+    assert postgres["max_overflow"] == config.DB_MAX_OVERFLOW
+    assert postgres["pool_pre_ping"] is True
+    assert "pool_size" not in memory
+
+
+def test_session_scope_caps_open_sessions():
+    """Test a session scope never holds more connections than its limit"""
+    session_scope = database.make_session_scope(2)
+    open_sessions = []
+    peak = []
+
+    async def use_session():
+        async with session_scope() as db:
+            open_sessions.append(db)
+            peak.append(len(open_sessions))
+            await db.execute(select(models.User.id))
+            await asyncio.sleep(0.01)
+            open_sessions.remove(db)
+
+    async def main():
+        try:
+            await asyncio.gather(*(use_session() for _ in range(6)))
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+
+    assert len(peak) == 6
+    assert max(peak) == 2
+    assert database.async_engine.pool.checkedout() == 0
+
+
+def test_pool_gauges_exposed(client):
+    """Test pool gauges are reported by the metrics endpoint"""
+    gauges = client.get("/metrics/").json()["gauges"]
+
+    assert "db.pool.checked_out" in gauges
+    assert "db.pool.overflow" in gauges
+    assert "db.async_pool.checked_out" in gauges
+
+
+def query_plan(conn, statement):
+    """
+    EXPLAIN QUERY PLAN of the SQL the application sends for a statement, with
+    its parameters left unbound, so the plan can't depend on their values
+    """
+    compiled = statement.compile(conn, compile_kwargs={"render_postcompile": True})
+    params = (None,) * len(compiled.positiontup)
+    return conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+
+
+def test_bot_lookups_use_indexes():
+    """Test chat-id and running-timer lookups are served by indexes"""
+    with database.engine.connect() as conn:
+        user_plan = query_plan(
+            conn, select(models.User.id).where(models.User.telegram_chat_id == "42")
+        )
+        timer_plan = query_plan(conn, telegram_bot.running_activity_query(1))
+
+    assert "ix_users_telegram_chat_id" in user_plan[0].detail
+    assert "ix_activities_user_id_running" in timer_plan[0].detail
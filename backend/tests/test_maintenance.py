@@ -0,0 +1,313 @@
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, update
+from app import database, maintenance, models
+from app.daily_rollups import ALL_TAGS, UNTAGGED, split_by_day
+
+
+def timer(client, auth_headers, activity_id, action):
+    response = client.post(
+        f"/activities/{activity_id}/timer",
+        json={"action": action},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def rewind_timer(db_session, activity_id, seconds=None, started_at=None):
+    """
+    Move the running timer's start, and its open interval, back in time
+    """
+    started_at = started_at or datetime.now() - timedelta(seconds=seconds)
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(last_timer_start=started_at)
+    )
+    db_session.execute(
+        update(models.ActivityInterval)
+        .where(
+            models.ActivityInterval.activity_id == activity_id,
+            models.ActivityInterval.ended_at.is_(None),
+        )
+        .values(started_at=started_at)
+    )
+    db_session.commit()
+
+
+def intervals(db_session, activity_id):
+    db_session.expire_all()
+    return db_session.scalars(
+        select(models.ActivityInterval)
+        .where(models.ActivityInterval.activity_id == activity_id)
+        .order_by(models.ActivityInterval.id)
+    ).all()
+
+
+def test_timer_actions_log_intervals(client, auth_headers, test_activity, db_session):
+    """Test start/save/pause/stop open, split and close timer intervals"""
+    activity_id = test_activity["id"]
+
+    timer(client, auth_headers, activity_id, "start")
+    rewind_timer(db_session, activity_id, 30)
+    timer(client, auth_headers, activity_id, "save")
+    rewind_timer(db_session, activity_id, 20)
+    timer(client, auth_headers, activity_id, "pause")
+    timer(client, auth_headers, activity_id, "stop")
+
+    logged = intervals(db_session, activity_id)
+    assert len(logged) == 2
+    assert all(interval.ended_at is not None for interval in logged)
+    assert maintenance.verify_recorded_time(db_session) == []
+    assert db_session.get(models.Activity, activity_id).recorded_time >= 50
+
+
+def test_interval_index_range_scan(db_session):
+    """Test time-range queries on the interval log use the user index"""
+    plan = db_session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN SELECT * FROM activity_intervals "
+        "WHERE user_id = 1 AND started_at >= '2024-01-01' "
+        "AND started_at < '2024-01-08'"
+    ).all()
+
+    assert "ix_activity_intervals_user_id_started_at" in plan[0].detail
+
+
+def test_delete_activity_removes_intervals(
+    client, auth_headers, test_activity, db_session
+):
+    """Test deleting an activity deletes its interval log"""
+    timer(client, auth_headers, test_activity["id"], "start")
+
+    client.delete(f"/activities/{test_activity['id']}", headers=auth_headers)
+
+    assert intervals(db_session, test_activity["id"]) == []
+
+
+def test_verify_and_rebuild_recorded_time(
+    client, auth_headers, test_activity, db_session
+):
+    """Test verify reports a drifted total and rebuild restores it"""
+    activity_id = test_activity["id"]
+    timer(client, auth_headers, activity_id, "start")
+    rewind_timer(db_session, activity_id, 40)
+    recorded = timer(client, auth_headers, activity_id, "stop")["recorded_time"]
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(recorded_time=5)
+    )
+    db_session.commit()
+
+    assert maintenance.verify_recorded_time(db_session) == [
+        (activity_id, 5, recorded)
+    ]
+    assert maintenance.rebuild_recorded_time(db_session) == 1
+    assert maintenance.verify_recorded_time(db_session) == []
+    assert maintenance.main(["verify"]) == 0
+
+
+def test_rebuild_keeps_unlogged_recorded_time(client, auth_headers, db_session):
+    """Test verify and rebuild skip activities tracked before the log"""
+    activity = client.post(
+        "/activities/", json={"title": "Old"}, headers=auth_headers
+    ).json()
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity["id"])
+        .values(recorded_time=3600)
+    )
+    db_session.commit()
+
+    assert maintenance.verify_recorded_time(db_session) == []
+    assert maintenance.rebuild_recorded_time(db_session) == 0
+    recorded_time = db_session.scalar(
+        select(models.Activity.recorded_time).where(
+            models.Activity.id == activity["id"]
+        )
+    )
+    assert recorded_time == 3600
+
+
+def test_backfill_intervals(client, auth_headers, test_activity, db_session):
+    """Test activities tracked before the log get a matching synthetic log"""
+    activity_id = test_activity["id"]
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(
+            recorded_time=3600,
+            timer_status="running",
+            last_timer_start=datetime.now() - timedelta(seconds=10),
+        )
+    )
+    db_session.commit()
+    # Without a log, recorded_time is left alone rather than reported
+    assert maintenance.verify_recorded_time(db_session) == []
+
+    assert maintenance.backfill_intervals(db_session) == 1
+    assert maintenance.verify_recorded_time(db_session) == []
+    assert maintenance.rebuild_recorded_time(db_session) == 0
+    logged = intervals(db_session, activity_id)
+    assert [interval.ended_at is None for interval in logged] == [False, True]
+
+    timer(client, auth_headers, activity_id, "stop")
+    assert maintenance.verify_recorded_time(db_session) == []
+
+
+def test_startup_backfills_before_timer_actions(client, auth_headers, db_session):
+    """Test time tracked before an upgrade survives timer use after it"""
+    ids = [
+        client.post(
+            "/activities/", json={"title": title, "tags": ["old"]}, headers=auth_headers
+        ).json()["id"]
+        for title in ("Stopped", "Running")
+    ]
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id.in_(ids))
+        .values(recorded_time=3600)
+    )
+    db_session.execute(
+        update(models.Activity)
+        .where(models.Activity.id == ids[1])
+        .values(
+            timer_status="running",
+            last_timer_start=datetime.now() - timedelta(seconds=30),
+        )
+    )
+    db_session.commit()
+
+    database.init_db()
+    timer(client, auth_headers, ids[0], "start")
+    timer(client, auth_headers, ids[0], "pause")
+    paused = timer(client, auth_headers, ids[1], "pause")
+
+    assert maintenance.backfill_intervals(db_session) == 0
+    assert maintenance.verify_recorded_time(db_session) == []
+    assert maintenance.rebuild_recorded_time(db_session) == 0
+    assert paused["recorded_time"] >= 3630
+    old = tag_id(db_session, "old")
+    assert sum(
+        seconds for (tag, _), seconds in rollups(db_session).items() if tag == old
+    ) >= 2 * 3600 + 30
+
+
+def rollups(db_session):
+    db_session.expire_all()
+    return {
+        (rollup.tag_id, rollup.day): rollup.seconds
+        for rollup in db_session.scalars(select(models.DailyRollup))
+        if rollup.seconds
+    }
+
+
+def tag_totals(db_session):
+    """
+    Rolled-up seconds per tag over all days, so timers rewound across
+    midnight add up the same as any other
+    """
+    totals = Counter()
+    for (tag, _), seconds in rollups(db_session).items():
+        totals[tag] += seconds
+    return totals
+
+
+def tag_id(db_session, name):
+    return db_session.scalar(select(models.Tag.id).where(models.Tag.name == name))
+
+
+def test_split_by_day():
+    """Test intervals are split at midnight into whole seconds"""
+    assert split_by_day(datetime(2024, 1, 1, 23, 30), datetime(2024, 1, 3, 0, 15)) == [
+        (date(2024, 1, 1), 1800),
+        (date(2024, 1, 2), 86400),
+        (date(2024, 1, 3), 900),
+    ]
+
+
+def test_timer_updates_rollups_across_midnight(client, auth_headers, db_session):
+    """Test pausing a timer that ran past midnight rolls up both days"""
+    activity = client.post(
+        "/activities/", json={"title": "Late", "tags": ["night"]}, headers=auth_headers
+    ).json()
+    today = date.today()
+    yesterday = today - timedelta(days=1)
+
+    timer(client, auth_headers, activity["id"], "start")
+    rewind_timer(
+        db_session,
+        activity["id"],
+        started_at=datetime.combine(today, time.min) - timedelta(minutes=30),
+    )
+    recorded = timer(client, auth_headers, activity["id"], "pause")["recorded_time"]
+
+    night = tag_id(db_session, "night")
+    incremental = rollups(db_session)
+    assert incremental[ALL_TAGS, yesterday] == 1800
+    assert incremental[night, yesterday] == 1800
+    assert incremental[ALL_TAGS, yesterday] + incremental.get(
+        (ALL_TAGS, today), 0
+    ) == recorded
+
+    maintenance.rebuild_rollups(db_session)
+    assert rollups(db_session) == incremental
+
+
+def test_rollups_follow_tag_changes_and_deletes(
+    client, auth_headers, test_activity, db_session
+):
+    """Test retagging moves rolled-up time and deleting removes it"""
+    activity_id = test_activity["id"]
+    timer(client, auth_headers, activity_id, "start")
+    rewind_timer(db_session, activity_id, 600)
+    timer(client, auth_headers, activity_id, "stop")
+    assert tag_totals(db_session)[tag_id(db_session, "test")] >= 600
+
+    client.put(
+        f"/activities/{activity_id}", json={"tags": []}, headers=auth_headers
+    )
+    moved = tag_totals(db_session)
+    assert set(moved) == {ALL_TAGS, UNTAGGED}
+    assert moved[UNTAGGED] == moved[ALL_TAGS]
+    incremental = rollups(db_session)
+    maintenance.rebuild_rollups(db_session)
+    assert rollups(db_session) == incremental
+
+    client.delete(f"/activities/{activity_id}", headers=auth_headers)
+    assert rollups(db_session) == {}
+
+
+def test_batches_keep_rollups_current(client, auth_headers, db_session):
+    """Test batch timer stops, retags and deletes keep rollups current"""
+    first, second = (
+        client.post(
+            "/activities/",
+            json={"title": title, "tags": ["batch"]},
+            headers=auth_headers,
+        ).json()["id"]
+        for title in ("First", "Second")
+    )
+    for activity_id, seconds in ((first, 300), (second, 600)):
+        timer(client, auth_headers, activity_id, "start")
+        rewind_timer(db_session, activity_id, seconds)
+    client.post(
+        "/activities/timers/batch",
+        json={"action": "stop", "all_running": True},
+        headers=auth_headers,
+    )
+    batch = tag_id(db_session, "batch")
+    assert 900 <= tag_totals(db_session)[batch] <= 902
+
+    client.post(
+        "/activities/batch",
+        json={"update": [{"id": first, "tags": ["moved"]}], "delete": [second]},
+        headers=auth_headers,
+    )
+    moved = tag_totals(db_session)
+    assert set(moved) == {ALL_TAGS, tag_id(db_session, "moved")}
+    assert 300 <= moved[ALL_TAGS] <= 301
+    incremental = rollups(db_session)
+    maintenance.rebuild_rollups(db_session)
+    assert rollups(db_session) == incremental
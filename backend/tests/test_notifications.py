@@ -0,0 +1,363 @@
+import asyncio
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from sqlalchemy import select, update
+from app import auth, database, models, telegram_bot
+from app.chat_user_map import ChatUserMap, chat_user_map
+from app.notification_dispatcher import NotificationDispatcher
+from app.notification_outbox import OutboxRelay
+from app.principal_cache import principal_cache
+
+
+def create_dispatcher(send, **kwargs):
+    settings = {
+        "workers": 10,
+        "global_rate": 1000,
+        "per_chat_interval": 0,
+        "max_retries": 2,
+        "backoff_base": 0.01,
+    }
+    settings.update(kwargs)
+    return NotificationDispatcher(send, **settings)
+
+
+def run_dispatcher(dispatcher, messages):
+    async def main():
+        dispatcher.start()
+        try:
+            return await dispatcher.send_many(messages)
+        finally:
+            await dispatcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_dispatcher_sends_concurrently():
+    """Test slow sends to different chats overlap"""
+    async def send(chat_id, text):
+        await asyncio.sleep(0.1)
+
+    dispatcher = create_dispatcher(send)
+    messages = [(str(chat_id), "hello") for chat_id in range(20)]
+
+    started = time.monotonic()
+    results = run_dispatcher(dispatcher, messages)
+
+    assert results == [True] * 20
+    assert time.monotonic() - started < 0.5
+
+
+def test_dispatcher_paces_messages_per_chat():
+    """Test messages to one chat respect the per-chat interval"""
+    sent_at = []
+
+    async def send(chat_id, text):
+        sent_at.append(time.monotonic())
+
+    dispatcher = create_dispatcher(send, per_chat_interval=0.1)
+    run_dispatcher(dispatcher, [("42", "one"), ("42", "two"), ("42", "three")])
+
+    gaps = [later - earlier for earlier, later in zip(sent_at, sent_at[1:])]
+    assert len(gaps) == 2
+    assert all(gap >= 0.09 for gap in gaps)
+
+
+def test_dispatcher_retries_after_flood_control():
+    """Test a RetryAfter from Telegram is retried instead of dropped"""
+    attempts = []
+
+    async def send(chat_id, text):
+        attempts.append(chat_id)
+        if len(attempts) == 1:
+            raise TelegramRetryAfter(
+                method=MagicMock(), message="Too Many Requests", retry_after=0
+            )
+
+    dispatcher = create_dispatcher(send)
+
+    assert run_dispatcher(dispatcher, [("42", "hello")]) == [True]
+    assert attempts == ["42", "42"]
+
+
+def test_dispatcher_does_not_retry_permanent_errors():
+    """Test a rejected message is reported as undelivered without retries"""
+    attempts = []
+
+    async def send(chat_id, text):
+        attempts.append(chat_id)
+        raise TelegramBadRequest(method=MagicMock(), message="chat not found")
+
+    dispatcher = create_dispatcher(send)
+
+    assert run_dispatcher(dispatcher, [("42", "hello")]) == [False]
+    assert attempts == ["42"]
+
+
+def drain_outbox(relay, delivered):
+    """
+    Drain one outbox batch with a fake sender returning the given results.
+    Returns the messages that were handed to the sender.
+    """
+    handed_over = []
+
+    async def send_many(messages):
+        handed_over.extend(messages)
+        return delivered[:len(handed_over)]
+
+    async def main():
+        try:
+            await relay.drain_once(send_many)
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+    return handed_over
+
+
+def bot_message(chat_id, text=""):
+    message = MagicMock()
+    message.from_user.id = chat_id
+    message.text = text
+    message.answer = AsyncMock()
+    return message
+
+
+def run_bot_handler(handler):
+    async def main():
+        try:
+            await handler
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_timer_action_queues_notification(
+    client, auth_headers, test_activity, db_session
+):
+    """Test timer actions write to the outbox instead of calling Telegram"""
+    user_id = client.get("/users/me", headers=auth_headers).json()["id"]
+    db_session.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(telegram_chat_id="42")
+    )
+    db_session.commit()
+    principal_cache.invalidate_user(user_id)
+
+    send = AsyncMock()
+    with patch.object(telegram_bot.notification_dispatcher, "_send", new=send):
+        response = client.post(
+            f"/activities/{test_activity['id']}/timer",
+            json={"action": "start"},
+            headers=auth_headers,
+        )
+
+    assert response.status_code == 200
+    send.assert_not_awaited()
+    queued = db_session.scalars(select(models.NotificationOutbox)).all()
+    assert [(row.chat_id, row.status) for row in queued] == [("42", "pending")]
+    assert "Timer started" in queued[0].message
+
+
+def test_outbox_relay_delivers_and_retries(db_session):
+    """Test delivered rows are removed and failed ones are retried later"""
+    db_session.add_all(
+        [
+            models.NotificationOutbox(chat_id="1", message="delivered"),
+            models.NotificationOutbox(chat_id="2", message="failed"),
+        ]
+    )
+    db_session.commit()
+    relay = OutboxRelay(
+        batch_size=10, max_attempts=3, poll_interval=1, lease_seconds=60
+    )
+
+    handed_over = drain_outbox(relay, [True, False])
+
+    assert handed_over == [("1", "delivered"), ("2", "failed")]
+    rows = db_session.scalars(select(models.NotificationOutbox)).all()
+    assert [(row.chat_id, row.status, row.attempts) for row in rows] == [
+        ("2", "pending", 1)
+    ]
+    assert rows[0].next_attempt_at > datetime.utcnow()
+
+    # Not due again yet, so nothing is claimed
+    assert drain_outbox(relay, [True]) == []
+
+
+def test_outbox_relay_dead_letters(db_session):
+    """Test a message is dead-lettered after the last failed attempt"""
+    db_session.add(models.NotificationOutbox(chat_id="1", message="hello"))
+    db_session.commit()
+    relay = OutboxRelay(
+        batch_size=10, max_attempts=1, poll_interval=1, lease_seconds=60
+    )
+
+    drain_outbox(relay, [False])
+
+    row = db_session.scalars(select(models.NotificationOutbox)).one()
+    assert (row.status, row.attempts) == ("dead", 1)
+
+
+def test_outbox_relay_sends_outside_its_session(
+    db_session, single_background_session
+):
+    """Test a batch is sent without holding a background session slot"""
+    db_session.add(models.NotificationOutbox(chat_id="1", message="hello"))
+    db_session.commit()
+    relay = OutboxRelay(
+        batch_size=10, max_attempts=3, poll_interval=1, lease_seconds=60
+    )
+
+    async def send_many(messages):
+        await single_background_session()
+        return [True for _ in messages]
+
+    async def main():
+        try:
+            await relay.drain_once(send_many)
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+
+    assert db_session.scalars(select(models.NotificationOutbox)).all() == []
+
+
+def test_outbox_relay_renews_lease_while_sending(db_session):
+    """Test a batch sent for longer than the lease stays claimed"""
+    db_session.add(models.NotificationOutbox(chat_id="1", message="slow"))
+    db_session.commit()
+    relay = OutboxRelay(
+        batch_size=10, max_attempts=3, poll_interval=1, lease_seconds=0.4
+    )
+    claimed_again = []
+
+    async def send_again(messages):
+        claimed_again.extend(messages)
+        return [True for _ in claimed_again]
+
+    async def slow_send(messages):
+        messages = list(messages)
+        await asyncio.sleep(1)
+        await relay.drain_once(send_again)
+        return [True for _ in messages]
+
+    async def main():
+        try:
+            await relay.drain_once(slow_send)
+        finally:
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+
+    assert claimed_again == []
+    assert db_session.scalars(select(models.NotificationOutbox)).all() == []
+
+
+def test_current_command_reports_running_timer(db_session, test_user):
+    """Test /current reads the running activity through a bot session"""
+    user = db_session.scalar(select(models.User))
+    user.telegram_chat_id = "42"
+    db_session.add(
+        models.Activity(
+            title="Deep work",
+            user_id=user.id,
+            timer_status="running",
+            recorded_time=60,
+            last_timer_start=datetime.utcnow(),
+        )
+    )
+    db_session.commit()
+    message = bot_message(chat_id=42)
+
+    run_bot_handler(telegram_bot.cmd_current(message))
+
+    text = message.answer.await_args.args[0]
+    assert "Deep work" in text
+    assert "Time: 00:01:0" in text
+    assert database.async_engine.pool.checkedout() == 0
+
+
+def test_current_command_resolves_chat_from_map(db_session, query_counter):
+    """Test /current looks up a linked chat in the users table only once"""
+    db_session.add(models.User(email="bot@gmail.com", telegram_chat_id="42"))
+    db_session.commit()
+
+    run_bot_handler(telegram_bot.cmd_current(bot_message(chat_id=42)))
+    query_counter.reset()
+    run_bot_handler(telegram_bot.cmd_current(bot_message(chat_id=42)))
+
+    assert not [s for s in query_counter.statements if "FROM users" in s]
+
+
+def test_link_moves_chat_between_users(db_session):
+    """Test linking a chat to a second account unlinks it from the first"""
+    first = models.User(email="first@gmail.com", telegram_chat_id="42")
+    second = models.User(email="second@gmail.com")
+    db_session.add_all([first, second])
+    db_session.commit()
+    chat_user_map.link("42", first.id)
+
+    async def authenticate(db, email, password):
+        return await db.get(models.User, second.id)
+
+    state = AsyncMock()
+    state.get_data.return_value = {"email": "second@gmail.com"}
+    with patch.object(auth, "authenticate_user", new=authenticate):
+        run_bot_handler(
+            telegram_bot.process_password(bot_message(42, "secret"), state)
+        )
+
+    db_session.expire_all()
+    assert first.telegram_chat_id is None
+    assert second.telegram_chat_id == "42"
+    assert chat_user_map.get("42") == second.id
+
+
+def test_chat_user_map_link_and_unlink():
+    """Test the chat map keeps one chat per user and one user per chat"""
+    chats = ChatUserMap(max_size=2)
+    chats.link("1", 10)
+    chats.link("2", 10)
+    assert chats.get("1") is None
+    assert chats.get("2") == 10
+
+    chats.link("3", 30)
+    chats.link("4", 40)
+    assert chats.get("2") is None  # evicted as least recently used
+    chats.unlink_user(30)
+    assert chats.get("3") is None
+    assert len(chats) == 1
+
+
+def test_timer_batch_queues_one_notification(client, auth_headers, db_session):
+    """Test a timer batch queues a single notification for all activities"""
+    user_id = client.get("/users/me", headers=auth_headers).json()["id"]
+    db_session.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(telegram_chat_id="42")
+    )
+    db_session.commit()
+    principal_cache.invalidate_user(user_id)
+    activity_ids = [
+        client.post(
+            "/activities/", json={"title": title}, headers=auth_headers
+        ).json()["id"]
+        for title in ("Read", "Write", "Review")
+    ]
+
+    response = client.post(
+        "/activities/timers/batch",
+        json={"action": "start", "activity_ids": activity_ids},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    [queued] = db_session.scalars(select(models.NotificationOutbox)).all()
+    assert queued.message.startswith("▶️ Timers started for 3 tasks:")
+    assert all(title in queued.message for title in ("Read", "Write", "Review"))
@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from app import database, models, telegram_bot
+from app.reminder_scheduler import ReminderScheduler, reminder_scheduler
+
+
+def run_scheduler(scheduler, until, timeout=2):
+    """
+    Run the scheduler with a recording sender until the until coroutine
+    function returns. Returns the batches of activity ids it sent.
+    """
+    sent = []
+
+    async def send_reminders(activity_ids):
+        sent.append(activity_ids)
+
+    async def main():
+        task = asyncio.create_task(scheduler.run(send_reminders))
+        try:
+            await asyncio.wait_for(until(sent), timeout)
+        finally:
+            task.cancel()
+            await database.async_engine.dispose()
+
+    asyncio.run(main())
+    return sent
+
+
+async def wait_for_batches(sent, count):
+    while len(sent) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_scheduler_sleeps_until_due(db_session):
+    """Test a reminder fires when due without waiting for a poll"""
+    scheduler = ReminderScheduler(lead_time=timedelta(0), reconcile_interval=60)
+    fired_at = {}
+
+    async def until(sent):
+        await asyncio.sleep(0.05)
+        scheduler.schedule(1, datetime.utcnow() + timedelta(seconds=0.2))
+        scheduled_at = datetime.utcnow()
+        await wait_for_batches(sent, 1)
+        fired_at["delay"] = (datetime.utcnow() - scheduled_at).total_seconds()
+
+    sent = run_scheduler(scheduler, until)
+
+    assert sent == [[1]]
+    assert 0.15 <= fired_at["delay"] < 0.5
+
+
+def test_scheduler_cancel(db_session):
+    """Test a cancelled reminder is not sent"""
+    scheduler = ReminderScheduler(lead_time=timedelta(0), reconcile_interval=60)
+
+    async def until(sent):
+        await asyncio.sleep(0.05)
+        scheduler.schedule(1, datetime.utcnow() + timedelta(seconds=0.1))
+        scheduler.schedule(2, datetime.utcnow() + timedelta(seconds=0.2))
+        scheduler.cancel(1)
+        await wait_for_batches(sent, 1)
+
+    assert run_scheduler(scheduler, until) == [[2]]
+
+
+def test_scheduler_loads_upcoming_on_start(db_session):
+    """Test reminders already in the database are picked up at startup"""
+    user = models.User(email="testuser@gmail.com", hashed_password="x")
+    db_session.add(user)
+    db_session.flush()
+    activity = models.Activity(
+        title="Soon",
+        user_id=user.id,
+        scheduled_time=datetime.utcnow() + timedelta(minutes=5),
+    )
+    db_session.add(activity)
+    db_session.commit()
+    scheduler = ReminderScheduler(
+        lead_time=timedelta(minutes=10), reconcile_interval=60
+    )
+
+    async def until(sent):
+        await wait_for_batches(sent, 1)
+
+    assert run_scheduler(scheduler, until) == [[activity.id]]
+
+
+def test_send_due_reminders_marks_notified(db_session):
+    """Test only still-due reminders are sent and marked notified"""
+    user = models.User(
+        email="testuser@gmail.com", hashed_password="x", telegram_chat_id="42"
+    )
+    db_session.add(user)
+    db_session.flush()
+    due = models.Activity(
+        title="Due", user_id=user.id,
+        scheduled_time=datetime.utcnow() + timedelta(minutes=5),
+    )
+    later = models.Activity(
+        title="Later", user_id=user.id,
+        scheduled_time=datetime.utcnow() + timedelta(hours=2),
+    )
+    db_session.add_all([due, later])
+    db_session.commit()
+
+    async def main():
+        try:
+            await telegram_bot.send_due_reminders([due.id, later.id])
+        finally:
+            await database.async_engine.dispose()
+
+    send = AsyncMock()
+    with patch.object(telegram_bot.notification_dispatcher, "_send", new=send):
+        asyncio.run(main())
+
+    assert send.await_count == 1
+    db_session.expire_all()
+    assert db_session.get(models.Activity, due.id).notified is True
+    assert db_session.get(models.Activity, later.id).notified is False
+
+
+def test_send_due_reminders_sends_outside_its_session(
+    db_session, single_background_session
+):
+    """Test reminders are sent without holding a background session slot"""
+    user = models.User(
+        email="testuser@gmail.com", hashed_password="x", telegram_chat_id="42"
+    )
+    db_session.add(user)
+    db_session.flush()
+    due = models.Activity(
+        title="Due", user_id=user.id,
+        scheduled_time=datetime.utcnow() + timedelta(minutes=5),
+    )
+    db_session.add(due)
+    db_session.commit()
+
+    async def send_many(messages):
+        await single_background_session()
+        return [True for _ in messages]
+
+    async def main():
+        try:
+            await telegram_bot.send_due_reminders([due.id])
+        finally:
+            await database.async_engine.dispose()
+
+    dispatcher = telegram_bot.notification_dispatcher
+    with patch.object(dispatcher, "send_many", new=send_many):
+        asyncio.run(main())
+
+    db_session.expire_all()
+    assert db_session.get(models.Activity, due.id).notified is True
+
+
+def test_activity_endpoints_update_scheduler(client, auth_headers, monkeypatch):
+    """Test create, update and delete keep the scheduler current"""
+    calls = []
+    monkeypatch.setattr(
+        reminder_scheduler, "schedule", lambda *args: calls.append(("schedule",) + args)
+    )
+    monkeypatch.setattr(
+        reminder_scheduler, "cancel", lambda *args: calls.append(("cancel",) + args)
+    )
+    scheduled_time = datetime.utcnow() + timedelta(hours=1)
+
+    response = client.post(
+        "/activities/",
+        json={"title": "Planned", "scheduled_time": scheduled_time.isoformat()},
+        headers=auth_headers,
+    )
+    activity_id = response.json()["id"]
+    client.put(
+        f"/activities/{activity_id}",
+        json={"scheduled_time": (scheduled_time + timedelta(hours=1)).isoformat()},
+        headers=auth_headers,
+    )
+    client.delete(f"/activities/{activity_id}", headers=auth_headers)
+
+    assert [call[:2] for call in calls] == [
+        ("schedule", activity_id),
+        ("schedule", activity_id),
+        ("cancel", activity_id),
+    ]
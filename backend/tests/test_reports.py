@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta
+from app import maintenance, models
+
+
+def create_activity(client, auth_headers, title, tags):
+    response = client.post(
+        "/activities/", json={"title": title, "tags": tags}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def log_intervals(db_session, activity, *intervals):
+    """
+    Add (started_at, seconds) intervals to an activity's log; seconds None
+    leaves the interval open
+    """
+    for started_at, seconds in intervals:
+        db_session.add(
+            models.ActivityInterval(
+                activity_id=activity["id"],
+                user_id=activity["user_id"],
+                started_at=started_at,
+                ended_at=None if seconds is None
+                else started_at + timedelta(seconds=seconds),
+            )
+        )
+    db_session.commit()
+
+
+def seed_january(client, auth_headers, db_session):
+    work = create_activity(client, auth_headers, "Work", ["work", "deep"])
+    chores = create_activity(client, auth_headers, "Chores", [])
+    log_intervals(
+        db_session,
+        work,
+        (datetime(2024, 1, 1, 9), 3600),  # Monday
+        (datetime(2024, 1, 2, 9), 1800),
+        (datetime(2024, 1, 15, 9), 600),
+    )
+    log_intervals(
+        db_session,
+        chores,
+        (datetime(2024, 1, 2, 18), 900),
+        (datetime(2024, 2, 3, 18), 300),  # outside January
+    )
+    maintenance.rebuild_rollups(db_session)
+
+
+JANUARY = {"start": "2024-01-01", "end": "2024-01-31"}
+
+
+def test_report_by_tag(client, auth_headers, db_session):
+    """Test totals per tag, counting multi-tag time towards each tag"""
+    seed_january(client, auth_headers, db_session)
+
+    response = client.get("/reports/tags", params=JANUARY, headers=auth_headers)
+
+    assert response.status_code == 200
+    totals = {row["tag"]: row["seconds"] for row in response.json()}
+    assert totals == {"work": 6000, "deep": 6000, None: 900}
+
+
+def test_report_by_period(client, auth_headers, db_session):
+    """Test totals per day, week and month"""
+    seed_january(client, auth_headers, db_session)
+
+    def report(period, **params):
+        response = client.get(
+            "/reports/periods",
+            params={"period": period, **params},
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        return [(row["period"], row["seconds"]) for row in response.json()]
+
+    assert report("day", **JANUARY) == [
+        ("2024-01-01", 3600),
+        ("2024-01-02", 2700),
+        ("2024-01-15", 600),
+    ]
+    assert report("week", **JANUARY) == [("2024-01-01", 6300), ("2024-01-15", 600)]
+    assert report("month", start="2024-01-01", end="2024-02-29") == [
+        ("2024-01-01", 6900),
+        ("2024-02-01", 300),
+    ]
+
+
+def test_report_by_tag_and_day(client, auth_headers, db_session):
+    """Test totals per tag and day"""
+    seed_january(client, auth_headers, db_session)
+
+    response = client.get(
+        "/reports/tags/days",
+        params={"start": "2024-01-02", "end": "2024-01-02"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert [(r["day"], r["tag"], r["seconds"]) for r in response.json()] == [
+        ("2024-01-02", None, 900),
+        ("2024-01-02", "deep", 1800),
+        ("2024-01-02", "work", 1800),
+    ]
+
+
+def test_report_includes_running_timer(client, auth_headers, db_session):
+    """Test a running timer's elapsed time counts towards today's total"""
+    activity = create_activity(client, auth_headers, "Live", ["live"])
+    log_intervals(db_session, activity, (datetime.now() - timedelta(seconds=120), None))
+
+    response = client.get("/reports/tags", headers=auth_headers)
+
+    [total] = response.json()
+    assert total["tag"] == "live"
+    assert 120 <= total["seconds"] <= 122
+
+
+def test_report_query_count(client, auth_headers, db_session, request_query_count):
+    """Test each report reads the rollups and the running intervals only"""
+    seed_january(client, auth_headers, db_session)
+    client.get("/users/me", headers=auth_headers)
+
+    for url in ("/reports/tags", "/reports/periods", "/reports/tags/days"):
+        response, count = request_query_count(
+            "get", url, params=JANUARY, headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert count == 2
+
+
+def test_report_invalid_range(client, auth_headers):
+    """Test reports reject a range that ends before it starts"""
+    today = date.today()
+    response = client.get(
+        "/reports/tags",
+        params={"start": today.isoformat(), "end": (today - timedelta(1)).isoformat()},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 400
+
+
+def test_report_invalid_period(client, auth_headers):
+    """Test reports reject unknown periods"""
+    response = client.get(
+        "/reports/periods", params={"period": "year"}, headers=auth_headers
+    )
+
+    assert response.status_code == 422
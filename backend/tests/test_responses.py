@@ -0,0 +1,87 @@
+import json
+import pytest
+from app.compression import choose_encoding
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("gzip, deflate, br", "br"),
+        ("gzip", "gzip"),
+        ("br;q=0.5, gzip", "gzip"),
+        ("br;q=0, *", "gzip"),
+        ("identity", None),
+        ("", None),
+    ],
+)
+def test_choose_encoding(accept_encoding, expected):
+    """Test brotli is preferred unless the client ranks gzip higher"""
+    assert choose_encoding(accept_encoding) == expected
+
+
+def create_long_activities(client, auth_headers, count):
+    for n in range(count):
+        client.post(
+            "/activities/",
+            json={"title": f"Task {n}", "description": "x" * 200, "tags": ["long"]},
+            headers=auth_headers,
+        )
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip"])
+def test_large_responses_compressed(client, auth_headers, encoding):
+    """Test large responses are compressed with the negotiated coding"""
+    create_long_activities(client, auth_headers, 10)
+
+    response = client.get(
+        "/activities/", headers={**auth_headers, "Accept-Encoding": encoding}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()) == 10
+    assert response.headers["ETag"]
+
+
+def test_small_and_unaccepted_responses_uncompressed(
+    client, auth_headers, test_activity
+):
+    """Test small responses, and clients accepting no coding, get plain bodies"""
+    small = client.get(
+        f"/activities/{test_activity['id']}",
+        headers={**auth_headers, "Accept-Encoding": "gzip"},
+    )
+    create_long_activities(client, auth_headers, 10)
+    plain = client.get(
+        "/activities/", headers={**auth_headers, "Accept-Encoding": "identity"}
+    )
+
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+    assert len(plain.json()) == 11
+
+
+def test_streamed_export_compressed(client, auth_headers):
+    """Test streamed exports are compressed chunk by chunk"""
+    create_long_activities(client, auth_headers, 5)
+
+    response = client.get(
+        "/activities/export", headers={**auth_headers, "Accept-Encoding": "gzip"}
+    )
+
+    assert response.headers["content-encoding"] == "gzip"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == [f"Task {n}" for n in range(5)]
+
+
+def test_list_serialization_matches_schema(client, auth_headers, test_activity):
+    """Test lists serialized through the TypeAdapter keep the schema's fields"""
+    listed = client.get("/activities/", headers=auth_headers).json()
+    single = client.get(
+        f"/activities/{test_activity['id']}", headers=auth_headers
+    ).json()
+
+    assert listed == [single]
+    assert "current_recorded_time" in listed[0]
@@ -1,3 +1,30 @@
+from sqlalchemy import delete, select, update
+from app import database, maintenance, models, tag_service
+from app.tag_catalogue import TagCatalogue, tag_catalogue
+
+
+def tag_activities(client, headers, *tag_lists):
+    """
+    Create an activity per list of tag names and return their ids
+    """
+    ids = []
+    for tags in tag_lists:
+        response = client.post(
+            "/activities/", json={"title": "Task", "tags": tags}, headers=headers
+        )
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+def search(client, headers, prefix, **params):
+    response = client.get(
+        "/tags/search", params={"prefix": prefix, **params}, headers=headers
+    )
+    assert response.status_code == 200
+    return [(tag["name"], tag["uses"]) for tag in response.json()]
+
+
 def test_create_tag(client, auth_headers):
     """Test creating a tag"""
     response = client.post("/tags/", json={"name": "newtag"}, headers=auth_headers)
@@ -30,3 +57,175 @@ def test_get_tags(client, auth_headers, test_activity):
     tag_names = [tag["name"] for tag in data]
     for activity_tag in test_activity["tags"]:
         assert activity_tag["name"] in tag_names
+
+
+def test_get_tags_served_from_cache(
+    client, auth_headers, test_activity, query_counter
+):
+    """Test repeated tag pages are served without querying the tags table"""
+    first = client.get("/tags/", headers=auth_headers)
+    query_counter.reset()
+
+    second = client.get("/tags/", headers=auth_headers)
+
+    assert second.json() == first.json()
+    assert query_counter.count == 0
+    counters = client.get("/metrics/").json()["counters"]
+    assert counters["tag_catalogue.page_hit"] >= 1
+
+
+def test_tag_writes_refresh_cached_pages(client, auth_headers):
+    """Test creating tags directly or through activities refreshes pages"""
+    client.get("/tags/", headers=auth_headers)
+
+    client.post("/tags/", json={"name": "direct"}, headers=auth_headers)
+    names = [tag["name"] for tag in client.get("/tags/", headers=auth_headers).json()]
+    assert names == ["direct"]
+
+    client.post(
+        "/activities/",
+        json={"title": "Task", "tags": ["via-activity"]},
+        headers=auth_headers,
+    )
+    names = [tag["name"] for tag in client.get("/tags/", headers=auth_headers).json()]
+    assert names == ["direct", "via-activity"]
+
+
+def test_known_tags_resolved_without_query(client, auth_headers, query_counter):
+    """Test activity writes resolve known tag names from the catalogue"""
+    activity = {"title": "Tagged", "tags": ["work", "deep"]}
+    client.post("/activities/", json=activity, headers=auth_headers)
+    query_counter.reset()
+
+    response = client.post("/activities/", json=activity, headers=auth_headers)
+
+    assert sorted(tag["name"] for tag in response.json()["tags"]) == ["deep", "work"]
+    tag_queries = [s for s in query_counter.statements if "FROM tags" in s]
+    assert tag_queries == []
+
+
+def test_rolled_back_tags_not_cached(db_session):
+    """Test tags created in a rolled back transaction don't reach the catalogue"""
+    tag_service.resolve_tag_ids(db_session, ["discarded"])
+    db_session.rollback()
+
+    assert tag_catalogue.lookup(["discarded"]) == ({}, ["discarded"])
+
+    ids = tag_service.resolve_tag_ids(db_session, ["kept"])
+    db_session.commit()
+
+    assert tag_catalogue.lookup(["kept"]) == (ids, [])
+
+
+def test_stale_page_not_cached():
+    """Test a page read before a tag was created isn't cached after it"""
+    catalogue = TagCatalogue(max_names=10, max_pages=10, page_ttl_seconds=60)
+    generation = catalogue.generation
+
+    catalogue.add_created([("new", 1)])
+    catalogue.put_page((0, 100), b"[]", generation)
+
+    assert catalogue.get_page((0, 100)) is None
+
+
+def test_search_tags_ranked_by_usage(client, auth_headers):
+    """Test tag search puts the user's most used tags first"""
+    tag_activities(
+        client,
+        auth_headers,
+        ["Work", "writing"],
+        ["work"],
+        ["work"],
+        ["writing"],
+        ["home"],
+    )
+    client.post("/tags/", json={"name": "workshop"}, headers=auth_headers)
+
+    assert search(client, auth_headers, "w") == [
+        ("work", 2),
+        ("writing", 2),
+        ("Work", 1),
+        ("workshop", 0),
+    ]
+    assert search(client, auth_headers, "WORK", limit=2) == [("work", 2), ("Work", 1)]
+    assert search(client, auth_headers, "x") == []
+
+
+def test_search_tags_ignores_other_users(client, auth_headers):
+    """Test another user's activities don't affect the ranking"""
+    client.post("/users/", json={"email": "other@gmail.com", "password": "pw123456"})
+    token = client.post(
+        "/users/login", json={"email": "other@gmail.com", "password": "pw123456"}
+    ).json()["access_token"]
+    tag_activities(
+        client, {"Authorization": f"Bearer {token}"}, ["beta"], ["beta"], ["alpha"]
+    )
+    tag_activities(client, auth_headers, ["alpha"])
+
+    assert search(client, auth_headers, "a") == [("alpha", 1)]
+    assert search(client, auth_headers, "b") == [("beta", 0)]
+
+
+def test_search_tags_validates_params(client, auth_headers):
+    """Test tag search requires a prefix and bounds the limit"""
+    missing = client.get("/tags/search", headers=auth_headers)
+    empty = client.get("/tags/search?prefix=", headers=auth_headers)
+    too_many = client.get("/tags/search?prefix=a&limit=1000", headers=auth_headers)
+
+    assert [missing.status_code, empty.status_code, too_many.status_code] == [
+        422,
+        422,
+        422,
+    ]
+
+
+def test_tag_search_index_range_scan(db_session):
+    """Test prefix matches are an index range on the folded name"""
+    statement = select(models.Tag.id).where(tag_service.prefix_range("wo"))
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+    with database.engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+
+    assert "ix_tags_name_folded" in plan[0].detail
+    assert "name_folded>? AND name_folded<?" in plan[0].detail
+
+
+def test_search_usage_follows_activity_changes(client, auth_headers):
+    """Test updates, deletes, batches and imports keep use counts current"""
+    first, second = tag_activities(client, auth_headers, ["red"], ["red", "rose"])
+    client.put(f"/activities/{second}", json={"tags": ["rust"]}, headers=auth_headers)
+    batch = client.post(
+        "/activities/batch",
+        json={"create": [{"title": "New", "tags": ["rust", "rose"]}]},
+        headers=auth_headers,
+    )
+    assert batch.status_code == 200
+    client.post(
+        "/activities/import?format=ndjson",
+        content='{"title": "Imported", "tags": ["rust"]}\n',
+        headers=auth_headers,
+    )
+    assert search(client, auth_headers, "r") == [
+        ("rust", 3),
+        ("red", 1),
+        ("rose", 1),
+    ]
+
+    client.delete(f"/activities/{first}", headers=auth_headers)
+    client.delete(f"/activities/{second}", headers=auth_headers)
+
+    assert search(client, auth_headers, "r") == [("rust", 2), ("rose", 1), ("red", 0)]
+
+
+def test_rebuild_tag_search(client, auth_headers, db_session):
+    """Test the maintenance rebuild makes older tags searchable and ranked"""
+    tag_activities(client, auth_headers, ["Legacy"], ["Legacy"], ["left"])
+    db_session.execute(update(models.Tag).values(name_folded=None))
+    db_session.execute(delete(models.TagUsage))
+    db_session.commit()
+    assert search(client, auth_headers, "le") == []
+
+    assert maintenance.fold_tag_names(db_session) == 2
+    assert maintenance.rebuild_tag_usage(db_session) == 2
+
+    assert search(client, auth_headers, "le") == [("Legacy", 2), ("left", 1)]
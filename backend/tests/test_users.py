@@ -1,3 +1,15 @@
+import asyncio
+import time
+import pytest
+from email_validator import EmailUndeliverableError
+from sqlalchemy import update
+from app import models
+from app.email_deliverability import DeliverabilityCache, deliverability_cache
+from app.hashing import password_hasher
+from app.chat_user_map import chat_user_map
+from app.principal_cache import principal_cache
+
+
 def test_create_user(client):
     """Test user creation"""
     response = client.post(
@@ -31,6 +43,97 @@ def test_create_user_invalid_email(client):
     assert "invalid" in str(error_response).lower()
 
 
+@pytest.fixture
+def dns_lookups(monkeypatch):
+    """
+    Replace DNS resolution with a fake that records the looked up domains
+    and treats domains starting with "nomail" as undeliverable.
+    """
+    lookups = []
+
+    def resolve(domain, timeout):
+        lookups.append(domain)
+        if domain.startswith("nomail"):
+            raise EmailUndeliverableError(f"The domain name {domain} does not exist.")
+
+    deliverability_cache.clear()
+    monkeypatch.setattr(deliverability_cache, "_resolve", resolve)
+    yield lookups
+    deliverability_cache.clear()
+
+
+def test_create_user_undeliverable_email(client, dns_lookups):
+    """Test creating a user with an undeliverable domain fails"""
+    response = client.post(
+        "/users/", json={"email": "user@nomail.io", "password": "password123"}
+    )
+    assert response.status_code == 400
+    assert "Invalid email address" in response.json()["detail"]
+    assert dns_lookups == ["nomail.io"]
+
+
+def test_create_user_domain_lookup_cached(client, dns_lookups):
+    """Test each domain is resolved once across registrations"""
+    for email in ("first@mail.io", "second@mail.io"):
+        response = client.post(
+            "/users/", json={"email": email, "password": "password123"}
+        )
+        assert response.status_code == 201
+
+    assert dns_lookups == ["mail.io"]
+
+
+def test_login_skips_dns(client, test_user, dns_lookups):
+    """Test logging in only validates email syntax"""
+    response = client.post(
+        "/users/login",
+        json={"email": test_user["email"], "password": test_user["password"]},
+    )
+    assert response.status_code == 200
+    assert dns_lookups == []
+
+
+def test_deliverability_cache_ttls():
+    """Test positive and negative results expire after their own TTL"""
+    lookups = []
+
+    def resolve(domain, timeout):
+        lookups.append(domain)
+        if domain == "nomail.io":
+            raise EmailUndeliverableError("no MX")
+
+    cache = DeliverabilityCache(
+        positive_ttl=60, negative_ttl=0, timeout=1, resolve=resolve
+    )
+
+    async def check_twice(domain):
+        return [await cache.is_deliverable(domain) for _ in range(2)]
+
+    assert asyncio.run(check_twice("mail.io")) == [True, True]
+    assert asyncio.run(check_twice("nomail.io")) == [False, False]
+    assert lookups == ["mail.io", "nomail.io", "nomail.io"]
+
+
+def test_deliverability_cache_timeout():
+    """Test a slow DNS lookup is cut off and not cached"""
+    def resolve(domain, timeout):
+        time.sleep(0.5)
+
+    cache = DeliverabilityCache(
+        positive_ttl=60, negative_ttl=60, timeout=0.05, resolve=resolve
+    )
+
+    async def timed_check():
+        started = time.monotonic()
+        deliverable = await cache.is_deliverable("slow.io")
+        return deliverable, time.monotonic() - started
+
+    deliverable, elapsed = asyncio.run(timed_check())
+    assert deliverable is True
+    assert elapsed < 0.4
+    assert len(cache._entries) == 0
+
+
 def test_login_valid_credentials(client, test_user):
     """Test logging in with valid credentials"""
     response = client.post(
@@ -53,6 +156,18 @@ def test_login_invalid_credentials(client, test_user):
     assert "Incorrect email or password" in response.json()["detail"]
 
 
+def test_login_hashing_pool_busy(client, test_user, monkeypatch):
+    """Test logging in while the hashing pool is saturated returns 503"""
+    monkeypatch.setattr(password_hasher, "in_flight", password_hasher.capacity)
+
+    response = client.post(
+        "/users/login",
+        json={"email": test_user["email"], "password": test_user["password"]},
+    )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
+
 def test_get_user_profile(client, auth_headers):
     """Test getting user profile with valid token"""
     response = client.get("/users/me", headers=auth_headers)
@@ -77,6 +192,42 @@ def test_get_telegram_status(client, auth_headers):
     assert data["is_linked"] is False
 
 
+def test_authenticated_user_is_cached(client, auth_headers, query_counter):
+    """Test repeated requests with one token don't look the user up again"""
+    client.get("/users/me", headers=auth_headers)
+    query_counter.reset()
+
+    response = client.get("/users/me", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.json()["email"] == "testuser@gmail.com"
+    assert not [s for s in query_counter.statements if "FROM users" in s]
+
+
+def test_unlink_telegram_invalidates_cache(client, auth_headers, db_session):
+    """Test unlinking telegram takes effect on the very next request"""
+    user_id = client.get("/users/me", headers=auth_headers).json()["id"]
+    db_session.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(telegram_chat_id="12345")
+    )
+    db_session.commit()
+    principal_cache.invalidate_user(user_id)
+
+    chat_user_map.link("12345", user_id)
+
+    response = client.get("/users/me/telegram-status", headers=auth_headers)
+    assert response.json()["is_linked"] is True
+
+    response = client.delete("/users/me/telegram", headers=auth_headers)
+    assert response.status_code == 200
+    assert chat_user_map.get("12345") is None
+
+    response = client.get("/users/me/telegram-status", headers=auth_headers)
+    assert response.json()["is_linked"] is False
+
+
 def test_unlink_telegram(client, auth_headers):
     """Test unlinking telegram account"""
     response = client.delete("/users/me/telegram", headers=auth_headers)
@@ -78,6 +78,8 @@ export interface ActivityDto {
   due_date?: string | null;
   duration?: number | null;
   recorded_time: number;
+  // recorded_time plus the running timer's elapsed time
+  current_recorded_time: number;
   timer_status: string;
   last_timer_start?: string | null;
   user_id: number;
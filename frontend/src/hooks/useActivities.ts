@@ -29,7 +29,7 @@ const mapActivityToTask = (activity: ActivityDto): TaskType => {
     completed: Boolean(activity.end_time),  // If end_time exists, consider the task completed
     tags: activity.tags.map(tag => tag.name),
     dueDate,
-    recordedTime: activity.recorded_time,
+    recordedTime: activity.current_recorded_time,
     timerStatus: activity.timer_status,
   };
 };